@@ -1,5 +1,6 @@
 from docling.document_converter import DocumentConverter
 from utils.sitemap import get_sitemap_urls
+from utils.lender_registry import get_registry
 import os
 from pathlib import Path
 import json
@@ -30,16 +31,8 @@ def get_residential_files():
     return txt_files + pdf_files
 
 def extract_lender_name(filename):
-    """Extract clean lender name from filename."""
-    # Remove common suffixes
-    name = filename.replace('_residential.txt', '').replace('_residential.pdf', '')
-    name = name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-    name = name.replace('_mortgage', '').replace('_criteria', '')
-    
-    # Convert to title case
-    name = name.replace('_', ' ').title()
-    
-    return name
+    """Canonical lender display name for a source file, from the lender registry."""
+    return get_registry().display_name(filename)
 
 def process_residential_files():
     """Process all residential lender files and extract content."""
@@ -55,7 +48,8 @@ def process_residential_files():
             print(f"📄 Processing: {file_path.name}")
             
             # Extract lender name
-            lender_name = extract_lender_name(file_path.name)
+            lender = get_registry().resolve(file_path.name)
+            lender_name = lender.display_name
             
             # Convert document
             result = converter.convert(str(file_path))
@@ -63,12 +57,14 @@ def process_residential_files():
             if result.document:
                 # Add lender metadata
                 result.document.meta.lender_name = lender_name
+                result.document.meta.lender_id = lender.lender_id
                 result.document.meta.source_file = file_path.name
                 
                 # Convert to markdown and store
                 markdown_output = result.document.export_to_markdown()
                 
                 processed_docs.append({
+                    'lender_id': lender.lender_id,
                     'lender_name': lender_name,
                     'filename': file_path.name,
                     'content': markdown_output,
@@ -1,7 +1,7 @@
 from docling.chunking import HybridChunker
 from docling.document_converter import DocumentConverter
 from dotenv import load_dotenv
-from openai import OpenAI
+from utils.openai_client import get_openai_client
 from utils.tokenizer import OpenAITokenizerWrapper
 import pickle
 from pathlib import Path
@@ -9,7 +9,7 @@ from pathlib import Path
 load_dotenv()
 
 # Initialize OpenAI client (make sure you have OPENAI_API_KEY in your environment variables)
-client = OpenAI()
+client = get_openai_client()
 
 tokenizer = OpenAITokenizerWrapper()  # Load our custom tokenizer for OpenAI
 MAX_TOKENS = 8191  # text-embedding-3-large's maximum context length
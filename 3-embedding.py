@@ -1,21 +1,48 @@
 from typing import List
+import argparse
 import pickle
+import sys
 import lancedb
 from docling.chunking import HybridChunker
 from docling.document_converter import DocumentConverter
 from dotenv import load_dotenv
 from lancedb.embeddings import get_registry
 from lancedb.pydantic import LanceModel, Vector
-from openai import OpenAI
+from utils.checkpoint import (
+    DEFAULT_JOB_DIR,
+    EmbeddingJobCheckpoint,
+    fingerprint_chunks,
+    load_reusable_embeddings,
+    save_reusable_embeddings,
+)
+from utils.cost_estimator import (
+    CostReport,
+    load_cached_text_hashes,
+    print_cost_report,
+    text_sha256,
+    write_file_manifest,
+)
+from utils.filters import DEFAULT_PRODUCT_TYPE, create_scalar_indexes
+from utils.hybrid_search import build_text_index
+from utils.lender_catalog import refresh_catalog
+from utils.lender_registry import get_registry as get_lender_registry
+from utils.neighbors import chunk_positions
+from utils.openai_client import get_openai_client
 from utils.tokenizer import OpenAITokenizerWrapper
+from utils.vector_index import build_vector_index
 
 load_dotenv()
 
 # Initialize OpenAI client (make sure you have OPENAI_API_KEY in your environment variables)
-client = OpenAI()
+client = get_openai_client()
 
 tokenizer = OpenAITokenizerWrapper()  # Load our custom tokenizer for OpenAI
 MAX_TOKENS = 8191  # text-embedding-3-large's maximum context length
+DB_URI = "data/lancedb"
+TABLE_NAME = "lender_criteria"
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_BATCH_SIZE = 64  # Chunks embedded and committed per checkpoint
+SOURCE_DIR = "residential"
 
 # --------------------------------------------------------------
 # Load lender chunks from previous step
@@ -41,10 +68,10 @@ def create_lender_database():
     print("🗄️ Creating LanceDB database for lender criteria...")
     
     # Create a LanceDB database
-    db = lancedb.connect("data/lancedb")
+    db = lancedb.connect(DB_URI)
     
     # Get the OpenAI embedding function
-    func = get_registry().get("openai").create(name="text-embedding-3-large")
+    func = get_registry().get("openai").create(name=EMBEDDING_MODEL)
     
     # Define comprehensive metadata schema for lender criteria
     class LenderCriteriaMetadata(LanceModel):
@@ -65,14 +92,42 @@ def create_lender_database():
     class LenderCriteriaChunks(LanceModel):
         text: str = func.SourceField()
         vector: Vector(func.ndims()) = func.VectorField()
+        # Filter columns, duplicated from metadata so they can carry scalar indexes;
+        # lender_id/lender_name come from the lender registry at ingest
+        lender_id: str
+        lender_name: str
+        product_type: str
+        criteria_section: str | None
+        # Position within the source document, for neighbour-chunk expansion;
+        # chunk_key is "<source_file>#<ordinal>" and carries the scalar index
+        source_file: str
+        ordinal: int
+        section_id: str
+        chunk_key: str
         metadata: LenderCriteriaMetadata
     
     # Create table with comprehensive schema
-    table = db.create_table("lender_criteria", schema=LenderCriteriaChunks, mode="overwrite")
+    table = db.create_table(TABLE_NAME, schema=LenderCriteriaChunks, mode="overwrite")
     
     print("✅ Created lender_criteria table")
     return table, func
 
+def open_lender_database_for_resume(checkpoint):
+    """Reopen the table of an interrupted run at its last committed version."""
+    print(f"🗄️ Reopening {checkpoint.table_name} to resume job {checkpoint.job_id}...")
+    
+    db = lancedb.connect(DB_URI)
+    table = db.open_table(checkpoint.table_name)
+    
+    # A batch written after the last checkpoint was never committed; drop it
+    # so that it is embedded exactly once when the run continues.
+    if checkpoint.table_version is not None and table.version != checkpoint.table_version:
+        print(f"↩️ Rolling back uncommitted writes (v{table.version} → v{checkpoint.table_version})")
+        table.restore(checkpoint.table_version)
+        checkpoint.table_version = table.version
+    
+    return table
+
 # --------------------------------------------------------------
 # Prepare lender chunks for the database
 # --------------------------------------------------------------
@@ -92,6 +147,11 @@ def prepare_lender_chunks_for_db(chunks, func):
             lender_name = chunk.get('meta', {}).get('lender_name', 'Unknown Lender') if isinstance(chunk, dict) else 'Unknown Lender'
             filename = chunk.get('meta', {}).get('source_file', 'Unknown File') if isinstance(chunk, dict) else 'Unknown File'
             
+            # Resolve the canonical lender once here, so queries never clean names
+            lender = get_lender_registry().resolve(filename if filename != 'Unknown File' else lender_name)
+            lender_name = lender.display_name
+            product_type = chunk.get('meta', {}).get('product_type', DEFAULT_PRODUCT_TYPE) if isinstance(chunk, dict) else DEFAULT_PRODUCT_TYPE
+            
             # Determine source type
             source_type = 'pdf' if filename.lower().endswith('.pdf') else 'text'
             
@@ -117,6 +177,10 @@ def prepare_lender_chunks_for_db(chunks, func):
             # Create chunk data
             chunk_data = {
                 "text": chunk_text,
+                "lender_id": lender.lender_id,
+                "lender_name": lender_name,
+                "product_type": product_type,
+                "criteria_section": criteria_section,
                 "metadata": {
                     "chunk_id": f"chunk_{i:06d}",
                     "criteria_section": criteria_section,
@@ -134,29 +198,191 @@ def prepare_lender_chunks_for_db(chunks, func):
             print(f"❌ Error processing chunk {i}: {str(e)}")
             continue
     
+    # Chunks arrive in document order, so ordinals follow the source files
+    positions = chunk_positions([chunk["metadata"]["filename"] for chunk in processed_chunks],
+                                [chunk["criteria_section"] for chunk in processed_chunks])
+    for chunk_data, position in zip(processed_chunks, positions):
+        chunk_data.update(position)
+    
     print(f"✅ Prepared {len(processed_chunks)} chunks for database")
     return processed_chunks
 
+# --------------------------------------------------------------
+# Reuse embeddings of chunks that have not changed
+# --------------------------------------------------------------
+
+def load_cached_embeddings(ndims):
+    """Map text hash -> vector for every chunk already embedded in the current table."""
+    try:
+        table = lancedb.connect(DB_URI).open_table(TABLE_NAME)
+        rows = table.search().select(["text", "vector"]).limit(table.count_rows()).to_arrow()
+    except Exception:
+        return {}
+    
+    cache = {}
+    for text, vector in zip(rows.column("text").to_pylist(), rows.column("vector").to_pylist()):
+        if vector is not None and len(vector) == ndims:
+            cache[text_sha256(text)] = vector
+    
+    print(f"♻️ Loaded {len(cache)} cached embeddings from the current table")
+    return cache
+
+def estimate_embedding_run(processed_chunks, batch_size):
+    """Report chunks, tokens and cost per lender without calling the API."""
+    cached_hashes = load_cached_text_hashes(DB_URI, TABLE_NAME)
+    report = CostReport(model=EMBEDDING_MODEL, batch_size=batch_size)
+    
+    chunks_by_file = {}
+    for chunk in processed_chunks:
+        metadata = chunk["metadata"]
+        key = (metadata["lender_name"], metadata["filename"])
+        chunks_by_file.setdefault(key, []).append(chunk["text"])
+    
+    for (lender_name, filename), texts in chunks_by_file.items():
+        report.add_chunks(lender_name, filename, texts, cached_hashes=cached_hashes)
+    
+    return report
+
+# --------------------------------------------------------------
+# Embed and commit chunks in checkpointed batches
+# --------------------------------------------------------------
+
+def add_chunks_in_batches(table, processed_chunks, checkpoint, job_dir=DEFAULT_JOB_DIR, cached_embeddings=None):
+    """Add chunks batch by batch, checkpointing after every committed batch."""
+    cached_embeddings = cached_embeddings or {}
+    total_batches = checkpoint.total_batches
+    
+    if checkpoint.next_batch > 0:
+        print(f"⏩ Skipping {checkpoint.next_batch}/{total_batches} batches already committed")
+    
+    for batch_index in range(checkpoint.next_batch, total_batches):
+        start = batch_index * checkpoint.batch_size
+        batch = processed_chunks[start:start + checkpoint.batch_size]
+        
+        # Chunks with an unchanged text keep their previous vector; the rest are
+        # embedded by the table's embedding function on add
+        reused, new = [], []
+        for chunk in batch:
+            vector = cached_embeddings.get(text_sha256(chunk["text"]))
+            if vector is not None:
+                reused.append({**chunk, "vector": vector})
+            else:
+                new.append(chunk)
+        
+        if reused:
+            table.add(reused)
+        if new:
+            table.add(new)
+        checkpoint.commit_batch(batch_index, table.version, job_dir)
+        
+        print(f"   ✅ Batch {batch_index + 1}/{total_batches} committed "
+              f"({start + len(batch)}/{checkpoint.total_chunks} chunks, table v{table.version})")
+
 # --------------------------------------------------------------
 # Main embedding and database creation process
 # --------------------------------------------------------------
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed lender criteria chunks into LanceDB")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last interrupted embedding job instead of starting over")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE,
+                        help="Chunks embedded and committed per checkpoint")
+    parser.add_argument("--job-dir", default=DEFAULT_JOB_DIR,
+                        help="Directory holding the embedding job checkpoint")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report chunks, tokens and estimated cost without embedding anything")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    
     # Load lender chunks
     chunks = load_lender_chunks()
     
     if chunks:
         print(f"📚 Processing {len(chunks)} lender criteria chunks...")
         
-        # Create database and table
-        table, func = create_lender_database()
-        
         # Prepare chunks for database
-        processed_chunks = prepare_lender_chunks_for_db(chunks, func)
+        processed_chunks = prepare_lender_chunks_for_db(chunks, None)
+        
+        if args.dry_run:
+            print_cost_report(estimate_embedding_run(processed_chunks, args.batch_size))
+            sys.exit(0)
+        
+        cached_embeddings = {}
+        checkpoint = EmbeddingJobCheckpoint.load(args.job_dir) if args.resume else None
+        
+        if args.resume and checkpoint is None:
+            print("⚠️ No embedding job to resume - starting a new run")
+        elif checkpoint and checkpoint.is_complete:
+            print(f"✅ Job {checkpoint.job_id} already completed - nothing to resume")
+            sys.exit(0)
+        elif checkpoint and checkpoint.input_fingerprint != fingerprint_chunks(processed_chunks):
+            print(f"❌ Chunks changed since job {checkpoint.job_id} started - cannot resume")
+            print("💡 Run without --resume to rebuild from scratch")
+            sys.exit(1)
+        
+        if checkpoint:
+            table = open_lender_database_for_resume(checkpoint)
+            checkpoint.mark("running", args.job_dir)
+            # The previous table is gone by now; its vectors were saved with the job
+            cached_embeddings = load_reusable_embeddings(args.job_dir)
+            print(f"♻️ Loaded {len(cached_embeddings)} reusable embeddings saved with job {checkpoint.job_id}")
+        else:
+            # Read reusable vectors before the table is overwritten, and keep
+            # them with the job so that --resume can reuse them too
+            ndims = get_registry().get("openai").create(name=EMBEDDING_MODEL).ndims()
+            cached_embeddings = load_cached_embeddings(ndims)
+            save_reusable_embeddings(cached_embeddings, args.job_dir)
+            
+            # Create database and table
+            table, func = create_lender_database()
+            checkpoint = EmbeddingJobCheckpoint.start(processed_chunks, args.batch_size, TABLE_NAME)
+            checkpoint.table_version = table.version
+            checkpoint.save(args.job_dir)
+        
+        print(f"🚀 Embedding job {checkpoint.job_id}: {checkpoint.total_batches} batches of {checkpoint.batch_size}")
+        
+        try:
+            add_chunks_in_batches(table, processed_chunks, checkpoint, args.job_dir, cached_embeddings)
+        except KeyboardInterrupt:
+            checkpoint.mark("interrupted", args.job_dir)
+            print(f"\n⏸️ Interrupted after batch {checkpoint.next_batch}/{checkpoint.total_batches}")
+            print("💡 Run 'python 3-embedding.py --resume' to continue where it stopped")
+            sys.exit(130)
+        except Exception as e:
+            checkpoint.mark("failed", args.job_dir, error=str(e))
+            print(f"❌ Embedding failed at batch {checkpoint.next_batch + 1}/{checkpoint.total_batches}: {str(e)}")
+            print("💡 Run 'python 3-embedding.py --resume' to continue where it stopped")
+            sys.exit(1)
+        
+        # Build the ANN index so search doesn't brute-force scan as the corpus grows
+        print("🏗️ Building vector index...")
+        index_params = build_vector_index(table, vector_column="vector")
+        if index_params:
+            print(f"✅ Vector index built: {index_params}")
+            print("💡 Run 'python build_indexes.py --tune' to tune nprobes/refine_factor")
+        else:
+            print("ℹ️ Corpus too small for an ANN index - using exact search")
+        
+        # Full-text index for BM25 / hybrid retrieval of exact jargon and numbers
+        print("🔤 Building full-text index...")
+        build_text_index(table)
+        print("✅ Full-text index built")
+        
+        # Scalar indexes so lender/product/section filters prefilter instead of scanning
+        print("🏷️ Building scalar indexes on filter columns...")
+        indexed_columns = create_scalar_indexes(table)
+        print(f"✅ Scalar indexes built: {', '.join(indexed_columns)}")
+        
+        # Lender catalog served by /lenders, refreshed for the new table version
+        catalog = refresh_catalog(table)
+        print(f"✅ Lender catalog updated: {len(catalog['lenders'])} lenders")
         
-        # Add chunks to database (automatically creates embeddings)
-        print("🚀 Adding chunks to database and generating embeddings...")
-        table.add(processed_chunks)
+        # Record which source files are now embedded (used by --dry-run estimates)
+        source_files = {chunk["metadata"]["filename"] for chunk in processed_chunks}
+        write_file_manifest(f"{SOURCE_DIR}/{name}" for name in sorted(source_files))
         
         # Display database statistics
         print(f"\n📊 Database Statistics:")
@@ -2,6 +2,15 @@ import lancedb
 import json
 from pathlib import Path
 
+from utils.filters import build_filter, compile_filter, resolve_filter_columns
+from utils.hybrid_search import RESULT_COLUMNS
+from utils.lender_catalog import LenderCatalog
+from utils.lender_registry import get_registry, lender_filter_values
+from utils.vector_index import apply_search_params, load_search_params
+
+# Query-time ANN parameters tuned by build_indexes.py
+SEARCH_PARAMS = load_search_params()
+
 # --------------------------------------------------------------
 # Connect to the lender criteria database
 # --------------------------------------------------------------
@@ -34,20 +43,22 @@ def search_lender_criteria(table, query, num_results=5, lender_filter=None):
         # Perform vector search
         if lender_filter:
             # Filter by specific lender
-            result = table.search(query).where(f"metadata.lender_name = '{lender_filter}'").limit(num_results)
+            filter_columns = resolve_filter_columns(table.schema)
+            where = compile_filter(build_filter(lender=lender_filter_values(lender_filter, filter_columns)), filter_columns)
+            result = apply_search_params(table.search(query), SEARCH_PARAMS).where(where, prefilter=True).limit(num_results)
         else:
             # Search across all lenders
-            result = table.search(query).limit(num_results)
+            result = apply_search_params(table.search(query), SEARCH_PARAMS).limit(num_results)
         
-        # Convert to pandas for easier handling
-        df = result.to_pandas()
+        # Ranked records with only the columns displayed below (no vectors)
+        results = result.select(RESULT_COLUMNS).to_list()
         
-        if df.empty:
+        if not results:
             print("❌ No results found")
             return []
         
-        print(f"✅ Found {len(df)} relevant results")
-        return df
+        print(f"✅ Found {len(results)} relevant results")
+        return results
         
     except Exception as e:
         print(f"❌ Search error: {str(e)}")
@@ -57,18 +68,18 @@ def search_lender_criteria(table, query, num_results=5, lender_filter=None):
 # Display search results with lender attribution
 # --------------------------------------------------------------
 
-def display_search_results(results_df):
+def display_search_results(results):
     """Display search results with clear lender attribution."""
-    if results_df.empty:
+    if not results:
         return
     
     print("\n" + "="*80)
     print("🔍 SEARCH RESULTS")
     print("="*80)
     
-    for i, (_, row) in enumerate(results_df.iterrows(), 1):
+    for i, row in enumerate(results, 1):
         metadata = row['metadata']
-        lender_name = metadata['lender_name']
+        lender_name = get_registry().display_name(metadata['lender_name'])
         criteria_section = metadata['criteria_section'] or 'General Criteria'
         filename = metadata['filename']
         source_type = metadata['source_type'].upper()
@@ -141,12 +152,12 @@ def show_database_stats(table):
         print(f"\n📊 Database Statistics:")
         print(f"   Total chunks: {total_chunks}")
         
-        # Get unique lenders
-        df = table.to_pandas()
-        if not df.empty:
-            lenders = df['metadata'].apply(lambda x: x['lender_name']).unique()
-            print(f"   Unique lenders: {len(lenders)}")
-            print(f"   Lenders: {', '.join(sorted(lenders))}")
+        # Lender list from the materialized catalog (no full table scan)
+        catalog = LenderCatalog().get(table)
+        if catalog["lenders"]:
+            print(f"   Unique lenders: {len(catalog['lenders'])}")
+            print(f"   Lenders: {', '.join(entry['name'] for entry in catalog['lenders'].values())}")
+            print(f"   Last updated: {catalog['last_updated']}")
         
     except Exception as e:
         print(f"❌ Error getting stats: {str(e)}")
@@ -1,16 +1,28 @@
 import streamlit as st
 import lancedb
-from openai import OpenAI
 from dotenv import load_dotenv
-import pandas as pd
 from typing import List, Dict
 import json
 
+from utils.adaptive_k import ADAPTIVE_K, adaptive_k
+from utils.embedding_cache import QueryEmbeddingCache
+from utils.filters import build_filter, compile_filter, resolve_filter_columns
+from utils.hybrid_search import RESULT_COLUMNS
+from utils.lender_registry import get_registry, lender_filter_values
+from utils.openai_client import get_openai_client
+from utils.vector_index import apply_search_params, load_search_params
+
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI()
+# Shared across Streamlit reruns, so its connections stay open between questions
+client = get_openai_client()
+
+# Query-time ANN parameters tuned by build_indexes.py
+SEARCH_PARAMS = load_search_params()
+
+# Canonical lender names, resolved once per distinct stored name
+lender_registry = get_registry()
 
 # Page configuration
 st.set_page_config(
@@ -84,6 +96,14 @@ def init_db():
         st.error(f"Database connection error: {str(e)}")
         return None
 
+# Query embedding cache (in-process LRU + shared on-disk store)
+@st.cache_resource
+def init_query_cache():
+    """Initialize the query embedding cache once per Streamlit server."""
+    return QueryEmbeddingCache()
+
+QUERY_EMBEDDING_MODEL = "text-embedding-ada-002"
+
 # Load lender configuration
 @st.cache_data
 def load_lender_config():
@@ -98,70 +118,46 @@ def load_lender_config():
 def search_lender_criteria(table, query: str, num_results: int = 15, lender_filter: str = None):
     """Search lender criteria with comprehensive results."""
     try:
-        # Create embedding for the query
-        from openai import OpenAI
-        import os
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Create embedding for the query (example queries hit the cache)
+        def create_query_embedding(text):
+            response = client.embeddings.create(
+                input=text,
+                model=QUERY_EMBEDDING_MODEL
+            )
+            return response.data[0].embedding
         
-        response = client.embeddings.create(
-            input=query,
-            model="text-embedding-ada-002"
-        )
-        query_embedding = response.data[0].embedding
+        query_embedding = init_query_cache().get_or_create(query, QUERY_EMBEDDING_MODEL, create_query_embedding)
         
         if lender_filter:
             # Filter by specific lender
-            result = table.search(query_embedding, vector_column_name='embedding').where(f"metadata.lender_name = '{lender_filter}'").limit(num_results)
+            filter_columns = resolve_filter_columns(table.schema)
+            where = compile_filter(build_filter(lender=lender_filter_values(lender_filter, filter_columns)), filter_columns)
+            result = apply_search_params(table.search(query_embedding, vector_column_name='embedding'), SEARCH_PARAMS).where(where, prefilter=True).limit(num_results)
         else:
             # Search across all lenders with higher limit for better coverage
-            result = table.search(query_embedding, vector_column_name='embedding').limit(num_results)
-        
-        # Convert to pandas and sort by relevance score
-        df = result.to_pandas()
-        if not df.empty and 'score' in df.columns:
-            df = df.sort_values('score', ascending=False)
+            result = apply_search_params(table.search(query_embedding, vector_column_name='embedding'), SEARCH_PARAMS).limit(num_results)
         
-        return df
+        # Ranked records with only the columns used below (no vectors)
+        return result.select(RESULT_COLUMNS).to_list()
     except Exception as e:
         st.error(f"Search error: {str(e)}")
-        return pd.DataFrame()
+        return []
 
-def get_context_from_results(results_df: pd.DataFrame) -> str:
+def get_context_from_results(results: List[Dict]) -> str:
     """Extract context from search results with clean formatting."""
-    if results_df.empty:
+    if not results:
         return "No relevant criteria found."
     
     context_parts = []
     
-    for _, row in results_df.iterrows():
+    for row in results:
         metadata = row['metadata']
         lender_name = metadata['lender_name']
         criteria_section = metadata['criteria_section'] or 'General Criteria'
         text_content = row['text']
         
-        # Clean up the lender name (remove file extensions and formatting)
-        clean_lender_name = lender_name.replace('_residential.txt', '').replace('_residential.pdf', '')
-        clean_lender_name = clean_lender_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-        clean_lender_name = clean_lender_name.replace('_mortgage', '').replace('_criteria', '')
-        clean_lender_name = clean_lender_name.replace('_', ' ').title()
-        
-        # Additional cleaning for common patterns
-        clean_lender_name = clean_lender_name.replace('Residential', '').replace('Res', '').strip()
-        if clean_lender_name.endswith('.'):
-            clean_lender_name = clean_lender_name[:-1]
-        
-        # Final cleanup - remove extra spaces and normalize
-        clean_lender_name = ' '.join(clean_lender_name.split())
-        
-        # Handle specific cases
-        if clean_lender_name == 'Hsbcidential 1.Txt':
-            clean_lender_name = 'HSBC'
-        elif clean_lender_name == 'Skipton':
-            clean_lender_name = 'Skipton Building Society'
-        elif clean_lender_name == 'Halifaxidentialing Services':
-            clean_lender_name = 'Halifax'
-        elif clean_lender_name == 'Santanderidential 1.Txt':
-            clean_lender_name = 'Santander'
+        # Canonical display name, resolved once per distinct stored name
+        clean_lender_name = lender_registry.display_name(lender_name)
         
         # Format the context cleanly
         context_part = f"""
@@ -263,14 +259,8 @@ def main():
             for category, lenders in lender_config['lender_categories'].items():
                 all_lenders.extend(lenders)
             
-            # Extract clean lender names
-            lender_names = []
-            for filename in all_lenders:
-                name = filename.replace('_residential.txt', '').replace('_residential.pdf', '')
-                name = name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-                name = name.replace('_mortgage', '').replace('_criteria', '')
-                name = name.replace('_', ' ').title()
-                lender_names.append(name)
+            # Canonical display names from the lender registry
+            lender_names = [lender_registry.display_name(filename) for filename in all_lenders]
             
             lender_names = sorted(list(set(lender_names)))
             selected_lender = st.selectbox(
@@ -282,6 +272,8 @@ def main():
         
         # Number of results
         num_results = st.slider("📊 Number of Results", 5, 20, 15)
+        use_adaptive_k = st.checkbox("✂️ Adaptive result count", value=ADAPTIVE_K,
+                                     help="Send fewer chunks when the scores drop sharply after the best ones")
         
         # Database stats
         st.header("📊 Database Info")
@@ -344,8 +336,12 @@ def main():
             with st.status("🔍 Searching lender criteria...", expanded=False) as status:
                 lender_filter = None if selected_lender == "All Lenders" else selected_lender
                 results = search_lender_criteria(table, prompt, num_results, lender_filter)
+                if results and use_adaptive_k:
+                    results, result_count = adaptive_k(results)
+                    st.caption(f"✂️ Using {result_count['k']} of {result_count['candidates']} results ({result_count['reason']})")
+                st.session_state.last_search_results = results
                 
-                if not results.empty:
+                if results:
                     status.update(label="📚 Found relevant criteria, generating response...", state="running")
                     
                     # Get context from results
@@ -367,10 +363,8 @@ def main():
     with col2:
         st.header("🔍 Search Results")
         
-        if 'last_search_results' in st.session_state and not st.session_state.last_search_results.empty:
-            results_df = st.session_state.last_search_results
-            
-            for _, row in results_df.iterrows():
+        if st.session_state.get('last_search_results'):
+            for row in st.session_state.last_search_results:
                 metadata = row['metadata']
                 lender_name = metadata['lender_name']
                 criteria_section = metadata['criteria_section'] or 'General Criteria'
@@ -9,6 +9,8 @@ import json
 import subprocess
 from datetime import datetime
 
+from utils.lender_registry import get_registry
+
 def show_current_files():
     """Show current files in residential folder."""
     print("\n📁 Current files in residential folder:")
@@ -117,11 +119,7 @@ def verify_new_files():
         lenders = set()
         for row in table.search("").limit(1000):
             lender_name = row["metadata"]["lender_name"]
-            # Clean up lender name for display
-            clean_name = lender_name.replace('_residential.txt', '').replace('_residential.pdf', '')
-            clean_name = clean_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-            clean_name = clean_name.replace('_mortgage', '').replace('_criteria', '')
-            clean_name = clean_name.replace('_', ' ').title()
+            clean_name = get_registry().display_name(lender_name)
             lenders.add(clean_name)
         
         print(f"🏦 Total lenders in database: {len(lenders)}")
@@ -163,9 +161,9 @@ def main():
         
         print("\n🎉 NEW FILES ADDED SUCCESSFULLY!")
         print("\n💡 Next steps:")
-        print("1. Restart your backend: python optimized_backend.py")
-        print("2. Test the system: Ask questions about the new lenders")
-        print("3. The chatbot will now have access to the new criteria!")
+        print("1. Refresh indexes and the search snapshot: python build_indexes.py")
+        print("2. Running backends switch to the new criteria on their own (no restart needed)")
+        print("3. Test the system: Ask questions about the new lenders")
         
     else:
         print("\n❌ FAILED TO ADD NEW FILES!")
@@ -5,11 +5,28 @@ Perfect for adding 60+ files efficiently
 """
 
 import os
+import sys
 import json
+import argparse
 import subprocess
 from datetime import datetime
 import shutil
 
+from utils.cost_estimator import (
+    CostReport,
+    estimate_chunks_from_text,
+    file_sha256,
+    load_file_manifest,
+    print_cost_report,
+)
+from utils.lender_registry import get_registry
+
+# Must match the embedding step (3-embedding.py)
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_BATCH_SIZE = 64
+MAX_CHUNK_TOKENS = 8191
+EXCLUDED_FILES = {'lender_config.json', 'header_template.txt'}
+
 def create_backup():
     """Create backup before processing."""
     backup_dir = f"data/lancedb_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -157,6 +174,53 @@ def process_batch_files():
         print(f"❌ Error during batch processing: {str(e)}")
         return False
 
+def read_source_text(path):
+    """Read a lender file without network access; returns None if it can't be read."""
+    if path.endswith('.txt'):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    
+    try:
+        from PyPDF2 import PdfReader
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    except Exception:
+        return None
+
+def estimate_batch_cost():
+    """Estimate the chunks, tokens and embedding cost of a rebuild without running it."""
+    batch_folder = "new_criteria_batch"
+    residential_folder = "residential"
+    
+    # The rebuild re-processes every residential file plus the new batch files
+    paths = {}
+    for folder in (residential_folder, batch_folder):
+        if not os.path.exists(folder):
+            continue
+        for file in sorted(os.listdir(folder)):
+            if file.endswith(('.txt', '.pdf')) and file not in EXCLUDED_FILES:
+                paths.setdefault(file, os.path.join(folder, file))
+    
+    # Files unchanged since the last embedding run reuse their stored vectors
+    manifest = load_file_manifest()
+    report = CostReport(model=EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE)
+    
+    print(f"\n🔎 Estimating {len(paths)} files (offline, no API calls)...")
+    for file, path in paths.items():
+        text = read_source_text(path)
+        if text is None:
+            report.skipped_files.append(file)
+            continue
+        
+        unchanged = manifest.get(os.path.join(residential_folder, file)) == file_sha256(path)
+        lender_name = get_registry().display_name(file)
+        report.add_chunks(lender_name, file, estimate_chunks_from_text(text, MAX_CHUNK_TOKENS),
+                          file_cached=unchanged)
+    
+    print_cost_report(report, title="DRY RUN: BATCH REBUILD ESTIMATE")
+    print("\n💡 Chunk counts are estimated from raw text; run "
+          "'python 3-embedding.py --dry-run' after chunking for exact figures")
+    return report
+
 def verify_batch_results():
     """Verify the batch processing results."""
     print("\n🔍 VERIFYING BATCH RESULTS")
@@ -177,11 +241,7 @@ def verify_batch_results():
         lenders = set()
         for row in table.search("").limit(2000):  # Increased limit for more files
             lender_name = row["metadata"]["lender_name"]
-            # Clean up lender name for display
-            clean_name = lender_name.replace('_residential.txt', '').replace('_residential.pdf', '')
-            clean_name = clean_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-            clean_name = clean_name.replace('_mortgage', '').replace('_criteria', '')
-            clean_name = clean_name.replace('_', ' ').title()
+            clean_name = get_registry().display_name(lender_name)
             lenders.add(clean_name)
         
         print(f"🏦 Total lenders in database: {len(lenders)}")
@@ -218,11 +278,20 @@ def cleanup_batch_folder():
 
 def main():
     """Main batch processing function."""
+    parser = argparse.ArgumentParser(description="Batch add lender criteria files")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Estimate chunks, tokens and embedding cost without changing anything")
+    args = parser.parse_args()
+    
     print("🏦 BATCH ADD LENDER CRITERIA FILES")
     print("=" * 60)
     print("This script helps you add 60+ new lender criteria files efficiently!")
     print("Perfect for bulk updates when you get many new criteria files.")
     
+    if args.dry_run:
+        estimate_batch_cost()
+        sys.exit(0)
+    
     # Create backup
     print("\n📦 STEP 1: Creating backup...")
     backup_dir = create_backup()
@@ -264,9 +333,9 @@ def main():
         print(f"  • Backup created: {backup_dir}")
         
         print("\n💡 Next steps:")
-        print("1. Restart your backend: python optimized_backend.py")
-        print("2. Test the system with questions about new lenders")
-        print("3. The chatbot now has access to all new criteria!")
+        print("1. Refresh indexes and the search snapshot: python build_indexes.py")
+        print("2. Running backends switch to the new criteria on their own (no restart needed)")
+        print("3. Test the system with questions about new lenders")
         
     else:
         print("\n❌ BATCH PROCESSING FAILED!")
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the chat backend against a local stand-in for the
+OpenAI API, so it measures the backend itself without API keys or costs.
+
+The stand-in answers embeddings with deterministic vectors and chat
+completions after a fixed delay. The backend is started with
+OPENAI_BASE_URL pointing at it, then hit with many concurrent /chat
+requests. A backend that blocks its event loop on the model call serves
+them one at a time; an async one overlaps the waits.
+
+    python benchmark_concurrency.py --concurrency 50 --requests 200 --llm-latency 1.0
+
+With --stream the load goes to /chat/stream and time to first token is
+reported as well; the stand-in then spreads each answer over
+--stream-chunks pieces. With --identical every request asks the same
+question, as in a burst of brokers asking about the same change; the
+report's model call count shows how many of them shared an answer.
+
+With --workers N the backend is started as N prefork workers
+(``python -m optimized_backend --workers N``), and the memory of the whole
+process tree is reported: RSS counts shared pages once per process, PSS
+splits them between the processes sharing them.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import lancedb
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+DB_URI = "data/lancedb/lender_criteria.lance"
+TABLE_NAME = "lender_criteria"
+VECTOR_COLUMN = "embedding"
+
+QUESTIONS = [
+    "maximum age at the end of the mortgage term",
+    "minimum income for self employed applicants",
+    "LTV limits for first time buyers",
+    "do you accept bonus and overtime income",
+    "foreign national residency requirements",
+    "buy to let rental cover calculation",
+]
+
+# --------------------------------------------------------------
+# Stand-in OpenAI API
+# --------------------------------------------------------------
+
+ANSWER = "Stand-in answer from the benchmark's fake model."
+
+# Calls the stand-in has served
+STAND_IN_CALLS = {"embeddings": 0, "completions": 0}
+
+def create_stand_in_app(dim: int, llm_latency: float, embedding_latency: float, stream_chunks: int = 20) -> FastAPI:
+    """OpenAI-compatible embeddings and chat completions (plain or streamed) with fixed latencies."""
+    stand_in = FastAPI()
+
+    def fake_embedding(text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    @stand_in.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        STAND_IN_CALLS["embeddings"] += 1
+        await asyncio.sleep(embedding_latency)
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    async def completion_chunks(model: str):
+        words = ANSWER.split(" ")
+        for i in range(stream_chunks):
+            await asyncio.sleep(llm_latency / stream_chunks)
+            chunk = {
+                "id": "chatcmpl-stand-in", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": words[i % len(words)] + " "}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        usage = {"prompt_tokens": 0, "completion_tokens": stream_chunks, "total_tokens": stream_chunks}
+        yield f"data: {json.dumps({'id': 'chatcmpl-stand-in', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @stand_in.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        STAND_IN_CALLS["completions"] += 1
+        if body.get("stream"):
+            return StreamingResponse(completion_chunks(body["model"]), media_type="text/event-stream")
+        await asyncio.sleep(llm_latency)
+        return {
+            "id": "chatcmpl-stand-in",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "Stand-in answer."}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    return stand_in
+
+def start_stand_in(port: int, dim: int, llm_latency: float, embedding_latency: float,
+                   stream_chunks: int = 20) -> uvicorn.Server:
+    """Run the stand-in API in a background thread."""
+    config = uvicorn.Config(create_stand_in_app(dim, llm_latency, embedding_latency, stream_chunks),
+                            host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+# --------------------------------------------------------------
+# Backend under test
+# --------------------------------------------------------------
+
+def start_backend(module: str, port: int, stand_in_port: int, workers: int = 1) -> subprocess.Popen:
+    """Start the backend with the OpenAI client pointed at the stand-in."""
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stand_in_port}/v1",
+        "OPENAI_API_KEY": "stand-in",
+        # Every request should do the full search + completion
+        "ANSWER_CACHE_ENABLED": "false",
+    }
+    if workers > 1:
+        command = [sys.executable, "-m", module, "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--log-level", "warning"]
+    return subprocess.Popen(command, env=env)
+
+def process_tree(pid: int):
+    """``pid`` and all its descendants (Linux /proc)."""
+    pids, i = [pid], 0
+    while i < len(pids):
+        try:
+            with open(f"/proc/{pids[i]}/task/{pids[i]}/children") as f:
+                pids += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+        i += 1
+    return pids
+
+def tree_memory(pid: int):
+    """Summed RSS and PSS in MB of a process tree, or None where /proc is unavailable."""
+    totals = {"Rss": 0, "Pss": 0}
+    processes = 0
+    for child in process_tree(pid):
+        try:
+            with open(f"/proc/{child}/smaps_rollup") as f:
+                for line in f:
+                    field, _, value = line.partition(":")
+                    if field in totals:
+                        totals[field] += int(value.split()[0])
+            processes += 1
+        except OSError:
+            continue
+    if not processes:
+        return None
+    return processes, totals["Rss"] / 1024, totals["Pss"] / 1024
+
+def wait_for_backend(url: str, timeout: float = 120.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Backend at {url} did not become healthy within {timeout:.0f}s")
+
+# --------------------------------------------------------------
+# Load generator
+# --------------------------------------------------------------
+
+async def post_chat(client: httpx.AsyncClient, url: str, payload: dict):
+    response = await client.post(f"{url}/chat", json=payload)
+    response.raise_for_status()
+    return None
+
+async def stream_chat(client: httpx.AsyncClient, url: str, payload: dict, start: float):
+    """Reads /chat/stream to the end; returns the time to the first answer token."""
+    first_token = None
+    async with client.stream("POST", f"{url}/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == "event: token" and first_token is None:
+                first_token = time.perf_counter() - start
+            elif line == "event: error":
+                raise httpx.HTTPError("stream ended with an error event")
+    return first_token
+
+async def run_load(url: str, num_requests: int, concurrency: int, stream: bool = False, identical: bool = False):
+    """Send ``num_requests`` chat questions (distinct unless ``identical``), ``concurrency`` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, first_tokens, failures = [], [], 0
+
+    async def one(client: httpx.AsyncClient, i: int):
+        nonlocal failures
+        # Distinct questions, so the embedding cache can't hide the API calls
+        question = QUESTIONS[0] if identical else f"{QUESTIONS[i % len(QUESTIONS)]} (run {i})"
+        async with semaphore:
+            payload = {"messages": [{"role": "user", "content": question}], "query": question}
+            start = time.perf_counter()
+            try:
+                if stream:
+                    first_token = await stream_chat(client, url, payload, start)
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+                else:
+                    await post_chat(client, url, payload)
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError as e:
+                failures += 1
+                print(f"❌ Request {i} failed: {e}")
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300.0, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(num_requests)))
+        wall = time.perf_counter() - start
+    return latencies, first_tokens, failures, wall
+
+def print_report(latencies, first_tokens, failures, wall, concurrency, llm_latency, memory=None):
+    print("\n📈 CONCURRENCY BENCHMARK")
+    print("=" * 60)
+    print(f"Requests:          {len(latencies)} ok, {failures} failed")
+    print(f"Concurrency:       {concurrency}")
+    print(f"Wall time:         {wall:.2f} s")
+    print(f"Throughput:        {len(latencies) / wall:.1f} chats/s")
+    if latencies:
+        print(f"Latency p50/p95:   {np.percentile(latencies, 50) * 1000:.0f} / {np.percentile(latencies, 95) * 1000:.0f} ms")
+    if first_tokens:
+        print(f"First token p50/p95: {np.percentile(first_tokens, 50) * 1000:.0f} / {np.percentile(first_tokens, 95) * 1000:.0f} ms")
+    if latencies:
+        # ~1 means the worker waited on one model call at a time
+        print(f"Overlapping model calls: {len(latencies) / wall * llm_latency:.1f} on average")
+    print(f"One chat at a time would take at least {len(latencies) * llm_latency:.1f} s (model calls alone)")
+    print(f"Model calls:       {STAND_IN_CALLS['completions']} completions, {STAND_IN_CALLS['embeddings']} embedding requests")
+    if memory is not None:
+        processes, rss, pss = memory
+        print(f"Backend memory:    {rss:.0f} MB RSS / {pss:.0f} MB PSS over {processes} processes")
+
+def print_pool_metrics(url: str) -> None:
+    """OpenAI connection pool of the backend (one worker's), from its /metrics."""
+    try:
+        pools = httpx.get(f"{url}/metrics", timeout=5.0).json().get("openai_pool") or {}
+    except (httpx.HTTPError, ValueError):
+        return
+    for kind, pool in pools.items():
+        print(f"OpenAI pool ({kind}):  {pool['requests']} requests over {pool['connections_opened']} connections, "
+              f"peak {pool['peak_in_flight']} in flight, {pool['connect_ms_total']:.0f} ms connecting"
+              f"{', HTTP/2' if pool['http2'] else ''}")
+
+def table_dimension() -> int:
+    table = lancedb.connect(DB_URI).open_table(TABLE_NAME)
+    return table.schema.field(VECTOR_COLUMN).type.list_size
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent /chat requests against a stand-in OpenAI API")
+    parser.add_argument("--backend", default="optimized_backend", help="Backend module to start")
+    parser.add_argument("--url", help="Benchmark an already running backend instead (it must use the stand-in)")
+    parser.add_argument("--port", type=int, default=8011, help="Port for the backend under test")
+    parser.add_argument("--stand-in-port", type=int, default=8765, help="Port for the stand-in OpenAI API")
+    parser.add_argument("--requests", type=int, default=200, help="Total chat requests")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds the stand-in takes per completion")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds the stand-in takes per embedding call")
+    parser.add_argument("--dim", type=int, help="Embedding dimension (default: read from the table)")
+    parser.add_argument("--stream", action="store_true", help="Use /chat/stream and report time to first token")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="Pieces the stand-in streams each answer in")
+    parser.add_argument("--identical", action="store_true", help="Every request asks the same question")
+    parser.add_argument("--workers", type=int, default=1, help="Start the backend as this many prefork workers")
+    args = parser.parse_args()
+
+    dim = args.dim or table_dimension()
+    start_stand_in(args.stand_in_port, dim, args.llm_latency, args.embedding_latency, args.stream_chunks)
+    print(f"🤖 Stand-in OpenAI API on port {args.stand_in_port} ({dim}-dim embeddings, {args.llm_latency}s completions)")
+
+    backend = None
+    url = args.url
+    if url is None:
+        print(f"🚀 Starting {args.backend} on port {args.port}...")
+        backend = start_backend(args.backend, args.port, args.stand_in_port, args.workers)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_for_backend(url)
+        print(f"🔥 Sending {args.requests} chats, {args.concurrency} at a time...")
+        latencies, first_tokens, failures, wall = asyncio.run(run_load(url, args.requests, args.concurrency, args.stream,
+                                                                         args.identical))
+        memory = tree_memory(backend.pid) if backend is not None else None
+        print_report(latencies, first_tokens, failures, wall, args.concurrency, args.llm_latency, memory)
+        print_pool_metrics(url)
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=30)
+
+if __name__ == "__main__":
+    main()
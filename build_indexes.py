@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Build the full-text, scalar and ANN vector indexes on the lender criteria
+table, tune the vector index, and export the in-memory vector snapshot
+"""
+
+import argparse
+import sys
+import time
+
+import lancedb
+import numpy as np
+
+from utils.filters import create_scalar_indexes, promote_filter_columns
+from utils.hybrid_search import build_text_index
+from utils.lender_catalog import refresh_catalog
+from utils.lender_registry import backfill_lender_columns
+from utils.neighbors import backfill_chunk_positions
+from utils.vector_index import (
+    INDEX_TYPES,
+    build_vector_index,
+    default_search_params,
+    load_index_config,
+    pick_search_params,
+    save_index_config,
+    tune_vector_index,
+)
+from utils.vector_snapshot import DEFAULT_SNAPSHOT_DIR, InMemoryVectorEngine, export_snapshot
+
+DB_URI = "data/lancedb/lender_criteria.lance"
+TABLE_NAME = "lender_criteria"
+VECTOR_COLUMN = "embedding"
+
+def print_tuning_report(report, k):
+    """Print recall@k and latency for every nprobes/refine_factor setting."""
+    print(f"\n📈 TUNING RESULTS (recall@{k} vs exact search)")
+    print("=" * 60)
+    print(f"{'nprobes':>8} {'refine':>7} {'recall':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    print("-" * 60)
+    for row in report:
+        nprobes = "exact" if row["nprobes"] is None else row["nprobes"]
+        refine = "-" if row["refine_factor"] is None else row["refine_factor"]
+        print(f"{nprobes:>8} {refine:>7} {row['recall']:>8.3f} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+
+def verify_snapshot(table, engine, vector_column, k=10, num_queries=20):
+    """Compare the in-memory engine with exact LanceDB search on sampled rows."""
+    sample = engine.vectors[np.random.default_rng(0).choice(len(engine.rows), min(num_queries, len(engine.rows)), replace=False)]
+    matches, engine_ms, lancedb_ms = 0, [], []
+    for vector in np.asarray(sample, dtype=np.float32):
+        start = time.perf_counter()
+        expected = table.search(vector, vector_column_name=vector_column).bypass_vector_index().limit(k).to_list()
+        lancedb_ms.append((time.perf_counter() - start) * 1000)
+        
+        start = time.perf_counter()
+        actual = engine.search(vector, k)
+        engine_ms.append((time.perf_counter() - start) * 1000)
+        
+        matches += [row["text"] for row in expected] == [row["text"] for row in actual]
+    
+    print(f"✅ Snapshot agrees with exact search on {matches}/{len(sample)} queries")
+    print(f"⚡ p50 latency: in-memory {np.median(engine_ms):.3f} ms vs LanceDB {np.median(lancedb_ms):.2f} ms")
+
+def export_serving_files(table, args):
+    """Refresh the lender catalog and export the vector snapshot of the current table version."""
+    catalog = refresh_catalog(table)
+    print(f"📒 Lender catalog: {len(catalog['lenders'])} lenders, {catalog['total_chunks']} chunks")
+    print(f"📸 Exporting {args.snapshot_dtype} vector snapshot to {args.snapshot_dir}...")
+    manifest = export_snapshot(table, args.snapshot_dir, args.vector_column, args.snapshot_dtype)
+    print(f"✅ Snapshot of v{manifest['table_version']}: {manifest['num_rows']} × {manifest['dim']}, "
+          f"{len(manifest['lender_ranges'])} lender ranges, {len(manifest['centroid_lenders'])} routing centroids")
+    verify_snapshot(table, InMemoryVectorEngine.load(args.snapshot_dir), args.vector_column)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and tune the lender criteria vector index")
+    parser.add_argument("--db", default=DB_URI, help="LanceDB database URI")
+    parser.add_argument("--table", default=TABLE_NAME, help="Table name")
+    parser.add_argument("--vector-column", default=VECTOR_COLUMN, help="Vector column to index")
+    parser.add_argument("--index-type", default="IVF_PQ", choices=INDEX_TYPES, help="ANN index variant")
+    parser.add_argument("--skip-build", action="store_true",
+                        help="Tune the existing index without rebuilding it or re-exporting the snapshot")
+    parser.add_argument("--tune", action="store_true", help="Sweep nprobes/refine_factor and save the best setting")
+    parser.add_argument("--k", type=int, default=10, help="k for recall@k during tuning")
+    parser.add_argument("--queries", type=int, default=100, help="Number of sampled benchmark queries")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Minimum recall when picking settings")
+    parser.add_argument("--snapshot-dir", default=DEFAULT_SNAPSHOT_DIR, help="Where to export the in-memory vector snapshot")
+    parser.add_argument("--snapshot-dtype", default="float32", choices=("float32", "float16"), help="Snapshot matrix precision")
+    args = parser.parse_args()
+
+    table = lancedb.connect(args.db).open_table(args.table)
+    num_rows = table.count_rows()
+    print(f"✅ Opened {args.table}: {num_rows} rows")
+
+    index_params = load_index_config().get("index_params") if args.skip_build else None
+    if not args.skip_build:
+        print("🔤 Building full-text index on 'text'...")
+        build_text_index(table)
+        print("✅ Full-text index built")
+        
+        # Older tables only carry lender/section inside the metadata struct
+        promoted = promote_filter_columns(table)
+        if promoted:
+            print(f"🧱 Added filter columns: {', '.join(promoted)}")
+        if "lender_id" not in table.schema.names:
+            resolved = backfill_lender_columns(table)
+            print(f"🏦 Resolved {resolved} stored lender names through the lender registry")
+        positioned = backfill_chunk_positions(table)
+        if positioned:
+            print(f"📍 Added document positions to {positioned} chunks")
+        print("🏷️ Building scalar indexes on filter columns...")
+        print(f"✅ Scalar indexes built: {', '.join(create_scalar_indexes(table))}")
+        
+        print(f"🏗️ Building {args.index_type} index on '{args.vector_column}'...")
+        index_params = build_vector_index(table, args.vector_column, args.index_type)
+    
+        # Catalog and snapshot last: both are keyed by the table version, which every index build bumps
+        export_serving_files(table, args)
+        
+        if index_params is None:
+            print(f"ℹ️ Only {num_rows} rows - brute-force search is exact and fast enough, no index built")
+            return
+        print(f"✅ Index built: {index_params}")
+
+    if not any(args.vector_column in index.columns for index in table.list_indices()):
+        print("❌ No vector index on this table - run without --skip-build first")
+        sys.exit(1)
+
+    search_params = default_search_params(index_params or {})
+    if args.tune:
+        print(f"🔬 Benchmarking {args.queries} queries...")
+        report = tune_vector_index(table, args.vector_column, k=args.k, num_queries=args.queries,
+                                   num_partitions=(index_params or {}).get("num_partitions"))
+        print_tuning_report(report, args.k)
+        search_params.update(pick_search_params(report, args.target_recall))
+
+    save_index_config(index_params or {}, search_params, num_rows)
+    print(f"\n💾 Saved search parameters: {search_params}")
+
+if __name__ == "__main__":
+    main()
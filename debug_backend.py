@@ -9,11 +9,12 @@ from pydantic import BaseModel
 from typing import List, Dict, Optional
 import lancedb
 import pandas as pd
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 import uvicorn
 
+from utils.openai_client import get_openai_client
+
 # Load environment variables
 load_dotenv()
 
@@ -29,7 +30,7 @@ app.add_middleware(
 )
 
 # Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = get_openai_client()
 
 # Pydantic models
 class SearchRequest(BaseModel):
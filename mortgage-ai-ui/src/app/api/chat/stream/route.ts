@@ -0,0 +1,47 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { ChatRequest } from '../../../types';
+
+export async function POST(request: NextRequest) {
+  try {
+    const body: ChatRequest = await request.json();
+    
+    // Use the optimized FastAPI backend
+    const backendUrl = process.env.PYTHON_BACKEND_URL || 'http://localhost:8000';
+    
+    const response = await fetch(`${backendUrl}/chat/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        messages: body.messages,
+        query: body.query,
+        lender_filter: body.lender_filter,
+        num_results: body.num_results || 15,
+      }),
+      // Stop generating upstream when the browser goes away
+      signal: request.signal,
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`Backend responded with status: ${response.status}`);
+    }
+
+    // Pass the server-sent events through as they arrive, without buffering
+    return new Response(response.body, {
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache, no-transform',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no',
+      },
+    });
+    
+  } catch (error) {
+    console.error('Chat stream API error:', error);
+    return NextResponse.json(
+      { error: `Failed to stream chat response: ${error instanceof Error ? error.message : 'Unknown error'}` },
+      { status: 500 }
+    );
+  }
+}
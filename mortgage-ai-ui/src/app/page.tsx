@@ -3,7 +3,30 @@
 import { useState, useRef, useEffect } from 'react';
 import ChatMessage from './components/ChatMessage';
 import Sidebar from './components/Sidebar';
-import { ChatMessage as ChatMessageType, SearchResult } from './types';
+import { ChatMessage as ChatMessageType, ChatStreamError, ChatStreamSources, ChatStreamToken, SearchResult } from './types';
+
+// Yields the { event, data } pairs of a server-sent event stream as they arrive
+async function* readEvents(body: ReadableStream<Uint8Array>) {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop() ?? '';
+    for (const raw of events) {
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (data) yield { event, data: JSON.parse(data) };
+    }
+  }
+}
 
 export default function Home() {
   const [messages, setMessages] = useState<ChatMessageType[]>([]);
@@ -35,7 +58,7 @@ export default function Home() {
     setIsLoading(true);
 
     try {
-      const response = await fetch('/api/chat', {
+      const response = await fetch('/api/chat/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -46,23 +69,31 @@ export default function Home() {
         }),
       });
 
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+      if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => null);
+        throw new Error(data?.error || `HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
-      
-      if (data.error) {
-        throw new Error(data.error);
+      // Sources arrive first, then the answer a few words at a time
+      let started = false;
+      for await (const { event, data } of readEvents(response.body)) {
+        if (event === 'sources') {
+          setSearchResults((data as ChatStreamSources).search_results || []);
+        } else if (event === 'token') {
+          const { content } = data as ChatStreamToken;
+          if (!started) {
+            started = true;
+            setMessages(prev => [...prev, { role: 'assistant', content }]);
+          } else {
+            setMessages(prev => [
+              ...prev.slice(0, -1),
+              { role: 'assistant', content: prev[prev.length - 1].content + content },
+            ]);
+          }
+        } else if (event === 'error') {
+          throw new Error((data as ChatStreamError).detail);
+        }
       }
-
-      const assistantMessage: ChatMessageType = { 
-        role: 'assistant', 
-        content: data.response 
-      };
-      
-      setMessages(prev => [...prev, assistantMessage]);
-      setSearchResults(data.search_results || []);
       
     } catch (error) {
       console.error('Chat error:', error);
@@ -210,7 +241,7 @@ export default function Home() {
               <ChatMessage key={index} message={message} />
             ))}
 
-            {isLoading && (
+            {isLoading && messages[messages.length - 1]?.role !== 'assistant' && (
               <div className="flex items-center justify-center py-8">
                 <div className="bg-white/80 backdrop-blur-sm rounded-2xl p-6 shadow-xl border border-white/30">
                   <div className="flex items-center space-x-4">
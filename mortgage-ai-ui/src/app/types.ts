@@ -38,3 +38,24 @@ export interface ChatResponse {
   response: string;
   search_results: SearchResult[];
 }
+
+// Server-sent events of /api/chat/stream, in order: sources, token..., done (or error)
+export interface ChatStreamSources {
+  search_results: SearchResult[];
+  applied_filters?: Record<string, string | string[]> | null;
+  result_count?: { k: number; candidates: number; reason: string } | null;
+}
+
+export interface ChatStreamToken {
+  content: string;
+}
+
+export interface ChatStreamDone {
+  usage: { prompt_tokens: number; completion_tokens: number; total_tokens: number } | null;
+  timings: { retrieval_ms?: number; first_token_ms?: number; total_ms: number };
+  cached: boolean;
+}
+
+export interface ChatStreamError {
+  detail: string;
+}
@@ -3,18 +3,42 @@
 Optimized FastAPI backend with persistent connections like Streamlit
 """
 
+import argparse
+import asyncio
 import os
 import json
+import time
+import warnings
 import lancedb
-import pandas as pd
-from openai import OpenAI
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 from dotenv import load_dotenv
 import uvicorn
 
+from utils.adaptive_k import ADAPTIVE_K, adaptive_k
+from utils.answer_cache import SemanticAnswerCache
+from utils.batch_search import MAX_BATCH_QUERIES, batch_search
+from utils.embedding_cache import QueryEmbeddingCache, normalize_query
+from utils.filters import resolve_filter_columns
+from utils.grouped_search import DEFAULT_PER_LENDER_K
+from utils.hot_reload import RELOAD_INTERVAL_SECONDS, ServingState, TableWatcher, warm_up
+from utils.hybrid_search import RESULT_COLUMNS, is_exact_term_query, result_score
+from utils.lender_catalog import LenderCatalog, catalog_path_for_uri
+from utils.lender_registry import get_registry
+from utils.mention_detector import AUTO_FILTER_MENTIONS, get_detector, mention_filters
+from utils.neighbors import NEIGHBOR_WINDOW, POSITION_COLUMNS, expand_neighbors
+from utils.openai_client import get_async_openai_client, get_openai_client, openai_pool_stats
+from utils.prefork import serve_prefork
+from utils.query_intent import is_comparison_query, is_lender_list_query
+from utils.reranker import RERANK_ENABLED, CrossEncoderReranker
+from utils.retrieval import (DEFAULT_SEARCH_MODE, SEARCH_PARAMS, USES_SNAPSHOT, load_lender_router,
+                             load_vector_engine, search_lender_criteria as retrieve_criteria)
+from utils.singleflight import SingleFlight
+from utils.vector_snapshot import current_snapshot_path
+
 # Load environment variables
 load_dotenv()
 
@@ -30,108 +54,335 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+DB_URI = "data/lancedb/lender_criteria.lance"
+TABLE_NAME = "lender_criteria"
+
+# Worker processes forked from one parent that loads the snapshot and
+# catalog once; 1 = a single uvicorn process
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+
 # Global variables for persistent connections (like Streamlit caching)
 db = None
-table = None
+# Table version being served, with its filter/result columns, catalog and snapshot;
+# each request takes it once, and the reloader swaps in the next version whole
+serving: Optional[ServingState] = None
 openai_client = None
+# The chat path awaits this one, so a worker serves other requests during LLM calls
+async_openai_client = None
+lender_registry = get_registry()
+
+# Lender list, chunk counts and dates, rebuilt only when the table version changes
+lender_catalog = LenderCatalog()
+
+QUERY_EMBEDDING_MODEL = "text-embedding-ada-002"
+CHAT_MODEL = "gpt-4o-mini"
+
+# In-process LRU backed by a SQLite store shared by all workers
+query_embedding_cache = QueryEmbeddingCache()
+
+# Optional local cross-encoder that narrows a wide candidate pool to RERANK_TOP_N chunks
+reranker = CrossEncoderReranker() if RERANK_ENABLED else None
+
+# Vector engine and lender centroids (unfiltered vector queries only score the
+# closest lenders) of the current snapshot, loaded again only after a new export
+loaded_snapshot: Optional[Dict] = None
+
+# Swaps in a new table version or snapshot without a restart (RELOAD_INTERVAL_SECONDS)
+table_watcher = TableWatcher(DB_URI, TABLE_NAME, watch_snapshots=USES_SNAPSHOT)
+reload_task = None
+
+def load_snapshot() -> Dict:
+    """Engine and router of the current snapshot; reuses the loaded ones until build_indexes.py exports another."""
+    global loaded_snapshot
+    path = current_snapshot_path() if USES_SNAPSHOT else None
+    if loaded_snapshot is None or loaded_snapshot["path"] != path:
+        vector_engine = load_vector_engine(path)
+        loaded_snapshot = {"path": path, "vector_engine": vector_engine,
+                           "lender_router": load_lender_router(path, vector_engine)}
+    return loaded_snapshot
+
+# Answers to earlier equivalent questions, invalidated when the table version changes
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+answer_cache = SemanticAnswerCache()
+
+# Identical chats arriving while one is being answered share its answer (and model call)
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+inflight_chats = SingleFlight()
 
 class ChatRequest(BaseModel):
     messages: List[Dict[str, str]]
     query: str
-    lender_filter: Optional[str] = None
+    lender_filter: Union[str, List[str], None] = None
+    product_filter: Union[str, List[str], None] = None
+    section_filter: Union[str, List[str], None] = None
     num_results: int = 15
+    search_mode: str = DEFAULT_SEARCH_MODE
+    # Best chunks per lender instead of a global top-k; None = on for comparison questions
+    group_by_lender: Optional[bool] = None
+    per_lender_k: int = DEFAULT_PER_LENDER_K
+    max_lenders: Optional[int] = None
+    # Relevance/diversity trade-off, 1.0 = relevance only; None = MMR_LAMBDA
+    mmr_lambda: Optional[float] = None
+    # Cross-encoder rerank of a wider pool down to RERANK_TOP_N; None = RERANK_ENABLED
+    rerank: Optional[bool] = None
+    # Filter on lenders/products named in the query when no filter is set; None = AUTO_FILTER_MENTIONS
+    detect_mentions: Optional[bool] = None
+    # Chunks either side of each hit stitched into its context passage; None = NEIGHBOR_WINDOW
+    neighbor_window: Optional[int] = None
+    # Stop at a score drop, distance threshold or token budget instead of always num_results; None = ADAPTIVE_K
+    adaptive_k: Optional[bool] = None
 
 class ChatResponse(BaseModel):
     response: str
     search_results: List[Dict]
+    cached: bool = False
+    # Filters detected in the query and applied automatically
+    applied_filters: Optional[Dict] = None
+    # Results kept by adaptive k and why: {"k", "candidates", "reason"}
+    result_count: Optional[Dict] = None
+
+class SearchQuery(BaseModel):
+    query: str
+    lender_filter: Union[str, List[str], None] = None
+    product_filter: Union[str, List[str], None] = None
+    section_filter: Union[str, List[str], None] = None
+    num_results: int = 15
+    search_mode: str = DEFAULT_SEARCH_MODE
+    # Best per_lender_k chunks of each lender instead of a global top num_results
+    group_by_lender: bool = False
+    per_lender_k: int = DEFAULT_PER_LENDER_K
+    max_lenders: Optional[int] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchQuery]
+
+class BatchSearchResponse(BaseModel):
+    results: List[Dict]
+
+def load_serving_state() -> ServingState:
+    """Open the latest table version with its catalog and snapshot, warmed up and ready to serve.
+
+    Blocking - the reloader runs it in a worker thread while requests are
+    still served from the current state.
+    """
+    global db
+    if db is None:
+        db = lancedb.connect(DB_URI)
+    table = db.open_table(TABLE_NAME)
+    # Already loaded when a prefork parent preloaded it, or when only the table changed
+    snapshot = load_snapshot()
+    vector_engine, lender_router = snapshot["vector_engine"], snapshot["lender_router"]
+    if vector_engine is not None and vector_engine.table_version != table.version:
+        print(f"⚠️ Vector snapshot is of table v{vector_engine.table_version}, not v{table.version} - "
+              f"using LanceDB until build_indexes.py exports a new one")
+        vector_engine = None
+    if lender_router is not None and lender_router.table_version != table.version:
+        lender_router = None
+    try:
+        warm_up(table)
+    except Exception as e:
+        print(f"⚠️ Index warm-up failed: {str(e)}")
+    return ServingState(
+        table=table,
+        version=table.version,
+        filter_columns=resolve_filter_columns(table.schema),
+        # RESULT_COLUMNS plus the chunk position columns, when the table has them
+        result_columns=RESULT_COLUMNS + [column for column in POSITION_COLUMNS if column in table.schema.names],
+        catalog=lender_catalog.get(table),
+        vector_engine=vector_engine,
+        lender_router=lender_router,
+        snapshot_path=snapshot["path"],
+    )
+
+def swap_serving_state(state: ServingState):
+    """Serve ``state`` from now on; requests already running keep the one they took."""
+    global serving
+    serving = state
 
 def init_connections():
     """Initialize persistent connections (like Streamlit @st.cache_resource)"""
-    global db, table, openai_client
+    global serving, openai_client, async_openai_client
     
     try:
         # Initialize database connection once
-        if db is None:
+        if serving is None:
             print("🔍 Initializing database connection...")
-            db = lancedb.connect("data/lancedb/lender_criteria.lance")
-            table = db.open_table("lender_criteria")
-            print("✅ Database connection established")
+            serving = load_serving_state()
+            print(f"✅ Database connection established (table v{serving.version})")
         
         # Initialize OpenAI client once
         if openai_client is None:
             print("🔑 Initializing OpenAI client...")
-            openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            openai_client = get_openai_client()
+            async_openai_client = get_async_openai_client()
             print("✅ OpenAI client initialized")
             
     except Exception as e:
         print(f"❌ Connection initialization error: {str(e)}")
         raise e
 
-def search_lender_criteria(query: str, num_results: int = 15, lender_filter: str = None):
+def preload_shared_state():
+    """Load read-only state once in a prefork parent, so workers share its pages.
+
+    LanceDB and the OpenAI clients are left to each worker (``init_connections``
+    at startup): Lance's runtime and open HTTP connections don't survive a fork.
+    """
+    print("📦 Preloading shared state before forking workers...")
+    load_snapshot()
+    if lender_catalog.preload(catalog_path_for_uri(os.path.join(DB_URI, f"{TABLE_NAME}.lance"))):
+        print("🏦 Lender catalog preloaded")
+    get_detector()
+
+def reset_after_fork():
+    """Drop per-process handles inherited from the parent; the worker reopens them."""
+    global db, serving, openai_client, async_openai_client, reload_task
+    db = serving = openai_client = async_openai_client = reload_task = None
+    query_embedding_cache.reset_after_fork()
+    answer_cache.reset_after_fork()
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+def create_query_embedding(query: str) -> List[float]:
+    """Call the embeddings API for a single query."""
+    response = openai_client.embeddings.create(
+        input=query,
+        model=QUERY_EMBEDDING_MODEL
+    )
+    return response.data[0].embedding
+
+def embed_query(query: str) -> List[float]:
+    """Query embedding used for vector search, served from cache when possible."""
+    return query_embedding_cache.get_or_create(query, QUERY_EMBEDDING_MODEL, create_query_embedding)
+
+async def create_query_embedding_async(query: str) -> List[float]:
+    response = await async_openai_client.embeddings.create(
+        input=query,
+        model=QUERY_EMBEDDING_MODEL
+    )
+    return response.data[0].embedding
+
+async def embed_query_async(query: str) -> List[float]:
+    """embed_query for the event loop: the API call is awaited, cache I/O runs in a thread."""
+    return await query_embedding_cache.get_or_create_async(query, QUERY_EMBEDDING_MODEL, create_query_embedding_async)
+
+def needs_query_embedding(query: str, search_mode: str) -> bool:
+    """Whether retrieval will embed the query (lexical and exact-term auto queries don't)."""
+    if search_mode == "lexical":
+        return False
+    return not (search_mode == "auto" and is_exact_term_query(query))
+
+def create_query_embeddings(queries: List[str]) -> List[List[float]]:
+    """Call the embeddings API once for a list of queries."""
+    response = openai_client.embeddings.create(
+        input=queries,
+        model=QUERY_EMBEDDING_MODEL
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Batched embed_query: cache misses share a single API call."""
+    return query_embedding_cache.get_or_create_many(queries, QUERY_EMBEDDING_MODEL, create_query_embeddings)
+
+def search_lender_criteria(query: str, num_results: int = 15, lender_filter=None,
+                           search_mode: str = DEFAULT_SEARCH_MODE, product_filter=None, section_filter=None,
+                           group_by_lender: bool = False, per_lender_k: int = DEFAULT_PER_LENDER_K,
+                           max_lenders: Optional[int] = None, mmr_lambda: Optional[float] = None,
+                           rerank: bool = False, state: Optional[ServingState] = None):
     """Search lender criteria - optimized version with persistent connection."""
-    global table, openai_client
-    
+    return retrieve_criteria(state or serving, query, embed_query, num_results, lender_filter, search_mode,
+                             product_filter, section_filter, group_by_lender, per_lender_k, max_lenders,
+                             mmr_lambda, rerank, reranker=reranker, search_params=SEARCH_PARAMS)
+
+def is_single_turn(messages: List[Dict[str, str]]) -> bool:
+    """True when the answer can't depend on earlier turns of the conversation."""
+    return sum(1 for message in messages if message.get("role") == "user") <= 1
+
+def answer_cache_filters(request: ChatRequest) -> Dict:
+    """Request settings an answer is only valid for."""
+    return {
+        "lender_filter": request.lender_filter,
+        "product_filter": request.product_filter,
+        "section_filter": request.section_filter,
+        "num_results": request.num_results,
+        "search_mode": request.search_mode,
+        "group_by_lender": use_grouped_retrieval(request),
+        "per_lender_k": request.per_lender_k,
+        "max_lenders": request.max_lenders,
+        "mmr_lambda": request.mmr_lambda,
+        "rerank": use_reranker(request),
+        "neighbor_window": neighbor_window(request),
+        "adaptive_k": use_adaptive_k(request),
+    }
+
+def coalescing_key(request: ChatRequest) -> str:
+    """Requests with the same key get the same answer, so concurrent ones can share a single run."""
+    return json.dumps({
+        "query": normalize_query(request.query),
+        "filters": answer_cache_filters(request),
+        "detect_mentions": request.detect_mentions,
+        # Follow-up questions also depend on the conversation so far
+        "messages": None if is_single_turn(request.messages) else request.messages,
+    }, sort_keys=True, default=str)
+
+def use_reranker(request: ChatRequest) -> bool:
+    return RERANK_ENABLED if request.rerank is None else request.rerank
+
+def use_adaptive_k(request: ChatRequest) -> bool:
+    """Adaptive k when asked for; grouped results already hold a few chunks per lender."""
+    enabled = ADAPTIVE_K if request.adaptive_k is None else request.adaptive_k
+    return enabled and not use_grouped_retrieval(request)
+
+def neighbor_window(request: ChatRequest) -> int:
+    return NEIGHBOR_WINDOW if request.neighbor_window is None else request.neighbor_window
+
+def expand_context(results: List[Dict], request: ChatRequest, state: ServingState) -> List[Dict]:
+    """Hits stitched together with their neighbouring chunks, when the table records chunk positions."""
+    window = neighbor_window(request)
+    if window <= 0 or "chunk_key" not in state.result_columns:
+        return results
     try:
-        # Create embedding for the query
-        response = openai_client.embeddings.create(
-            input=query,
-            model="text-embedding-ada-002"
-        )
-        query_embedding = response.data[0].embedding
-        
-        if lender_filter:
-            # Filter by specific lender
-            result = table.search(query_embedding, vector_column_name='embedding').where(f"metadata.lender_name = '{lender_filter}'").limit(num_results)
-        else:
-            # Search across all lenders
-            result = table.search(query_embedding, vector_column_name='embedding').limit(num_results)
-        
-        # Convert to pandas and sort by relevance score
-        df = result.to_pandas()
-        if not df.empty and 'score' in df.columns:
-            df = df.sort_values('score', ascending=False)
-        
-        return df
+        return expand_neighbors(state.table, results, window)
     except Exception as e:
-        print(f"Search error: {str(e)}")
-        return pd.DataFrame()
+        print(f"Neighbor expansion error: {str(e)}")
+        return results
+
+def apply_mention_filters(request: ChatRequest, state: ServingState):
+    """Request with the lender/product filters named in its query, and those filters (or None)."""
+    enabled = AUTO_FILTER_MENTIONS if request.detect_mentions is None else request.detect_mentions
+    if not enabled or request.lender_filter is not None or request.product_filter is not None:
+        return request, None
+    # Detected lenders are registry ids, only filterable once the table has a lender_id column
+    if state.filter_columns.get("lender") != "lender_id":
+        return request, None
+    detected = mention_filters(request.query, state.catalog)
+    if not detected:
+        return request, None
+    return request.model_copy(update=detected), detected
 
-def get_context_from_results(results_df: pd.DataFrame) -> str:
+def use_grouped_retrieval(request: ChatRequest) -> bool:
+    """Grouped retrieval when asked for, or by default for questions comparing lenders."""
+    if request.group_by_lender is not None:
+        return request.group_by_lender
+    single_lender = isinstance(request.lender_filter, str) or (
+        isinstance(request.lender_filter, list) and len(request.lender_filter) == 1
+    )
+    return not single_lender and is_comparison_query(request.query)
+
+def get_context_from_results(results: List[Dict]) -> str:
     """Extract context from search results - exact same as Streamlit version."""
-    if results_df.empty:
+    if not results:
         return "No relevant criteria found."
     
     context_parts = []
     
-    for _, row in results_df.iterrows():
+    for row in results:
         metadata = row['metadata']
         lender_name = metadata['lender_name']
         criteria_section = metadata['criteria_section'] or 'General Criteria'
         text_content = row['text']
         
-        # Clean up the lender name (same logic as Streamlit)
-        clean_lender_name = lender_name.replace('_residential.txt', '').replace('_residential.pdf', '')
-        clean_lender_name = clean_lender_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-        clean_lender_name = clean_lender_name.replace('_mortgage', '').replace('_criteria', '')
-        clean_lender_name = clean_lender_name.replace('_', ' ').title()
-        
-        # Additional cleaning for common patterns
-        clean_lender_name = clean_lender_name.replace('Residential', '').replace('Res', '').strip()
-        if clean_lender_name.endswith('.'):
-            clean_lender_name = clean_lender_name[:-1]
-        
-        # Final cleanup - remove extra spaces and normalize
-        clean_lender_name = ' '.join(clean_lender_name.split())
-        
-        # Handle specific cases
-        if clean_lender_name == 'Hsbcidential 1.Txt':
-            clean_lender_name = 'HSBC'
-        elif clean_lender_name == 'Skipton':
-            clean_lender_name = 'Skipton Building Society'
-        elif clean_lender_name == 'Halifaxidentialing Services':
-            clean_lender_name = 'Halifax'
-        elif clean_lender_name == 'Santanderidential 1.Txt':
-            clean_lender_name = 'Santander'
+        # Canonical display name, resolved once per distinct stored name
+        clean_lender_name = lender_registry.display_name(lender_name)
         
         # Format the context cleanly
         context_part = f"""
@@ -144,10 +395,34 @@ CRITERIA: {text_content}
     
     return "\n".join(context_parts)
 
-def get_chat_response(messages: list, context: str, query: str) -> str:
-    """Get AI response - exact same as Streamlit version."""
-    global openai_client
+def retrieve_context(request: ChatRequest, state: ServingState):
+    """Search, cut and expand the results of a chat request, and format them as context.
+
+    Blocking (LanceDB, numpy, tokenizer) - the chat endpoint runs it in a worker thread.
+
+    Returns:
+        The result rows, the adaptive k summary (or None) and the context text
+    """
+    results = search_lender_criteria(request.query, request.num_results, request.lender_filter,
+                                     request.search_mode, request.product_filter, request.section_filter,
+                                     group_by_lender=use_grouped_retrieval(request),
+                                     per_lender_k=request.per_lender_k, max_lenders=request.max_lenders,
+                                     mmr_lambda=request.mmr_lambda, rerank=use_reranker(request), state=state)
+    
+    # Sharp questions send fewer chunks: cut at a score drop, distance or token budget
+    result_count = None
+    if results and use_adaptive_k(request):
+        results, result_count = adaptive_k(results)
     
+    if not results:
+        return results, result_count, None
+    
+    # A criterion split across chunks reaches the model whole
+    results = expand_context(results, request, state)
+    return results, result_count, get_context_from_results(results)
+
+def build_chat_messages(messages: list, context: str, query: str) -> list:
+    """System prompt with the retrieved context, followed by the conversation."""
     system_prompt = f"""You are an expert mortgage advisor AI assistant with access to comprehensive UK mortgage lender criteria from 30+ major lenders.
 
 Your role is to provide 100% accurate answers based ONLY on the provided lender criteria. You must:
@@ -183,15 +458,19 @@ Format your response like this:
 
 And so on..."""
 
-    messages_with_context = [
+    return [
         {"role": "system", "content": system_prompt},
         *messages
     ]
 
+async def get_chat_response(messages: list, context: str, query: str) -> str:
+    """Get AI response - exact same as Streamlit version."""
+    global async_openai_client
+    
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages_with_context,
+        completion = await async_openai_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=build_chat_messages(messages, context, query),
             temperature=0.1,
         )
         
@@ -204,164 +483,303 @@ async def startup_event():
     """Initialize connections on startup."""
     print("🚀 Starting Optimized Backend...")
     init_connections()
+    if serving is not None:
+        catalog = serving.catalog
+        print(f"🏦 Lender catalog: {len(catalog['lenders'])} lenders, {catalog['total_chunks']} chunks")
+    global reload_task
+    if RELOAD_INTERVAL_SECONDS > 0 and reload_task is None:
+        # Criteria updates are picked up without a restart
+        reload_task = asyncio.create_task(table_watcher.run(lambda: serving, load_serving_state, swap_serving_state))
+    if reranker is not None:
+        print(f"🧮 Loading reranker {reranker.model_name}...")
+        reranker.warm_up()
     print("✅ Backend ready!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if reload_task is not None:
+        reload_task.cancel()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "message": "Optimized backend is running"}
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
-    """Chat endpoint with optimized performance."""
-    try:
-        # Check if user is asking for lender list
-        query_lower = request.query.lower()
-        if any(phrase in query_lower for phrase in [
-            "how many lenders", "list all lenders", "what lenders", "which lenders", 
-            "all lenders", "lender names", "available lenders", "lenders do you have",
-            "how many lender details", "lender details", "details do you have"
-        ]):
-            # Get comprehensive lender list from database
-            df = table.to_pandas()
-            lenders = df['metadata'].apply(lambda x: x['lender_name']).unique()
-            
-            # Clean up lender names
-            clean_lenders = []
-            for lender in sorted(lenders):
-                clean_name = lender.replace('_residential.txt', '').replace('_residential.pdf', '')
-                clean_name = clean_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-                clean_name = clean_name.replace('_mortgage', '').replace('_criteria', '')
-                clean_name = clean_name.replace('_', ' ').title()
-                
-                # Additional cleaning for common patterns
-                clean_name = clean_name.replace('Residential', '').replace('Res', '').strip()
-                if clean_name.endswith('.'):
-                    clean_name = clean_name[:-1]
-                
-                # Final cleanup - remove extra spaces and normalize
-                clean_name = ' '.join(clean_name.split())
-                
-                # Handle specific cases
-                if clean_name == 'Hsbcidential 1.Txt':
-                    clean_name = 'HSBC'
-                elif clean_name == 'Skipton':
-                    clean_name = 'Skipton Building Society'
-                elif clean_name == 'Halifaxidentialing Services':
-                    clean_name = 'Halifax'
-                elif clean_name == 'Santanderidential 1.Txt':
-                    clean_name = 'Santander'
-                elif clean_name == 'Nationwide-Residential.Txt':
-                    clean_name = 'Nationwide'
-                elif clean_name == 'The Lender':
-                    clean_name = 'The Mortgage Lender'
-                
-                clean_lenders.append(clean_name)
-            
-            # Remove duplicates and sort
-            unique_lenders = sorted(list(set(clean_lenders)))
-            
-            # Create comprehensive response
-            response = f"""I have access to comprehensive mortgage criteria from **{len(unique_lenders)} lenders** with **{len(df)} total criteria chunks** in my database.
+@app.get("/metrics")
+async def metrics():
+    """Cache hit rates and sizes for this worker."""
+    return {
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "reranker": reranker.stats() if reranker is not None else None,
+        "lender_router": serving.lender_router.stats() if serving and serving.lender_router else None,
+        "coalesced_chats": inflight_chats.stats(),
+        "openai_pool": openai_pool_stats(),
+        "serving": {
+            "table_version": serving.version if serving else None,
+            "snapshot": os.path.basename(serving.snapshot_path) if serving and serving.snapshot_path else None,
+            "vector_engine": bool(serving and serving.vector_engine is not None),
+        },
+        "reload": table_watcher.stats(),
+    }
+
+NO_RESULTS_RESPONSE = "No relevant criteria found. Try rephrasing your question or check if the criteria exists."
+
+def lender_list_response(state: ServingState) -> str:
+    """Answer to "which lenders do you have?", from the materialized catalog (no table scan)."""
+    catalog = state.catalog
+    unique_lenders = [entry["name"] for entry in catalog["lenders"].values()]
+    
+    # Create comprehensive response
+    response = f"""I have access to comprehensive mortgage criteria from **{len(unique_lenders)} lenders** with **{catalog['total_chunks']} total criteria chunks** in my database.
 
 Here are all the lenders I can provide information about:
 
 """
-            for i, lender in enumerate(unique_lenders, 1):
-                response += f"{i:2d}. **{lender}**\n"
-            
-            response += f"""
+    for i, lender in enumerate(unique_lenders, 1):
+        response += f"{i:2d}. **{lender}**\n"
+    
+    response += f"""
 I can provide detailed information about eligibility criteria, age limits, income requirements, property types, LTV ratios, and documentation requirements for any of these lenders.
 
 What specific information would you like to know about any of these lenders?"""
-            
+    return response
+
+def search_result_rows(results: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "text": row['text'],
+            "metadata": row['metadata'],
+            "score": result_score(row)
+        }
+        for row in results
+    ]
+
+async def lookup_cached_answer(request: ChatRequest, state: ServingState):
+    """Query vector (when the answer cache applies) and the cached answer to an equivalent question, if any."""
+    if not (ANSWER_CACHE_ENABLED and is_single_turn(request.messages)):
+        return None, None
+    try:
+        query_vector = await embed_query_async(request.query)
+        cached = await asyncio.to_thread(answer_cache.lookup, request.query, query_vector, state.version,
+                                         answer_cache_filters(request))
+        return query_vector, cached
+    except Exception as e:
+        print(f"Answer cache lookup error: {str(e)}")
+        return None, None
+
+async def store_answer(request: ChatRequest, state: ServingState, query_vector, response: str,
+                       search_results: List[Dict]) -> None:
+    if query_vector is None or response.startswith("Error generating response"):
+        return
+    try:
+        await asyncio.to_thread(answer_cache.store, request.query, query_vector, state.version,
+                                answer_cache_filters(request), response, search_results)
+    except Exception as e:
+        print(f"Answer cache store error: {str(e)}")
+
+async def retrieve_for_chat(request: ChatRequest, state: ServingState, query_vector):
+    """Results, adaptive k summary and context of a chat request, without blocking the event loop."""
+    # Embed on the loop first; the search thread then finds the vector in the cache
+    if query_vector is None and needs_query_embedding(request.query, request.search_mode):
+        await embed_query_async(request.query)
+    return await asyncio.to_thread(retrieve_context, request, state)
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest):
+    """Chat endpoint with optimized performance.
+
+    OpenAI calls are awaited and LanceDB/CPU work runs in worker threads, so
+    the event loop keeps serving other chats while one waits on the model.
+    Identical requests in flight at the same time are answered by one run.
+    """
+    if COALESCE_REQUESTS:
+        return await inflight_chats.do(coalescing_key(request), lambda: answer_chat(request))
+    return await answer_chat(request)
+
+async def answer_chat(request: ChatRequest) -> ChatResponse:
+    """Search, generation and answer caching behind /chat."""
+    # One table version for the whole request, even if a reload happens meanwhile
+    state = serving
+    try:
+        # Check if user is asking for lender list ("which lenders accept..." is a criteria question)
+        if is_lender_list_query(request.query):
             return ChatResponse(
-                response=response,
+                response=await asyncio.to_thread(lender_list_response, state),
                 search_results=[]
             )
         
+        # "What's Barclays' max age?" searches Barclays only
+        request, applied_filters = await asyncio.to_thread(apply_mention_filters, request, state)
+        
+        # Single-turn questions can reuse the answer to an equivalent earlier question
+        query_vector, cached = await lookup_cached_answer(request, state)
+        if cached:
+            return ChatResponse(
+                response=cached["response"],
+                search_results=cached["search_results"],
+                cached=True,
+                applied_filters=applied_filters
+            )
+        
         # Regular search for specific criteria
-        results = search_lender_criteria(request.query, request.num_results, request.lender_filter)
+        results, result_count, context = await retrieve_for_chat(request, state, query_vector)
         
-        if not results.empty:
-            # Get context from results
-            context = get_context_from_results(results)
-            
+        if results:
             # Generate AI response
-            response = get_chat_response(request.messages, context, request.query)
+            response = await get_chat_response(request.messages, context, request.query)
+            search_results = search_result_rows(results)
+            await store_answer(request, state, query_vector, response, search_results)
             
             # Return response
             return ChatResponse(
                 response=response,
-                search_results=[
-                    {
-                        "text": row['text'],
-                        "metadata": row['metadata'],
-                        "score": row.get('score', None)
-                    }
-                    for _, row in results.iterrows()
-                ]
+                search_results=search_results,
+                applied_filters=applied_filters,
+                result_count=result_count
             )
         else:
             return ChatResponse(
-                response="No relevant criteria found. Try rephrasing your question or check if the criteria exists.",
-                search_results=[]
+                response=NO_RESULTS_RESPONSE,
+                search_results=[],
+                applied_filters=applied_filters
             )
             
     except Exception as e:
         print(f"Chat endpoint error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/lenders")
-async def get_lenders():
-    """Get available lenders from database."""
+def sse_event(event: str, data) -> str:
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def chat_events(request: ChatRequest):
+    """The /chat flow as server-sent events: sources, answer tokens, then usage and timings."""
+    started = time.perf_counter()
+    timings = {}
+    
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    def done(usage=None, cached=False) -> str:
+        timings["total_ms"] = elapsed_ms()
+        return sse_event("done", {"usage": usage, "timings": timings, "cached": cached})
+    
+    state = serving
     try:
-        global table
+        if is_lender_list_query(request.query):
+            yield sse_event("sources", {"search_results": []})
+            yield sse_event("token", {"content": await asyncio.to_thread(lender_list_response, state)})
+            yield done()
+            return
         
-        # Get all unique lenders from database
-        df = table.to_pandas()
-        lenders = df['metadata'].apply(lambda x: x['lender_name']).unique()
+        request, applied_filters = await asyncio.to_thread(apply_mention_filters, request, state)
         
-        # Clean up lender names
-        clean_lenders = []
-        for lender in sorted(lenders):
-            clean_name = lender.replace('_residential.txt', '').replace('_residential.pdf', '')
-            clean_name = clean_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-            clean_name = clean_name.replace('_mortgage', '').replace('_criteria', '')
-            clean_name = clean_name.replace('_', ' ').title()
-            
-            # Additional cleaning for common patterns
-            clean_name = clean_name.replace('Residential', '').replace('Res', '').strip()
-            if clean_name.endswith('.'):
-                clean_name = clean_name[:-1]
-            
-            # Final cleanup - remove extra spaces and normalize
-            clean_name = ' '.join(clean_name.split())
-            
-            # Handle specific cases
-            if clean_name == 'Hsbcidential 1.Txt':
-                clean_name = 'HSBC'
-            elif clean_name == 'Skipton':
-                clean_name = 'Skipton Building Society'
-            elif clean_name == 'Halifaxidentialing Services':
-                clean_name = 'Halifax'
-            elif clean_name == 'Santanderidential 1.Txt':
-                clean_name = 'Santander'
-            elif clean_name == 'Nationwide-Residential.Txt':
-                clean_name = 'Nationwide'
-            elif clean_name == 'The Lender':
-                clean_name = 'The Mortgage Lender'
-            
-            clean_lenders.append(clean_name)
+        query_vector, cached = await lookup_cached_answer(request, state)
+        if cached:
+            yield sse_event("sources", {"search_results": cached["search_results"], "applied_filters": applied_filters})
+            yield sse_event("token", {"content": cached["response"]})
+            yield done(cached=True)
+            return
+        
+        results, result_count, context = await retrieve_for_chat(request, state, query_vector)
+        search_results = search_result_rows(results)
+        timings["retrieval_ms"] = elapsed_ms()
+        # Sources go out before generation starts, so the UI can show them right away
+        yield sse_event("sources", {"search_results": search_results, "applied_filters": applied_filters,
+                                    "result_count": result_count})
+        
+        if not results:
+            yield sse_event("token", {"content": NO_RESULTS_RESPONSE})
+            yield done()
+            return
+        
+        parts, usage = [], None
+        stream = await async_openai_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=build_chat_messages(request.messages, context, request.query),
+            temperature=0.1,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        # Closing the stream on client disconnect stops generation upstream too
+        async with stream:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage.model_dump()
+                if chunk.choices and chunk.choices[0].delta.content:
+                    timings.setdefault("first_token_ms", elapsed_ms())
+                    parts.append(chunk.choices[0].delta.content)
+                    yield sse_event("token", {"content": parts[-1]})
+        
+        yield done(usage)
+        await store_answer(request, state, query_vector, "".join(parts), search_results)
+    
+    except Exception as e:
+        print(f"Chat stream error: {str(e)}")
+        yield sse_event("error", {"detail": str(e)})
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Chat answer as server-sent events, so the first words show while the rest is generated.
+
+    Events: ``sources`` (search results, applied filters, adaptive k) once
+    retrieval is done, one ``token`` per answer fragment, then ``done`` with
+    token usage and timings (``retrieval_ms``, ``first_token_ms``,
+    ``total_ms``) - or ``error``. Identical requests in flight at the same
+    time share one stream, each receiving it from the first event.
+    """
+    if COALESCE_REQUESTS:
+        events = inflight_chats.stream(coalescing_key(request), lambda: chat_events(request))
+    else:
+        events = chat_events(request)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch_endpoint(request: BatchSearchRequest):
+    """Search many queries at once, each with its own filters and k; results are grouped by query."""
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    
+    try:
+        items = [item.model_dump() for item in request.queries]
+        state = serving
+        batch_results = await asyncio.to_thread(batch_search, state.table, items, embed_queries, state.filter_columns,
+                                                vector_engine=state.vector_engine, search_params=SEARCH_PARAMS)
+        
+        return BatchSearchResponse(results=[
+            {
+                "query": item["query"],
+                "search_results": [
+                    {"text": row['text'], "metadata": row['metadata'], "score": result_score(row)}
+                    for row in rows
+                ]
+            }
+            for item, rows in zip(items, batch_results)
+        ])
         
-        # Remove duplicates and sort
-        unique_lenders = sorted(list(set(clean_lenders)))
+    except Exception as e:
+        print(f"Batch search endpoint error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/lenders")
+async def get_lenders():
+    """Get available lenders from database."""
+    try:
+        # Materialized per table version and loaded with it, so this is an in-memory read
+        catalog = serving.catalog
         
         return {
-            "total_lenders": len(unique_lenders),
-            "total_chunks": len(df),
-            "lenders": unique_lenders,
-            "last_updated": "2025-01-02"
+            "total_lenders": len(catalog["lenders"]),
+            "total_chunks": catalog["total_chunks"],
+            "lenders": [entry["name"] for entry in catalog["lenders"].values()],
+            "last_updated": catalog["last_updated"],
+            "details": [{"lender_id": lender_id, **entry} for lender_id, entry in catalog["lenders"].items()]
         }
         
     except Exception as e:
@@ -369,5 +787,16 @@ async def get_lenders():
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimized Mortgage Criteria AI Backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS, help="Worker processes (default: WEB_WORKERS)")
+    args = parser.parse_args()
+
     print("🚀 Starting Optimized Mortgage Criteria AI Backend...")
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=False)
+    if args.workers > 1:
+        # The parent never opens a table, so no Lance operation can be caught mid-flight by a fork
+        warnings.filterwarnings("ignore", message="lancedb fork support is experimental")
+        serve_prefork(app, args.host, args.port, args.workers, preload=preload_shared_state)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, reload=False)
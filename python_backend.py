@@ -4,17 +4,32 @@ Python backend service for the Next.js mortgage criteria chat application.
 This service handles LanceDB operations and search functionality.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
+import json
 import lancedb
-import pandas as pd
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 import uvicorn
 
+from utils.adaptive_k import ADAPTIVE_K, adaptive_k
+from utils.batch_search import MAX_BATCH_QUERIES, batch_search
+from utils.embedding_cache import QueryEmbeddingCache
+from utils.filters import resolve_filter_columns
+from utils.grouped_search import DEFAULT_PER_LENDER_K
+from utils.hot_reload import ServingState
+from utils.hybrid_search import RESULT_COLUMNS, result_score
+from utils.lender_catalog import LenderCatalog
+from utils.mention_detector import AUTO_FILTER_MENTIONS, mention_filters
+from utils.neighbors import NEIGHBOR_WINDOW, POSITION_COLUMNS, expand_neighbors
+from utils.openai_client import get_openai_client, openai_pool_stats
+from utils.reranker import RERANK_ENABLED, CrossEncoderReranker
+from utils.retrieval import (DEFAULT_SEARCH_MODE, SEARCH_PARAMS, USES_SNAPSHOT, load_lender_router,
+                             load_vector_engine, search_lender_criteria as retrieve_criteria)
+from utils.vector_snapshot import current_snapshot_path
+
 # Load environment variables
 load_dotenv()
 
@@ -27,71 +42,134 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Adaptive k and detected filters of /search, readable by the browser
+    expose_headers=["X-Result-Count", "X-Result-Count-Reason", "X-Applied-Filters"],
 )
 
 # Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = get_openai_client()
+
+QUERY_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# In-process LRU backed by a SQLite store shared by all workers
+query_embedding_cache = QueryEmbeddingCache()
+
+# Optional local cross-encoder that narrows a wide candidate pool to RERANK_TOP_N chunks
+reranker = CrossEncoderReranker() if RERANK_ENABLED else None
+
+# Lender chunk counts and product types per table version, used to validate detected mentions
+lender_catalog = LenderCatalog()
 
 # Pydantic models
 class SearchRequest(BaseModel):
     query: str
-    lender_filter: Optional[str] = None
+    lender_filter: Union[str, List[str], None] = None
+    product_filter: Union[str, List[str], None] = None
+    section_filter: Union[str, List[str], None] = None
     num_results: int = 15
+    search_mode: str = DEFAULT_SEARCH_MODE
+    # Best per_lender_k chunks of each lender instead of a global top num_results
+    group_by_lender: bool = False
+    per_lender_k: int = DEFAULT_PER_LENDER_K
+    max_lenders: Optional[int] = None
+    # Relevance/diversity trade-off, 1.0 = relevance only; None = MMR_LAMBDA
+    mmr_lambda: Optional[float] = None
+    # Cross-encoder rerank of a wider pool down to RERANK_TOP_N; None = RERANK_ENABLED
+    rerank: Optional[bool] = None
+    # Filter on lenders/products named in the query when no filter is set; None = AUTO_FILTER_MENTIONS
+    detect_mentions: Optional[bool] = None
+    # Chunks either side of each hit stitched into its passage; None = NEIGHBOR_WINDOW
+    neighbor_window: Optional[int] = None
+    # Stop at a score drop, distance threshold or token budget instead of always num_results; None = ADAPTIVE_K
+    adaptive_k: Optional[bool] = None
 
 class SearchResult(BaseModel):
     text: str
     metadata: Dict
     score: Optional[float] = None
 
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchRequest]
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: List[SearchResult]
+
 # Initialize database connection
-table = None
+# Table being searched, with its filter/result columns, catalog and snapshot; None until connected
+serving: Optional[ServingState] = None
 def init_database():
-    global table
+    global serving
     try:
         print("🔍 Connecting to database...")
         db = lancedb.connect("data/lancedb/lender_criteria.lance")
         table = db.open_table("lender_criteria")
+        snapshot_path = current_snapshot_path() if USES_SNAPSHOT else None
+        vector_engine = load_vector_engine(snapshot_path)
+        serving = ServingState(
+            table=table,
+            version=table.version,
+            filter_columns=resolve_filter_columns(table.schema),
+            # RESULT_COLUMNS plus the chunk position columns, when the table has them
+            result_columns=RESULT_COLUMNS + [column for column in POSITION_COLUMNS if column in table.schema.names],
+            catalog=lender_catalog.get(table),
+            vector_engine=vector_engine,
+            lender_router=load_lender_router(snapshot_path, vector_engine),
+            snapshot_path=snapshot_path,
+        )
         print("✅ Database connection successful")
         return True
     except Exception as e:
         print(f"❌ Database connection error: {str(e)}")
-        table = None
+        serving = None
         return False
 
 # Try to initialize database
 init_database()
 
-def search_lender_criteria(query: str, num_results: int = 15, lender_filter: str = None):
+if reranker is not None:
+    print(f"🧮 Loading reranker {reranker.model_name}...")
+    reranker.warm_up()
+
+def create_query_embedding(query: str) -> List[float]:
+    """Call the embeddings API for a single query."""
+    response = client.embeddings.create(
+        input=query,
+        model=QUERY_EMBEDDING_MODEL
+    )
+    return response.data[0].embedding
+
+def embed_query(query: str) -> List[float]:
+    """Query embedding used for vector search, served from cache when possible."""
+    return query_embedding_cache.get_or_create(query, QUERY_EMBEDDING_MODEL, create_query_embedding)
+
+def create_query_embeddings(queries: List[str]) -> List[List[float]]:
+    """Call the embeddings API once for a list of queries."""
+    response = client.embeddings.create(
+        input=queries,
+        model=QUERY_EMBEDDING_MODEL
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Batched embed_query: cache misses share a single API call."""
+    return query_embedding_cache.get_or_create_many(queries, QUERY_EMBEDDING_MODEL, create_query_embeddings)
+
+def search_lender_criteria(query: str, num_results: int = 15, lender_filter=None,
+                           search_mode: str = DEFAULT_SEARCH_MODE, product_filter=None, section_filter=None,
+                           group_by_lender: bool = False, per_lender_k: int = DEFAULT_PER_LENDER_K,
+                           max_lenders: Optional[int] = None, mmr_lambda: Optional[float] = None,
+                           rerank: bool = False):
     """Search lender criteria with comprehensive results - exact replica of Python code."""
-    try:
-        if not table:
-            print("🔄 Database not available, trying to reconnect...")
-            if not init_database():
-                raise Exception("Database not available and reconnection failed")
-            
-        # Create embedding for the query
-        response = client.embeddings.create(
-            input=query,
-            model="text-embedding-ada-002"
-        )
-        query_embedding = response.data[0].embedding
-        
-        if lender_filter:
-            # Filter by specific lender
-            result = table.search(query_embedding, vector_column_name='embedding').where(f"metadata.lender_name = '{lender_filter}'").limit(num_results)
-        else:
-            # Search across all lenders with higher limit for better coverage
-            result = table.search(query_embedding, vector_column_name='embedding').limit(num_results)
-        
-        # Convert to pandas and sort by relevance score
-        df = result.to_pandas()
-        if not df.empty and 'score' in df.columns:
-            df = df.sort_values('score', ascending=False)
-        
-        return df
-    except Exception as e:
-        print(f"Search error: {str(e)}")
-        return pd.DataFrame()
+    if not serving:
+        print("🔄 Database not available, trying to reconnect...")
+        if not init_database():
+            print("Search error: Database not available and reconnection failed")
+            return []
+    
+    return retrieve_criteria(serving, query, embed_query, num_results, lender_filter, search_mode,
+                             product_filter, section_filter, group_by_lender, per_lender_k, max_lenders,
+                             mmr_lambda, rerank, reranker=reranker, search_params=SEARCH_PARAMS)
 
 @app.get("/")
 async def root():
@@ -99,50 +177,106 @@ async def root():
     return {
         "message": "Mortgage Criteria Backend API",
         "status": "running",
-        "database_connected": table is not None
+        "database_connected": serving is not None
     }
 
 @app.post("/search", response_model=List[SearchResult])
-async def search_criteria(request: SearchRequest):
+async def search_criteria(request: SearchRequest, response: Response):
     """Search mortgage criteria endpoint."""
     try:
-        results_df = search_lender_criteria(
+        # Mention detection reads the table's columns and catalog, so reconnect first
+        if not serving and not init_database():
+            raise Exception("Database not available and reconnection failed")
+
+        # Lenders and products named in the query become filters unless the request sets its own
+        detect = AUTO_FILTER_MENTIONS if request.detect_mentions is None else request.detect_mentions
+        if (detect and request.lender_filter is None and request.product_filter is None
+                and serving.filter_columns.get("lender") == "lender_id"):
+            detected = mention_filters(request.query, serving.catalog)
+            if detected:
+                request = request.model_copy(update=detected)
+                # The body stays a list, so the narrowing is reported in a header
+                response.headers["X-Applied-Filters"] = json.dumps(detected)
+        
+        results = search_lender_criteria(
             query=request.query,
             num_results=request.num_results,
-            lender_filter=request.lender_filter
+            lender_filter=request.lender_filter,
+            search_mode=request.search_mode,
+            product_filter=request.product_filter,
+            section_filter=request.section_filter,
+            group_by_lender=request.group_by_lender,
+            per_lender_k=request.per_lender_k,
+            max_lenders=request.max_lenders,
+            mmr_lambda=request.mmr_lambda,
+            rerank=RERANK_ENABLED if request.rerank is None else request.rerank
         )
         
-        if results_df.empty:
-            return []
+        # Sharp questions return fewer chunks; k and the reason go in headers, the body stays a list
+        use_adaptive = ADAPTIVE_K if request.adaptive_k is None else request.adaptive_k
+        if results and use_adaptive and not request.group_by_lender:
+            results, result_count = adaptive_k(results)
+            response.headers["X-Result-Count"] = f"{result_count['k']}/{result_count['candidates']}"
+            response.headers["X-Result-Count-Reason"] = result_count["reason"]
         
-        # Convert DataFrame to SearchResult objects
-        search_results = []
-        for _, row in results_df.iterrows():
-            search_result = SearchResult(
-                text=row['text'],
-                metadata=row['metadata'],
-                score=row.get('score', None)
-            )
-            search_results.append(search_result)
+        # Hits stitched together with their neighbouring chunks, so split criteria come back whole
+        window = NEIGHBOR_WINDOW if request.neighbor_window is None else request.neighbor_window
+        if window > 0 and "chunk_key" in serving.result_columns:
+            results = expand_neighbors(serving.table, results, window)
         
-        return search_results
+        return [
+            SearchResult(text=row['text'], metadata=row['metadata'], score=result_score(row))
+            for row in results
+        ]
         
     except Exception as e:
         print(f"Search endpoint error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@app.post("/search/batch", response_model=List[BatchSearchResult])
+async def search_criteria_batch(request: BatchSearchRequest):
+    """Search many queries at once, each with its own filters and k."""
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    
+    try:
+        if not serving and not init_database():
+            raise Exception("Database not available and reconnection failed")
+        
+        items = [item.model_dump() for item in request.queries]
+        batch_results = batch_search(serving.table, items, embed_queries, serving.filter_columns,
+                                     vector_engine=serving.vector_engine, search_params=SEARCH_PARAMS)
+        
+        return [
+            BatchSearchResult(
+                query=item["query"],
+                results=[
+                    SearchResult(text=row['text'], metadata=row['metadata'], score=result_score(row))
+                    for row in rows
+                ]
+            )
+            for item, rows in zip(items, batch_results)
+        ]
+        
+    except Exception as e:
+        print(f"Batch search endpoint error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "database_available": table is not None,
-        "openai_configured": bool(os.getenv("OPENAI_API_KEY"))
+        "database_available": serving is not None,
+        "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "reranker": reranker.stats() if reranker is not None else None,
+        "openai_pool": openai_pool_stats()
     }
 
 if __name__ == "__main__":
     print("🚀 Starting Mortgage Criteria Backend...")
-    print("📊 Database connection:", "✅ Connected" if table else "❌ Failed")
+    print("📊 Database connection:", "✅ Connected" if serving else "❌ Failed")
     print("🔑 OpenAI API:", "✅ Configured" if os.getenv("OPENAI_API_KEY") else "❌ Missing")
     print("🌐 Server starting on http://localhost:8000")
     
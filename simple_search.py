@@ -6,14 +6,30 @@ Simple search script that works like Streamlit
 import sys
 import json
 import lancedb
-import pandas as pd
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 
+from utils.embedding_cache import QueryEmbeddingCache
+from utils.filters import build_filter, compile_filter, resolve_filter_columns
+from utils.hybrid_search import RESULT_COLUMNS, result_score
+from utils.lender_registry import get_registry, lender_filter_values
+from utils.openai_client import get_openai_client
+from utils.vector_index import apply_search_params, load_search_params
+
 # Load environment variables
 load_dotenv()
 
+# Query-time ANN parameters tuned by build_indexes.py
+SEARCH_PARAMS = load_search_params()
+
+# Canonical lender names, resolved once per distinct stored name
+lender_registry = get_registry()
+
+QUERY_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# The on-disk tier lets repeated CLI runs reuse earlier query embeddings
+query_embedding_cache = QueryEmbeddingCache()
+
 def search_lender_criteria(query: str, num_results: int = 15, lender_filter: str = None):
     """Search lender criteria - exact same as Streamlit version."""
     try:
@@ -21,67 +37,46 @@ def search_lender_criteria(query: str, num_results: int = 15, lender_filter: str
         db = lancedb.connect("data/lancedb/lender_criteria.lance")
         table = db.open_table("lender_criteria")
         
-        # Create embedding for the query
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = client.embeddings.create(
-            input=query,
-            model="text-embedding-ada-002"
-        )
-        query_embedding = response.data[0].embedding
+        # Create embedding for the query (cached across runs)
+        def create_query_embedding(text):
+            response = get_openai_client().embeddings.create(
+                input=text,
+                model=QUERY_EMBEDDING_MODEL
+            )
+            return response.data[0].embedding
+        
+        query_embedding = query_embedding_cache.get_or_create(query, QUERY_EMBEDDING_MODEL, create_query_embedding)
         
         if lender_filter:
             # Filter by specific lender
-            result = table.search(query_embedding, vector_column_name='embedding').where(f"metadata.lender_name = '{lender_filter}'").limit(num_results)
+            filter_columns = resolve_filter_columns(table.schema)
+            where = compile_filter(build_filter(lender=lender_filter_values(lender_filter, filter_columns)), filter_columns)
+            result = apply_search_params(table.search(query_embedding, vector_column_name='embedding'), SEARCH_PARAMS).where(where, prefilter=True).limit(num_results)
         else:
             # Search across all lenders
-            result = table.search(query_embedding, vector_column_name='embedding').limit(num_results)
-        
-        # Convert to pandas and sort by relevance score
-        df = result.to_pandas()
-        if not df.empty and 'score' in df.columns:
-            df = df.sort_values('score', ascending=False)
+            result = apply_search_params(table.search(query_embedding, vector_column_name='embedding'), SEARCH_PARAMS).limit(num_results)
         
-        return df
+        # Ranked records with only the columns used below (no vectors)
+        return result.select(RESULT_COLUMNS).to_list()
     except Exception as e:
         print(f"Search error: {str(e)}", file=sys.stderr)
-        return pd.DataFrame()
+        return []
 
-def get_context_from_results(results_df: pd.DataFrame) -> str:
+def get_context_from_results(results: list) -> str:
     """Extract context from search results - exact same as Streamlit version."""
-    if results_df.empty:
+    if not results:
         return "No relevant criteria found."
     
     context_parts = []
     
-    for _, row in results_df.iterrows():
+    for row in results:
         metadata = row['metadata']
         lender_name = metadata['lender_name']
         criteria_section = metadata['criteria_section'] or 'General Criteria'
         text_content = row['text']
         
-        # Clean up the lender name (same logic as Python)
-        clean_lender_name = lender_name.replace('_residential.txt', '').replace('_residential.pdf', '')
-        clean_lender_name = clean_lender_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-        clean_lender_name = clean_lender_name.replace('_mortgage', '').replace('_criteria', '')
-        clean_lender_name = clean_lender_name.replace('_', ' ').title()
-        
-        # Additional cleaning for common patterns
-        clean_lender_name = clean_lender_name.replace('Residential', '').replace('Res', '').strip()
-        if clean_lender_name.endswith('.'):
-            clean_lender_name = clean_lender_name[:-1]
-        
-        # Final cleanup - remove extra spaces and normalize
-        clean_lender_name = ' '.join(clean_lender_name.split())
-        
-        # Handle specific cases
-        if clean_lender_name == 'Hsbcidential 1.Txt':
-            clean_lender_name = 'HSBC'
-        elif clean_lender_name == 'Skipton':
-            clean_lender_name = 'Skipton Building Society'
-        elif clean_lender_name == 'Halifaxidentialing Services':
-            clean_lender_name = 'Halifax'
-        elif clean_lender_name == 'Santanderidential 1.Txt':
-            clean_lender_name = 'Santander'
+        # Canonical display name, resolved once per distinct stored name
+        clean_lender_name = lender_registry.display_name(lender_name)
         
         # Format the context cleanly
         context_part = f"""
@@ -138,8 +133,7 @@ And so on..."""
     ]
 
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        completion = client.chat.completions.create(
+        completion = get_openai_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=messages_with_context,
             temperature=0.1,
@@ -161,7 +155,7 @@ if __name__ == "__main__":
     # Search for relevant criteria
     results = search_lender_criteria(query, num_results, lender_filter)
     
-    if not results.empty:
+    if results:
         # Get context from results
         context = get_context_from_results(results)
         
@@ -176,9 +170,9 @@ if __name__ == "__main__":
                 {
                     "text": row['text'],
                     "metadata": row['metadata'],
-                    "score": row.get('score', None)
+                    "score": result_score(row)
                 }
-                for _, row in results.iterrows()
+                for row in results
             ]
         }
         
@@ -0,0 +1,100 @@
+"""
+Tests for adaptive result counts (utils/adaptive_k.py)
+"""
+
+import pytest
+
+import utils.adaptive_k as adaptive
+from utils.adaptive_k import adaptive_k, score_gap_cutoff
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(adaptive, "count_tokens", lambda text: len(text.split()))
+
+
+def rows_at(*distances, words=1):
+    return [{"text": " ".join([f"chunk{i}"] * words), "_distance": d} for i, d in enumerate(distances)]
+
+
+def texts(rows):
+    return [row["text"].split()[0] for row in rows]
+
+
+def test_score_gap_cutoff():
+    assert score_gap_cutoff([1.0, 0.95, 0.9, 0.2, 0.1], min_k=1, gap_ratio=0.3) == 3
+    assert score_gap_cutoff([1.0, 0.9, 0.8, 0.7], min_k=1, gap_ratio=0.5) is None
+    assert score_gap_cutoff([1.0, 1.0], min_k=1, gap_ratio=0.3) is None
+    # The drop comes before min_k rows, so it is ignored
+    assert score_gap_cutoff([1.0, 0.1, 0.05], min_k=2, gap_ratio=0.3) is None
+
+
+def test_sharp_question_is_cut_at_the_score_gap():
+    kept, count = adaptive_k(rows_at(0.1, 0.12, 0.13, 0.9, 0.95), min_k=1, max_distance=None, token_budget=None)
+
+    assert texts(kept) == ["chunk0", "chunk1", "chunk2"]
+    assert count == {"k": 3, "candidates": 5, "reason": "score_gap"}
+
+
+def test_min_k_rows_are_always_kept():
+    kept, count = adaptive_k(rows_at(0.1, 0.9, 0.95), min_k=2, max_distance=0.5, token_budget=None)
+
+    assert len(kept) == 2
+    assert count["reason"] == "max_distance"
+
+
+def test_even_scores_keep_num_results():
+    kept, count = adaptive_k(rows_at(0.1, 0.2, 0.3, 0.4), min_k=1, gap_ratio=0.5, max_distance=None,
+                            token_budget=None)
+
+    assert len(kept) == 4
+    assert count["reason"] == "num_results"
+
+
+def test_distance_cutoff_counts_in_score_order():
+    # Hybrid rows ranked by fused score: the second best is too far away
+    rows = [
+        {"text": "a", "_distance": 0.2, "_relevance_score": 0.040},
+        {"text": "b", "_distance": 1.5, "_relevance_score": 0.039},
+        {"text": "c", "_distance": 0.3, "_relevance_score": 0.038},
+        {"text": "d", "_distance": 0.4, "_relevance_score": 0.037},
+    ]
+
+    kept, count = adaptive_k(rows, min_k=1, gap_ratio=1.0, max_distance=1.0, token_budget=None)
+
+    assert texts(kept) == ["a"]
+    assert count["reason"] == "max_distance"
+
+
+def test_rows_without_distance_do_not_end_the_distance_run():
+    rows = [
+        {"text": "vector", "_distance": 0.2, "_relevance_score": 0.04},
+        {"text": "lexical", "_score": 7.0, "_relevance_score": 0.03},
+        {"text": "far", "_distance": 1.5, "_relevance_score": 0.02},
+    ]
+
+    kept, _ = adaptive_k(rows, min_k=1, gap_ratio=1.0, max_distance=1.0, token_budget=None)
+
+    assert texts(kept) == ["vector", "lexical"]
+
+
+def test_kept_rows_keep_their_given_order():
+    # MMR order differs from score order
+    rows = rows_at(0.3, 0.1, 0.9, 0.2)
+
+    kept, _ = adaptive_k(rows, min_k=1, gap_ratio=0.5, max_distance=None, token_budget=None)
+
+    assert texts(kept) == ["chunk0", "chunk1", "chunk3"]
+
+
+def test_token_budget_stops_the_results():
+    kept, count = adaptive_k(rows_at(0.1, 0.11, 0.12, words=10), max_distance=None, token_budget=25)
+
+    assert len(kept) == 2
+    assert count["reason"] == "token_budget"
+
+
+def test_one_row_is_kept_whatever_its_size():
+    kept, _ = adaptive_k(rows_at(0.1, 0.11, words=50), max_distance=None, token_budget=10)
+
+    assert len(kept) == 1
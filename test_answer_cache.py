@@ -0,0 +1,131 @@
+"""
+Tests for the semantic answer cache (utils/answer_cache.py)
+"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+from utils.answer_cache import SemanticAnswerCache
+
+FILTERS = {"lender_filter": None, "product_filter": None, "num_results": 15}
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "answers.sqlite")
+
+
+@pytest.fixture
+def cache(cache_path):
+    return SemanticAnswerCache(cache_path, similarity_threshold=0.95)
+
+
+def store(cache, query, vector, version=1, filters=FILTERS, response="cached answer"):
+    cache.store(query, vector, version, filters, response, [{"text": "chunk", "score": np.float32(0.5)}])
+
+
+def test_similar_query_gets_the_stored_answer(cache):
+    store(cache, "What is Barclays max LTV?", unit(1, 0, 0))
+
+    hit = cache.lookup("Barclays maximum LTV", unit(1, 0.05, 0), 1, FILTERS)
+
+    assert hit["response"] == "cached answer"
+    assert hit["query"] == "What is Barclays max LTV?"
+    assert hit["search_results"] == [{"text": "chunk", "score": 0.5}]
+    assert hit["similarity"] >= 0.95
+
+
+def test_dissimilar_query_misses(cache):
+    store(cache, "What is Barclays max LTV?", unit(1, 0, 0))
+
+    assert cache.lookup("Barclays minimum income", unit(1, 1, 0), 1, FILTERS) is None
+
+
+def test_different_numbers_never_share_an_answer(cache):
+    store(cache, "HMO at 85% LTV", unit(1, 0, 0))
+
+    assert cache.lookup("HMO at 90% LTV", unit(1, 0, 0), 1, FILTERS) is None
+    assert cache.lookup("HMO at 85% LTV?", unit(1, 0, 0), 1, FILTERS) is not None
+
+
+def test_number_formatting_does_not_matter(cache):
+    store(cache, "Loan of £75,000 at 85%", unit(1, 0, 0))
+
+    assert cache.lookup("85% on a 75000 loan", unit(1, 0, 0), 1, FILTERS) is not None
+
+
+def test_answers_are_scoped_by_filters(cache):
+    store(cache, "max LTV", unit(1, 0, 0))
+
+    assert cache.lookup("max LTV", unit(1, 0, 0), 1, {**FILTERS, "lender_filter": "barclays"}) is None
+
+
+def test_new_table_version_invalidates_answers(cache, cache_path):
+    store(cache, "max LTV", unit(1, 0, 0), version=1)
+
+    assert cache.lookup("max LTV", unit(1, 0, 0), 2, FILTERS) is None
+    assert sqlite3.connect(cache_path).execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 0
+    assert cache.stats()["table_version"] == 2
+
+
+def test_answers_are_shared_between_workers(cache, cache_path):
+    worker = SemanticAnswerCache(cache_path, similarity_threshold=0.95)
+    assert worker.lookup("max LTV", unit(1, 0, 0), 1, FILTERS) is None
+
+    store(cache, "max LTV", unit(1, 0, 0))
+
+    assert worker.lookup("max LTV", unit(1, 0, 0), 1, FILTERS)["response"] == "cached answer"
+    assert worker.stats()["hits"] == 1
+    assert worker.stats()["misses"] == 1
+
+
+def test_least_recently_used_answers_are_evicted(cache_path):
+    cache = SemanticAnswerCache(cache_path, similarity_threshold=0.95, max_entries=4)
+    vectors = np.eye(5, dtype=np.float32)
+    for query, vector in zip("abcd", vectors):
+        store(cache, query, vector)
+    assert cache.lookup("a", vectors[0], 1, FILTERS) is not None
+
+    store(cache, "e", vectors[4])
+
+    # Trimmed to 90% of the limit: b and c were used least recently
+    kept = [query for query, vector in zip("abcde", vectors) if cache.lookup(query, vector, 1, FILTERS)]
+    assert kept == ["a", "d", "e"]
+    assert cache.stats()["evictions"] == 2
+    assert sqlite3.connect(cache_path).execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 3
+
+
+def test_rows_evicted_by_another_worker_are_missed(cache_path):
+    cache = SemanticAnswerCache(cache_path, similarity_threshold=0.95, max_entries=2)
+    worker = SemanticAnswerCache(cache_path, similarity_threshold=0.95, max_entries=2)
+    vectors = np.eye(3, dtype=np.float32)
+    store(cache, "a", vectors[0])
+    assert worker.lookup("a", vectors[0], 1, FILTERS) is not None
+
+    store(cache, "b", vectors[1])
+    store(cache, "c", vectors[2])
+
+    assert worker.lookup("a", vectors[0], 1, FILTERS) is None
+    assert worker.lookup("c", vectors[2], 1, FILTERS) is not None
+
+
+def test_cache_files_without_last_used_are_upgraded(cache_path):
+    conn = sqlite3.connect(cache_path)
+    conn.execute(
+        "CREATE TABLE answers (id INTEGER PRIMARY KEY AUTOINCREMENT, table_version INTEGER NOT NULL, "
+        "scope TEXT NOT NULL, query TEXT NOT NULL, numbers TEXT NOT NULL, vector BLOB NOT NULL, "
+        "response TEXT NOT NULL, search_results TEXT NOT NULL, created_at REAL NOT NULL)"
+    )
+    conn.close()
+    cache = SemanticAnswerCache(cache_path, similarity_threshold=0.95)
+
+    store(cache, "max LTV", unit(1, 0, 0))
+
+    assert cache.lookup("max LTV", unit(1, 0, 0), 1, FILTERS) is not None
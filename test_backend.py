@@ -33,9 +33,10 @@ except Exception as e:
 
 # Test 4: OpenAI connection
 try:
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    from utils.openai_client import get_openai_client, openai_pool_stats
+    client = get_openai_client()
     print("✅ OpenAI client created successfully")
+    print(f"🔌 Connection pool: {openai_pool_stats()['sync']}")
 except Exception as e:
     print(f"❌ OpenAI error: {str(e)}")
 
@@ -0,0 +1,68 @@
+"""
+Tests for /search/batch and the batched search behind it (utils/batch_search.py)
+"""
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from utils.batch_search import batch_search
+from utils.filters import resolve_filter_columns
+from utils.hybrid_search import vector_search
+
+DIM = 8
+LENDERS = ["barclays", "hsbc", "natwest"]
+
+
+@pytest.fixture
+def table(tmp_path):
+    vectors = np.random.default_rng(3).normal(size=(60, DIM)).astype(np.float32)
+    return lancedb.connect(str(tmp_path)).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(len(vectors))],
+        "metadata": [{"chunk_id": f"chunk_{i:06d}", "lender_name": LENDERS[i % 3]} for i in range(len(vectors))],
+        "lender_id": [LENDERS[i % 3] for i in range(len(vectors))],
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), DIM),
+    }))
+
+
+def embed_many(texts):
+    return [np.random.default_rng(len(text)).normal(size=DIM).astype(np.float32) for text in texts]
+
+
+def test_each_query_gets_its_own_results(table):
+    items = [
+        {"query": "maximum age", "num_results": 5, "search_mode": "vector"},
+        {"query": "income", "num_results": 3, "search_mode": "vector", "lender_filter": "hsbc"},
+    ]
+
+    first, second = batch_search(table, items, embed_many, resolve_filter_columns(table.schema))
+
+    assert [row["text"] for row in first] == [
+        row["text"] for row in vector_search(table, embed_many(["maximum age"])[0], 5)
+    ]
+    assert len(second) == 3
+    assert all(row["metadata"]["lender_name"] == "hsbc" for row in second)
+
+
+def test_grouped_query_returns_best_chunks_per_lender(table):
+    items = [{"query": "compare lenders", "num_results": 15, "search_mode": "vector",
+              "group_by_lender": True, "per_lender_k": 2, "max_lenders": 2}]
+
+    [rows] = batch_search(table, items, embed_many, resolve_filter_columns(table.schema))
+
+    lenders = [row["metadata"]["lender_name"] for row in rows]
+    assert len(rows) == 4
+    assert len(set(lenders)) == 2
+    assert all(lenders.count(lender) == 2 for lender in lenders)
+    assert [row["_lender_rank"] for row in rows] == [0, 0, 1, 1]
+
+
+def test_batch_request_keeps_grouping_fields():
+    from optimized_backend import BatchSearchRequest
+
+    request = BatchSearchRequest(queries=[{"query": "compare", "group_by_lender": True,
+                                           "per_lender_k": 3, "max_lenders": 5}])
+
+    item = request.queries[0].model_dump()
+    assert (item["group_by_lender"], item["per_lender_k"], item["max_lenders"]) == (True, 3, 5)
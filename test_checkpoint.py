@@ -0,0 +1,94 @@
+"""
+Tests for the embedding job checkpoint behind 3-embedding.py --resume
+"""
+
+import json
+
+import pytest
+
+from utils.checkpoint import (
+    CHECKPOINT_FILENAME,
+    EmbeddingJobCheckpoint,
+    fingerprint_chunks,
+    load_reusable_embeddings,
+    save_reusable_embeddings,
+)
+
+
+def make_chunks(count):
+    return [{"text": f"chunk {i}", "metadata": {"chunk_id": f"chunk_{i:06d}"}} for i in range(count)]
+
+
+def test_new_job_starts_at_first_batch():
+    checkpoint = EmbeddingJobCheckpoint.start(make_chunks(10), batch_size=4, table_name="lender_criteria")
+
+    assert checkpoint.total_batches == 3
+    assert checkpoint.next_batch == 0
+    assert checkpoint.status == "running"
+    assert not checkpoint.is_complete
+
+
+def test_resume_continues_after_last_committed_batch(tmp_path):
+    chunks = make_chunks(10)
+    checkpoint = EmbeddingJobCheckpoint.start(chunks, batch_size=4, table_name="lender_criteria")
+    checkpoint.commit_batch(0, table_version=2, job_dir=str(tmp_path))
+    checkpoint.mark("interrupted", str(tmp_path))
+
+    resumed = EmbeddingJobCheckpoint.load(str(tmp_path))
+
+    assert resumed.job_id == checkpoint.job_id
+    assert resumed.status == "interrupted"
+    assert resumed.next_batch == 1
+    assert resumed.table_version == 2
+    assert resumed.input_fingerprint == fingerprint_chunks(chunks)
+
+
+def test_last_batch_completes_the_job(tmp_path):
+    checkpoint = EmbeddingJobCheckpoint.start(make_chunks(10), batch_size=4, table_name="lender_criteria")
+    for batch_index in range(checkpoint.total_batches):
+        checkpoint.commit_batch(batch_index, table_version=batch_index + 2, job_dir=str(tmp_path))
+
+    loaded = EmbeddingJobCheckpoint.load(str(tmp_path))
+    assert loaded.is_complete
+    assert loaded.next_batch == loaded.total_batches
+
+
+def test_fingerprint_changes_with_any_chunk():
+    chunks = make_chunks(3)
+    changed = make_chunks(3)
+    changed[1]["text"] = "chunk 1, edited"
+
+    assert fingerprint_chunks(chunks) == fingerprint_chunks(make_chunks(3))
+    assert fingerprint_chunks(chunks) != fingerprint_chunks(changed)
+
+
+def test_save_leaves_no_temporary_file(tmp_path):
+    EmbeddingJobCheckpoint.start(make_chunks(1), batch_size=1, table_name="t").save(str(tmp_path))
+
+    assert [path.name for path in tmp_path.iterdir()] == [CHECKPOINT_FILENAME]
+
+
+def test_load_without_a_job_returns_none(tmp_path):
+    assert EmbeddingJobCheckpoint.load(str(tmp_path)) is None
+
+
+@pytest.mark.parametrize("content", ["{not json", json.dumps({"job_id": "abc"})])
+def test_load_rejects_corrupt_checkpoint(tmp_path, content):
+    (tmp_path / CHECKPOINT_FILENAME).write_text(content, encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        EmbeddingJobCheckpoint.load(str(tmp_path))
+
+
+def test_reusable_embeddings_survive_for_resume(tmp_path):
+    embeddings = {"a" * 64: [0.25, -1.5, 3.0], "b" * 64: [1.0, 0.0, 0.5]}
+    save_reusable_embeddings(embeddings, str(tmp_path))
+
+    assert load_reusable_embeddings(str(tmp_path)) == embeddings
+
+
+def test_no_reusable_embeddings(tmp_path):
+    assert load_reusable_embeddings(str(tmp_path)) == {}
+
+    save_reusable_embeddings({}, str(tmp_path))
+    assert load_reusable_embeddings(str(tmp_path)) == {}
@@ -0,0 +1,91 @@
+"""
+Tests for MMR diversification and near-duplicate collapsing (utils/diversify.py)
+"""
+
+import numpy as np
+import pytest
+
+from utils.diversify import collapse_near_duplicates, diversify, drop_near_duplicates, mmr_select
+
+
+def unit_rows(*rows):
+    matrix = np.asarray(rows, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def chunk(text, vector=None, filename="doc.pdf", **fields):
+    row = {"text": text, "metadata": {"filename": filename}, **fields}
+    if vector is not None:
+        row["embedding"] = vector
+    return row
+
+
+def test_lambda_one_ranks_by_relevance():
+    vectors = unit_rows([1, 0], [1, 0.01], [0, 1])
+
+    assert mmr_select(np.array([0.9, 0.8, 0.1]), vectors, 3, mmr_lambda=1.0) == [0, 1, 2]
+
+
+def test_mmr_skips_a_redundant_second_choice():
+    # Candidate 1 is almost candidate 0; candidate 2 is less relevant but new
+    vectors = unit_rows([1, 0], [1, 0.01], [0, 1])
+
+    assert mmr_select(np.array([0.9, 0.85, 0.6]), vectors, 2, mmr_lambda=0.5) == [0, 2]
+
+
+def test_mmr_never_selects_a_candidate_twice():
+    vectors = unit_rows([1, 0], [0, 1])
+
+    assert mmr_select(np.array([1.0, 0.0]), vectors, 5) == [0, 1]
+
+
+def test_near_duplicate_text_is_collapsed_into_the_better_row():
+    rows = [
+        chunk("Maximum LTV for HMO properties is 75 percent", filename="a.pdf"),
+        chunk("Maximum LTV for HMO properties is 75 percent.", filename="b.pdf"),
+        chunk("Minimum income is 25,000 for joint applicants", filename="c.pdf"),
+    ]
+
+    assert collapse_near_duplicates(rows) == [0, 2]
+    assert rows[0]["_duplicate_sources"] == ["b.pdf"]
+
+
+def test_near_duplicate_vectors_are_collapsed():
+    vectors = unit_rows([1, 0], [1, 0.001], [0, 1])
+    rows = [chunk("first wording"), chunk("entirely different words here"), chunk("third")]
+
+    assert collapse_near_duplicates(rows, vectors) == [0, 2]
+
+
+def test_drop_near_duplicates_keeps_order():
+    rows = [chunk("alpha beta gamma delta"), chunk("epsilon zeta eta"), chunk("alpha beta gamma delta")]
+
+    assert [row["text"] for row in drop_near_duplicates(rows)] == ["alpha beta gamma delta", "epsilon zeta eta"]
+
+
+def test_diversify_uses_the_query_vector_for_relevance():
+    rows = [
+        chunk("income rules for employed applicants", [1, 0, 0]),
+        chunk("income rules for contractors and locums", [0.99, 0.14, 0]),
+        chunk("property types accepted for lending", [0.6, 0, 0.8]),
+    ]
+
+    selected = diversify(rows, 2, query_vector=[1, 0, 0], mmr_lambda=0.5)
+
+    assert [row["text"] for row in selected] == [rows[0]["text"], rows[2]["text"]]
+
+
+def test_diversify_without_query_vector_uses_retriever_scores():
+    rows = [
+        chunk("weaker match on age limits", [0, 1], _distance=0.8),
+        chunk("best match on income multiples", [1, 0], _distance=0.1),
+    ]
+
+    assert diversify(rows, 1, mmr_lambda=1.0)[0]["text"] == "best match on income multiples"
+
+
+@pytest.mark.parametrize("limit", [1, 2])
+def test_diversify_without_vectors_truncates(limit):
+    rows = [chunk("alpha beta gamma"), chunk("delta epsilon zeta"), chunk("eta theta iota")]
+
+    assert diversify(rows, limit) == rows[:limit]
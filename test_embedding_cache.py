@@ -0,0 +1,118 @@
+"""
+Tests for the two-tier query embedding cache (utils/embedding_cache.py)
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from utils.embedding_cache import QueryEmbeddingCache, cache_key, normalize_query
+
+MODEL = "text-embedding-3-large"
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        # float64 values that float32 can't hold exactly
+        return [0.1, 1 / 3, len(text) + 0.123456789]
+
+    def many(self, texts):
+        self.calls.append(list(texts))
+        return [self(text) for text in texts]
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "query_embeddings.sqlite")
+
+
+@pytest.mark.parametrize("variant", [
+    "What is the max LTV?",
+    "what is the max ltv",
+    "  What   is the MAX LTV?! ",
+])
+def test_equivalent_queries_share_a_key(variant):
+    assert normalize_query(variant) == "what is the max ltv"
+    assert cache_key(variant, MODEL) == cache_key("What is the max LTV?", MODEL)
+
+
+def test_keys_are_scoped_by_model():
+    assert cache_key("max ltv", MODEL) != cache_key("max ltv", "text-embedding-3-small")
+
+
+def test_both_tiers_return_the_same_float32_vector(cache_path):
+    embed = CountingEmbedder()
+    created = QueryEmbeddingCache(cache_path).get_or_create("max LTV", MODEL, embed)
+    # A fresh instance, as in another worker: first hit from SQLite, then from memory
+    cache = QueryEmbeddingCache(cache_path)
+    from_disk = cache.get("max LTV", MODEL)
+    from_memory = cache.get("max LTV", MODEL)
+
+    assert created.dtype == from_disk.dtype == from_memory.dtype == np.float32
+    np.testing.assert_array_equal(created, from_disk)
+    np.testing.assert_array_equal(from_disk, from_memory)
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["memory_hits"] == 1
+    assert len(embed.calls) == 1
+
+
+def test_cached_vectors_are_read_only(cache_path):
+    vector = QueryEmbeddingCache(cache_path).get_or_create("max LTV", MODEL, CountingEmbedder())
+
+    with pytest.raises(ValueError):
+        vector[0] = 1.0
+
+
+def test_expired_entries_are_missed(cache_path):
+    QueryEmbeddingCache(cache_path).put("max LTV", MODEL, [1.0, 2.0])
+
+    assert QueryEmbeddingCache(cache_path, ttl_seconds=-1).get("max LTV", MODEL) is None
+
+
+def test_memory_only_cache(tmp_path):
+    cache = QueryEmbeddingCache(path=None)
+    cache.put("max LTV", MODEL, [1.0, 2.0])
+
+    np.testing.assert_array_equal(cache.get("Max LTV?", MODEL), [1.0, 2.0])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_memory_tier_is_bounded(cache_path):
+    cache = QueryEmbeddingCache(cache_path, max_memory_entries=2)
+    for query in ("a", "b", "c"):
+        cache.put(query, MODEL, [1.0])
+
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.get("a", MODEL) is not None
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_batch_embeds_each_distinct_miss_once(cache_path):
+    embed = CountingEmbedder()
+    cache = QueryEmbeddingCache(cache_path)
+    cache.put("known", MODEL, [9.0, 9.0, 9.0])
+
+    vectors = cache.get_or_create_many(["new", "known", "new"], MODEL, embed.many)
+
+    assert embed.calls[0] == ["new"]
+    np.testing.assert_array_equal(vectors[1], [9.0, 9.0, 9.0])
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    np.testing.assert_array_equal(vectors[0], cache.get("new", MODEL))
+
+
+def test_async_lookup_matches_sync_lookup(cache_path):
+    embed = CountingEmbedder()
+    cache = QueryEmbeddingCache(cache_path)
+
+    async def embed_async(text):
+        return embed(text)
+
+    created = asyncio.run(cache.get_or_create_async("max LTV", MODEL, embed_async))
+
+    np.testing.assert_array_equal(created, cache.get_or_create("max LTV", MODEL, embed))
+    assert len(embed.calls) == 1
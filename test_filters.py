@@ -0,0 +1,105 @@
+"""
+Tests for typed filters compiled to LanceDB where clauses (utils/filters.py)
+"""
+
+import lancedb
+import pyarrow as pa
+import pytest
+
+from utils.filters import (
+    And,
+    Eq,
+    In,
+    Or,
+    build_filter,
+    compile_filter,
+    match,
+    quote_literal,
+    resolve_filter_columns,
+)
+
+COLUMNS = {"lender": "lender_id", "product": "product_type", "section": "criteria_section"}
+
+
+@pytest.mark.parametrize("value, literal", [
+    ("barclays", "'barclays'"),
+    ("Lender's Criteria", "'Lender''s Criteria'"),
+    ("'; DROP TABLE x; --", "'''; DROP TABLE x; --'"),
+    (5, "5"),
+    (2.5, "2.5"),
+    (True, "TRUE"),
+    (False, "FALSE"),
+])
+def test_quote_literal(value, literal):
+    assert quote_literal(value) == literal
+
+
+def test_quote_literal_rejects_other_types():
+    with pytest.raises(TypeError):
+        quote_literal(None)
+    with pytest.raises(TypeError):
+        quote_literal(["a"])
+
+
+def test_empty_in_matches_nothing():
+    assert In("lender", ()).compile(COLUMNS) == "FALSE"
+
+
+def test_compiled_clauses():
+    assert Eq("lender", "barclays").compile(COLUMNS) == "lender_id = 'barclays'"
+    assert In("product", ("residential", "btl")).compile(COLUMNS) == "product_type IN ('residential', 'btl')"
+    assert And((Eq("lender", "a"), Eq("product", "b"))).compile(COLUMNS) == "(lender_id = 'a') AND (product_type = 'b')"
+    assert Or((Eq("lender", "a"), In("lender", ()))).compile(COLUMNS) == "(lender_id = 'a') OR (FALSE)"
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(ValueError):
+        Eq("broker", "x").compile(COLUMNS)
+
+
+def test_match_picks_eq_or_in():
+    assert match("lender", None) is None
+    assert match("lender", []) is None
+    assert match("lender", "a") == Eq("lender", "a")
+    assert match("lender", ["a", "a"]) == Eq("lender", "a")
+    assert match("lender", ["a", "b", "a"]) == In("lender", ("a", "b"))
+
+
+def test_build_filter_combines_set_fields():
+    assert build_filter() is None
+    assert compile_filter(build_filter(), COLUMNS) is None
+    assert compile_filter(build_filter(lender="hsbc", section=["Income", "Age"]), COLUMNS) == (
+        "(lender_id = 'hsbc') AND (criteria_section IN ('Income', 'Age'))"
+    )
+
+
+def test_legacy_tables_fall_back_to_metadata_columns():
+    schema = pa.schema([("text", pa.string()), ("metadata", pa.struct([("lender_name", pa.string())]))])
+
+    assert resolve_filter_columns(schema) == {
+        "lender": "metadata.lender_name",
+        "section": "metadata.criteria_section",
+    }
+
+
+def test_promoted_columns_are_preferred():
+    schema = pa.schema([("lender_id", pa.string()), ("lender_name", pa.string()),
+                        ("product_type", pa.string()), ("criteria_section", pa.string())])
+
+    assert resolve_filter_columns(schema) == COLUMNS
+
+
+def test_quoted_values_filter_lancedb_exactly(tmp_path):
+    table = lancedb.connect(str(tmp_path)).create_table("criteria", pa.table({
+        "lender_id": ["o'neill", "barclays", "x' OR '1'='1"],
+        "product_type": ["residential"] * 3,
+        "criteria_section": ["Income", "Income", "Age"],
+    }))
+    columns = resolve_filter_columns(table.schema)
+
+    def lenders(where):
+        return sorted(row["lender_id"] for row in table.search().where(where).to_list())
+
+    assert lenders(compile_filter(build_filter(lender="o'neill"), columns)) == ["o'neill"]
+    assert lenders(compile_filter(build_filter(lender="x' OR '1'='1"), columns)) == ["x' OR '1'='1"]
+    assert lenders(compile_filter(In("lender", ()), columns)) == []
@@ -0,0 +1,123 @@
+"""
+Tests for per-lender grouped retrieval (utils/grouped_search.py, InMemoryVectorEngine.search_grouped)
+"""
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from utils.grouped_search import group_by_lender, grouped_search
+from utils.vector_snapshot import InMemoryVectorEngine, export_snapshot
+
+DIM = 8
+
+
+def row(lender, name, score):
+    return {"text": name, "lender_id": lender, "_relevance_score": score}
+
+
+def texts(rows):
+    return [r["text"] for r in rows]
+
+
+def test_each_lender_keeps_its_best_rows():
+    rows = [row("hsbc", "h1", 0.9), row("barclays", "b1", 0.8), row("hsbc", "h2", 0.7),
+            row("hsbc", "h3", 0.6), row("natwest", "n1", 0.5), row("barclays", "b2", 0.4)]
+
+    grouped = group_by_lender(rows, per_lender_k=2)
+
+    assert texts(grouped) == ["h1", "h2", "b1", "b2", "n1"]
+    assert [r["_lender_rank"] for r in grouped] == [0, 0, 1, 1, 2]
+
+
+def test_max_lenders_keeps_the_best_lenders():
+    rows = [row("hsbc", "h1", 0.9), row("barclays", "b1", 0.8), row("natwest", "n1", 0.5)]
+
+    assert texts(group_by_lender(rows, per_lender_k=1, max_lenders=2)) == ["h1", "b1"]
+    assert group_by_lender(rows, per_lender_k=0) == []
+
+
+def test_ties_keep_the_ranked_order():
+    rows = [row("natwest", "n1", 0.5), row("barclays", "b1", 0.5), row("natwest", "n2", 0.5)]
+
+    assert texts(group_by_lender(rows, per_lender_k=2)) == ["n1", "n2", "b1"]
+
+
+def test_lender_comes_from_metadata_without_a_lender_column():
+    rows = [{"text": "a", "metadata": {"lender_name": "Barcleys"}}, {"text": "b", "metadata": {"lender_name": "HSBC"}}]
+
+    assert [r["_lender_rank"] for r in group_by_lender(rows, per_lender_k=1)] == [0, 1]
+
+
+@pytest.fixture
+def table(tmp_path):
+    vectors = np.random.default_rng(21).normal(size=(80, DIM)).astype(np.float32)
+    # natwest only has two chunks
+    lenders = [("barclays", "hsbc", "santander")[i % 3] if i % 40 else "natwest" for i in range(len(vectors))]
+    return lancedb.connect(str(tmp_path / "db")).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(len(vectors))],
+        "metadata": [{"lender_name": lender} for lender in lenders],
+        "lender_id": lenders,
+        "product_type": ["btl" if i % 2 else "residential" for i in range(len(vectors))],
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), DIM),
+    }))
+
+
+@pytest.fixture
+def engine(table, tmp_path):
+    export_snapshot(table, str(tmp_path / "snapshot"))
+    return InMemoryVectorEngine.load(str(tmp_path / "snapshot"))
+
+
+@pytest.mark.parametrize("per_lender_k, max_lenders", [(1, None), (3, None), (3, 2), (5, 1)])
+def test_lancedb_and_numpy_paths_agree(table, engine, per_lender_k, max_lenders):
+    query = np.random.default_rng(4).normal(size=DIM).astype(np.float32)
+
+    def embed(_):
+        return query
+
+    exact = grouped_search(table, "q", embed, per_lender_k, max_lenders, vector_engine=engine)
+    lancedb_rows = grouped_search(table, "q", embed, per_lender_k, max_lenders)
+
+    assert texts(exact) == texts(lancedb_rows)
+    assert [r["_lender_rank"] for r in exact] == [r["_lender_rank"] for r in lancedb_rows]
+    np.testing.assert_allclose([r["_distance"] for r in exact], [r["_distance"] for r in lancedb_rows],
+                               rtol=1e-4, atol=1e-4)
+
+
+def test_engine_caps_lenders_with_few_rows(engine):
+    rows = engine.search_grouped(np.ones(DIM, dtype=np.float32), per_lender_k=5)
+
+    counts = {}
+    for r in rows:
+        counts[r["metadata"]["lender_name"]] = counts.get(r["metadata"]["lender_name"], 0) + 1
+    assert counts == {"barclays": 5, "hsbc": 5, "natwest": 2, "santander": 5}
+
+
+def test_engine_groups_only_filtered_rows(engine):
+    rows = engine.search_grouped(np.ones(DIM, dtype=np.float32), per_lender_k=2,
+                                 lender=["hsbc", "natwest"], product="residential")
+
+    assert {r["metadata"]["lender_name"] for r in rows} == {"hsbc", "natwest"}
+    assert len(rows) == 4
+    # Even chunks are residential
+    assert all(int(r["text"].split()[1]) % 2 == 0 for r in rows)
+
+
+def test_engine_ties_go_to_the_first_lender_and_row(tmp_path):
+    # Every chunk has the same vector, so every distance ties
+    lenders = ["natwest", "barclays"] * 500
+    table = lancedb.connect(str(tmp_path / "db")).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(len(lenders))],
+        "metadata": [{"lender_name": lender} for lender in lenders],
+        "lender_id": lenders,
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(np.ones(len(lenders) * DIM, np.float32)), DIM),
+    }))
+    export_snapshot(table, str(tmp_path / "snapshot"))
+    engine = InMemoryVectorEngine.load(str(tmp_path / "snapshot"))
+
+    rows = engine.search_grouped(np.zeros(DIM, dtype=np.float32), per_lender_k=2)
+
+    # Lenders in snapshot (id) order, rows in table order within a lender
+    assert texts(rows) == ["chunk 1", "chunk 3", "chunk 0", "chunk 2"]
@@ -0,0 +1,125 @@
+"""
+Tests for reloading the served table version without a restart (utils/hot_reload.py)
+"""
+
+import asyncio
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from utils.hot_reload import ServingState, TableWatcher, warm_up
+from utils.vector_snapshot import current_snapshot_path, export_snapshot
+
+DIM = 4
+
+
+@pytest.fixture
+def db_uri(tmp_path):
+    uri = str(tmp_path / "db")
+    vectors = np.random.default_rng(5).normal(size=(20, DIM)).astype(np.float32)
+    lancedb.connect(uri).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(len(vectors))],
+        "metadata": [{"chunk_id": f"chunk_{i:06d}"} for i in range(len(vectors))],
+        "lender_id": ["barclays" if i % 2 else "hsbc" for i in range(len(vectors))],
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), DIM),
+    }))
+    return uri
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    return str(tmp_path / "snapshot")
+
+
+def load_state(db_uri, snapshot_dir, uses_snapshot=True) -> ServingState:
+    table = lancedb.connect(db_uri).open_table("criteria")
+    warm_up(table)
+    return ServingState(table=table, version=table.version, filter_columns={}, result_columns=["text"],
+                        catalog={}, snapshot_path=current_snapshot_path(snapshot_dir) if uses_snapshot else None)
+
+
+def add_rows(db_uri):
+    table = lancedb.connect(db_uri).open_table("criteria")
+    table.add(table.search().limit(2).to_arrow())
+    return table
+
+
+def watch(watcher, state, load, seconds=0.3):
+    """Runs the watcher for ``seconds``; returns the states swapped in."""
+    served = [state]
+
+    async def main():
+        task = asyncio.ensure_future(watcher.run(lambda: served[-1], load, served.append))
+        await asyncio.sleep(seconds)
+        task.cancel()
+
+    asyncio.run(main())
+    return served[1:]
+
+
+def test_fresh_state_is_not_stale(db_uri, snapshot_dir):
+    assert not TableWatcher(db_uri, "criteria", snapshot_dir).is_stale(load_state(db_uri, snapshot_dir))
+
+
+def test_new_table_version_is_stale(db_uri, snapshot_dir):
+    watcher = TableWatcher(db_uri, "criteria", snapshot_dir)
+    state = load_state(db_uri, snapshot_dir)
+
+    add_rows(db_uri)
+
+    assert watcher.is_stale(state)
+    # The serving table itself stays on the version it was loaded at
+    assert state.table.version == state.version
+
+
+def test_new_snapshot_is_stale(db_uri, snapshot_dir):
+    watcher = TableWatcher(db_uri, "criteria", snapshot_dir)
+    state = load_state(db_uri, snapshot_dir)
+
+    export_snapshot(lancedb.connect(db_uri).open_table("criteria"), snapshot_dir)
+
+    assert watcher.is_stale(state)
+    assert not watcher.is_stale(load_state(db_uri, snapshot_dir))
+
+
+def test_snapshot_is_ignored_when_not_served(db_uri, snapshot_dir):
+    # Default backend: LanceDB search without routing, while build_indexes.py still exports snapshots
+    watcher = TableWatcher(db_uri, "criteria", snapshot_dir, interval=0.02, watch_snapshots=False)
+    state = load_state(db_uri, snapshot_dir, uses_snapshot=False)
+    export_snapshot(lancedb.connect(db_uri).open_table("criteria"), snapshot_dir)
+
+    assert not watcher.is_stale(state)
+    assert watch(watcher, state, lambda: load_state(db_uri, snapshot_dir, uses_snapshot=False)) == []
+    assert watcher.stats()["reloads"] == 0
+    add_rows(db_uri)
+    assert watcher.is_stale(state)
+
+
+def test_watcher_swaps_in_the_new_version_once(db_uri, snapshot_dir):
+    watcher = TableWatcher(db_uri, "criteria", snapshot_dir, interval=0.02)
+    state = load_state(db_uri, snapshot_dir)
+    latest = add_rows(db_uri).version
+
+    swapped = watch(watcher, state, lambda: load_state(db_uri, snapshot_dir))
+
+    assert [new_state.version for new_state in swapped] == [latest]
+    assert swapped[0].table.count_rows() == state.table.count_rows() + 2
+    stats = watcher.stats()
+    assert stats["reloads"] == 1
+    assert stats["last_reload"]["from_version"] == state.version
+    assert stats["last_reload"]["to_version"] == latest
+
+
+def test_failed_load_keeps_the_old_state_and_retries(db_uri, snapshot_dir):
+    watcher = TableWatcher(db_uri, "criteria", snapshot_dir, interval=0.02)
+    state = load_state(db_uri, snapshot_dir)
+    add_rows(db_uri)
+
+    def broken_load():
+        raise OSError("table files not readable yet")
+
+    assert watch(watcher, state, broken_load) == []
+    assert watcher.stats()["errors"] >= 2
+    assert watcher.stats()["reloads"] == 0
@@ -0,0 +1,121 @@
+"""
+Tests for BM25 + vector retrieval and reciprocal-rank fusion (utils/hybrid_search.py)
+"""
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from utils.hybrid_search import (
+    RRF_K,
+    build_text_index,
+    hybrid_search,
+    is_exact_term_query,
+    reciprocal_rank_fusion,
+    result_score,
+    row_key,
+)
+
+
+def row(chunk_id, **fields):
+    return {"text": f"text of {chunk_id}", "metadata": {"chunk_id": chunk_id}, **fields}
+
+
+def test_rrf_scores_are_weighted_reciprocal_ranks():
+    vector = [row("a", _distance=0.1), row("b", _distance=0.2)]
+    lexical = [row("b", _score=7.0), row("c", _score=3.0)]
+
+    fused = reciprocal_rank_fusion([vector, lexical], [1.0, 2.0])
+    scores = {r["metadata"]["chunk_id"]: r["_relevance_score"] for r in fused}
+
+    assert scores["a"] == pytest.approx(1.0 / (RRF_K + 1))
+    assert scores["b"] == pytest.approx(1.0 / (RRF_K + 2) + 2.0 / (RRF_K + 1))
+    assert scores["c"] == pytest.approx(2.0 / (RRF_K + 2))
+    assert [r["metadata"]["chunk_id"] for r in fused] == ["b", "c", "a"]
+
+
+def test_rrf_merges_fields_of_a_row_found_by_both_retrievers():
+    fused = reciprocal_rank_fusion([[row("a", _distance=0.3)], [row("a", _score=5.0)]], [1.0, 1.0])
+
+    assert len(fused) == 1
+    assert fused[0]["_distance"] == 0.3
+    assert fused[0]["_score"] == 5.0
+
+
+def test_rrf_limit_keeps_the_best_rows():
+    results = [row(str(i)) for i in range(10)]
+
+    fused = reciprocal_rank_fusion([results], [1.0], limit=3)
+
+    assert [r["metadata"]["chunk_id"] for r in fused] == ["0", "1", "2"]
+
+
+def test_row_key_falls_back_to_text():
+    assert row_key({"text": "same", "metadata": {}}) == row_key({"text": "same", "metadata": None})
+    assert row_key({"text": "same", "metadata": {}}) != row_key({"text": "other", "metadata": {}})
+
+
+def test_result_score_prefers_the_latest_stage():
+    assert result_score({"_distance": 1.0}) == 0.5
+    assert result_score({"_distance": 1.0, "_score": 4.0}) == 4.0
+    assert result_score({"_score": 4.0, "_relevance_score": 0.03}) == 0.03
+    assert result_score({"_relevance_score": 0.03, "_rerank_score": -2.0}) == -2.0
+    assert result_score({"text": "no score"}) is None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SA302", True),
+    ("HMO 85% LTV", True),
+    ("£75,000", True),
+    ("What is the maximum LTV for a HMO?", False),
+    ("self employed", False),
+    ("", False),
+])
+def test_exact_term_queries(query, expected):
+    assert is_exact_term_query(query) == expected
+
+
+@pytest.fixture
+def table(tmp_path):
+    texts = [
+        "Minimum income 25,000 for joint applicants",
+        "SA302 tax calculations required for self employed applicants",
+        "Maximum LTV for HMO properties is 75%",
+    ]
+    vectors = np.eye(3, 8, dtype=np.float32)
+    table = lancedb.connect(str(tmp_path)).create_table("criteria", pa.table({
+        "text": texts,
+        "metadata": [{"chunk_id": f"chunk_{i:06d}"} for i in range(len(texts))],
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), 8),
+    }))
+    build_text_index(table)
+    return table
+
+
+def test_lexical_mode_finds_exact_terms(table):
+    results = hybrid_search(table, "SA302", embed_fn=None, limit=1, mode="lexical")
+
+    assert results[0]["metadata"]["chunk_id"] == "chunk_000001"
+
+
+def test_hybrid_mode_fuses_both_rankings(table):
+    # The vector ranks chunk 0 first, BM25 ranks chunk 2 first
+    results = hybrid_search(table, "HMO properties", embed_fn=lambda _: np.eye(3, 8)[0].tolist(), limit=3)
+
+    assert {r["metadata"]["chunk_id"] for r in results[:2]} == {"chunk_000000", "chunk_000002"}
+    assert all(r["_relevance_score"] > 0 for r in results)
+
+
+def test_auto_mode_skips_embedding_for_exact_terms(table):
+    def embed_fn(_):
+        raise AssertionError("exact-term query should not be embedded")
+
+    results = hybrid_search(table, "SA302", embed_fn, limit=1, mode="auto")
+
+    assert results[0]["metadata"]["chunk_id"] == "chunk_000001"
+
+
+def test_unknown_mode_is_rejected(table):
+    with pytest.raises(ValueError):
+        hybrid_search(table, "query", embed_fn=None, limit=1, mode="semantic")
@@ -0,0 +1,115 @@
+"""
+Tests for the lender catalog and its per-version cache (utils/lender_catalog.py)
+"""
+
+import lancedb
+import pyarrow as pa
+import pytest
+
+import utils.lender_catalog as lender_catalog
+from utils.lender_catalog import LenderCatalog, build_catalog, catalog_path, load_catalog, save_catalog
+
+OLD_DATE = "2020-01-01"
+
+
+def version_date(table):
+    return lender_catalog._version_date(table)
+
+
+def chunks(lender_id, lender_name, filename, count, product_type="residential"):
+    return [{"text": f"{lender_id} chunk {i}", "lender_id": lender_id, "lender_name": lender_name,
+             "product_type": product_type, "metadata": {"filename": filename}} for i in range(count)]
+
+
+@pytest.fixture
+def table(tmp_path):
+    rows = chunks("barclays", "Barclays", "barclays.pdf", 3) + chunks("hsbc", "HSBC", "hsbc.pdf", 2, "btl")
+    return lancedb.connect(str(tmp_path)).create_table("criteria", pa.Table.from_pylist(rows))
+
+
+def test_catalog_summarises_each_lender(table):
+    catalog = build_catalog(table)
+
+    assert catalog["table_version"] == table.version
+    assert catalog["total_chunks"] == 5
+    assert catalog["lenders"]["barclays"] == {
+        "name": "Barclays", "chunks": 3, "product_types": ["residential"], "source_files": ["barclays.pdf"],
+        "last_updated": version_date(table),
+    }
+    assert list(catalog["lenders"]) == ["barclays", "hsbc"]
+
+
+def test_unchanged_lenders_keep_their_last_updated(table):
+    previous = build_catalog(table)
+    for entry in previous["lenders"].values():
+        entry["last_updated"] = OLD_DATE
+
+    table.add(chunks("hsbc", "HSBC", "hsbc_2.pdf", 1, "btl"))
+    catalog = build_catalog(table, previous=previous)
+
+    assert catalog["lenders"]["barclays"]["last_updated"] == OLD_DATE
+    assert catalog["lenders"]["hsbc"]["last_updated"] == version_date(table)
+    assert catalog["last_updated"] == version_date(table)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    calls = []
+    original = lender_catalog.build_catalog
+
+    def counting(table, previous=None):
+        calls.append(table.version)
+        return original(table, previous)
+
+    monkeypatch.setattr(lender_catalog, "build_catalog", counting)
+    return calls
+
+
+def test_catalog_is_cached_per_table_version(table, builds):
+    catalog = LenderCatalog()
+
+    first = catalog.get(table)
+    assert catalog.get(table) is first
+    assert builds == [table.version]
+    assert load_catalog(catalog_path(table))["table_version"] == table.version
+
+    table.add(chunks("hsbc", "HSBC", "hsbc.pdf", 1, "btl"))
+
+    assert catalog.get(table)["lenders"]["hsbc"]["chunks"] == 3
+    assert builds == [table.version - 1, table.version]
+
+
+def test_rebuild_carries_dates_from_the_stored_catalog(table, builds):
+    stored = build_catalog(table)
+    stored["lenders"]["barclays"]["last_updated"] = OLD_DATE
+    save_catalog(stored, catalog_path(table))
+    table.add(chunks("hsbc", "HSBC", "hsbc.pdf", 1, "btl"))
+
+    rebuilt = LenderCatalog().get(table)
+
+    assert rebuilt["table_version"] == table.version
+    assert rebuilt["lenders"]["barclays"]["last_updated"] == OLD_DATE
+
+
+def test_catalog_saved_for_the_current_version_is_loaded_not_rebuilt(table, builds):
+    stored = build_catalog(table)
+    stored["lenders"]["barclays"]["name"] = "Saved by the pipeline"
+    save_catalog(stored, catalog_path(table))
+    builds.clear()
+
+    catalog = LenderCatalog()
+
+    assert catalog.lender_names(table) == ["Saved by the pipeline", "HSBC"]
+    assert builds == []
+
+
+def test_preloaded_catalog_is_checked_against_the_table(table, builds):
+    save_catalog(build_catalog(table), catalog_path(table))
+    builds.clear()
+    catalog = LenderCatalog()
+    assert catalog.preload(catalog_path(table))
+
+    table.add(chunks("barclays", "Barclays", "barclays.pdf", 1))
+
+    assert catalog.get(table)["lenders"]["barclays"]["chunks"] == 4
+    assert builds == [table.version]
@@ -0,0 +1,91 @@
+"""
+Tests for canonical lender resolution and the lender column backfill (utils/lender_registry.py)
+"""
+
+import os
+
+import lancedb
+import pyarrow as pa
+import pytest
+
+from utils.lender_registry import Lender, LenderRegistry, backfill_lender_columns, derive_lender, lender_filter_values
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lender_registry.json")
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return LenderRegistry.load(REGISTRY_PATH)
+
+
+@pytest.mark.parametrize("source, lender_id", [
+    ("barclays", "barclays"),
+    ("Barclays", "barclays"),
+    ("BARCLEYS", "barclays"),
+    ("BM Solutions", "bm_solutions"),
+    ("bm_solutions", "bm_solutions"),
+    ("Hinckley & Rugby Building Society", "hinckley_rugby"),
+    ("Kent Reliance-buy-to-let.txt", "kent_reliance"),
+    ("santander_bank_residential_1.txt", "santander"),
+    ("leeds_residential_criteria.pdf", "leeds"),
+    ("TMW BTL criteria.md", "the_mortgage_works"),
+])
+def test_names_files_and_aliases_resolve(registry, source, lender_id):
+    assert registry.lender_id(source) == lender_id
+
+
+def test_short_aliases_only_match_whole_words(registry):
+    # "bm" is inside "submission" but is not a word of it
+    assert registry.lender_id("submission_guide.txt") == "submission_guide"
+    assert registry.lender_id("bm_btl_criteria.txt") == "bm_solutions"
+
+
+def test_longest_alias_wins(registry):
+    assert registry.lender_id("the_mortgage_lender_criteria.txt") == "the_mortgage_lender"
+    assert registry.lender_id("the_mortgage_works_criteria.txt") == "the_mortgage_works"
+
+
+def test_unknown_lenders_get_a_derived_lender(registry):
+    lender = registry.resolve("acme_home_loans_residential_criteria_2.txt")
+
+    assert lender == derive_lender("acme_home_loans_residential_criteria_2.txt")
+    assert (lender.lender_id, lender.display_name) == ("acme_home_loans", "Acme Home Loans")
+    assert registry.resolve(None).lender_id == "unknown"
+
+
+def test_missing_registry_file_derives_everything(tmp_path):
+    registry = LenderRegistry.load(str(tmp_path / "missing.json"))
+
+    assert registry.lenders == []
+    assert registry.lender_id("Barclays") == "barclays"
+
+
+def test_filter_values_are_mapped_for_lender_id_columns():
+    assert lender_filter_values(["Barcleys", "HSBC"], {"lender": "lender_id"}) == ["barclays", "hsbc"]
+    assert lender_filter_values("Barcleys", {"lender": "metadata.lender_name"}) == "Barcleys"
+    assert lender_filter_values(None, {"lender": "lender_id"}) is None
+
+
+def test_backfill_adds_canonical_lender_columns(tmp_path):
+    registry = LenderRegistry([Lender("barclays", "Barclays", ("barclays", "barcleys")),
+                               Lender("kent_reliance", "Kent Reliance", ("kent reliance",))])
+    raw_names = ["barclays", "Barcleys", "Kent Reliance", "O'Brien Finance", None]
+    table = lancedb.connect(str(tmp_path)).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(len(raw_names))],
+        "metadata": [{"lender_name": name} for name in raw_names],
+    }))
+
+    assert backfill_lender_columns(table, registry) == 5
+
+    rows = {row["text"]: (row["lender_id"], row["lender_name"])
+            for row in table.search().select(["text", "lender_id", "lender_name"]).to_list()}
+    assert rows == {
+        "chunk 0": ("barclays", "Barclays"),
+        "chunk 1": ("barclays", "Barclays"),
+        "chunk 2": ("kent_reliance", "Kent Reliance"),
+        "chunk 3": ("o_brien_finance", "O Brien Finance"),
+        "chunk 4": ("unknown", "Unknown"),
+    }
+    # Columns already there are rewritten, not added twice
+    assert backfill_lender_columns(table, registry) == 5
+    assert table.count_rows("lender_id = 'barclays'") == 2
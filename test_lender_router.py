@@ -0,0 +1,54 @@
+"""
+Tests for centroid-based lender routing (utils/lender_router.py)
+"""
+
+import numpy as np
+
+from utils.lender_router import LenderRouter, build_centroids
+
+
+def router(count):
+    # One orthogonal centroid per lender
+    return LenderRouter(np.eye(count, dtype=np.float32), [f"lender_{i:02d}" for i in range(count)])
+
+
+def test_standout_lender_is_routed_first():
+    lenders = router(20)
+    query = np.zeros(20, dtype=np.float32)
+    query[3] = 1.0
+
+    routed = lenders.route(query, top_n=4, min_zscore=4.0)
+
+    assert routed[0] == "lender_03"
+    assert len(routed) == 4
+    assert lenders.stats()["routed"] == 1
+
+
+def test_flat_scores_fall_back_to_full_search():
+    lenders = router(20)
+
+    assert lenders.route(np.ones(20, dtype=np.float32), top_n=4, min_zscore=1.0) is None
+    assert lenders.stats()["flat_fallbacks"] == 1
+
+
+def test_zscore_is_bounded_by_the_number_of_lenders():
+    # The most a single lender can stand out is sqrt(n - 1) standard deviations
+    lenders = router(10)
+    query = np.zeros(10, dtype=np.float32)
+    query[0] = 1.0
+
+    assert lenders.route(query, top_n=4, min_zscore=np.sqrt(9) - 0.01) is not None
+    assert lenders.route(query, top_n=4, min_zscore=np.sqrt(9) + 0.01) is None
+
+
+def test_too_few_lenders_are_never_routed():
+    assert router(4).route(np.eye(4, dtype=np.float32)[0], top_n=4, min_zscore=0.0) is None
+
+
+def test_small_sections_only_count_through_their_lender():
+    vectors = np.eye(5, dtype=np.float32)
+    centroids, owners = build_centroids(vectors, ["a", "a", "a", "a", "b"],
+                                        ["Income", "Income", "Income", "Age", "Age"])
+
+    assert owners == ["a", "a", "b"]
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0)
@@ -0,0 +1,77 @@
+"""
+Tests for lender and product mention detection (utils/mention_detector.py)
+"""
+
+import os
+
+import pytest
+
+from utils.lender_registry import LenderRegistry
+from utils.mention_detector import AliasAutomaton, MentionDetector, mention_filters
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lender_registry.json")
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return MentionDetector(LenderRegistry.load(REGISTRY_PATH))
+
+
+@pytest.mark.parametrize("query, lenders", [
+    ("What's Barclays' max age?", ["barclays"]),
+    ("Barcleys income multiples", ["barclays"]),
+    ("Does BM accept HMOs?", ["bm_solutions"]),
+    ("BM's criteria on ex-pats", ["bm_solutions"]),
+    ("When do I submit the application?", []),
+    ("Kent Reliance HMO rules", ["kent_reliance"]),
+    ("Hinckley & Rugby self build", ["hinckley_rugby"]),
+    ("Compare TMW and NatWest", ["the_mortgage_works", "natwest"]),
+    ("Leeds BS max term", ["leeds"]),
+    ("Properties in Leeds", []),
+    ("Fleet HMO criteria", ["fleet"]),
+    ("a fleet of company cars", []),
+])
+def test_lender_mentions(detector, query, lenders):
+    assert detector.detect(query).lenders == lenders
+
+
+@pytest.mark.parametrize("query, products", [
+    ("Buy to let via a ltd company", ["btl", "btl_limited"]),
+    ("BTL max LTV", ["btl"]),
+    ("Maximum age at end of term", []),
+])
+def test_product_mentions(detector, query, products):
+    assert detector.detect(query).products == products
+
+
+def test_longest_alias_wins():
+    automaton = AliasAutomaton()
+    automaton.add("bm", "lender", "short")
+    automaton.add("bm solutions", "lender", "long")
+
+    matches = automaton.find("Is BM Solutions ok?")
+
+    assert [(m.value, m.start, m.end) for m in matches] == [("long", 3, 15)]
+
+
+def test_aliases_match_whole_words_only():
+    automaton = AliasAutomaton()
+    automaton.add("bm", "lender", "bm")
+
+    assert automaton.find("submit") == []
+    assert [m.value for m in automaton.find("bm, then bm")] == ["bm", "bm"]
+
+
+CATALOG = {"lenders": {
+    "barclays": {"product_types": ["residential", "btl"]},
+    "hsbc": {"product_types": ["residential"]},
+}}
+
+
+def test_mentions_become_filters_only_for_catalog_data():
+    assert mention_filters("Barclays buy to let", CATALOG) == {"lender_filter": "barclays", "product_filter": "btl"}
+    # Not ingested yet: search everything rather than nothing
+    assert mention_filters("Santander max age", CATALOG) == {}
+    # HSBC only has residential, so a product filter would be a no-op
+    assert mention_filters("HSBC residential", CATALOG) == {"lender_filter": "hsbc"}
+    assert mention_filters("Barclays or HSBC?", CATALOG) == {"lender_filter": ["barclays", "hsbc"]}
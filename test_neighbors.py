@@ -0,0 +1,68 @@
+"""
+Tests for neighbouring-chunk expansion under a token budget (utils/neighbors.py)
+"""
+
+import lancedb
+import pyarrow as pa
+import pytest
+
+import utils.neighbors as neighbors
+from utils.neighbors import chunk_positions, expand_neighbors
+
+SECTIONS = ["Income", "Income", "Income", "Income", "Age", "Age"]
+
+
+@pytest.fixture
+def table(tmp_path):
+    positions = chunk_positions(["a.pdf"] * len(SECTIONS), SECTIONS)
+    return lancedb.connect(str(tmp_path)).create_table("criteria", pa.table({
+        "text": [f"chunk{i} " + "word " * 9 for i in range(len(SECTIONS))],
+        "metadata": [{"filename": "a.pdf", "criteria_section": section} for section in SECTIONS],
+        **{column: [p[column] for p in positions] for column in neighbors.POSITION_COLUMNS},
+    }))
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # Ten tokens per chunk, whether or not the tokenizer can be downloaded here
+    monkeypatch.setattr(neighbors, "count_tokens", lambda text: len(text.split()))
+
+
+def hits(table, *ordinals, **fields):
+    rows = {row["ordinal"]: row for row in table.search().limit(100).to_list()}
+    return [{**rows[ordinal], **fields} for ordinal in ordinals]
+
+
+def test_hit_is_stitched_with_its_neighbours(table):
+    [passage] = expand_neighbors(table, hits(table, 2), window=1, token_budget=100)
+
+    assert passage["_ordinals"] == [1, 2, 3]
+    assert passage["text"].split("\n\n")[0].startswith("chunk1")
+
+
+def test_budget_takes_the_following_chunk_first(table):
+    [passage] = expand_neighbors(table, hits(table, 2), window=1, token_budget=15)
+
+    assert passage["_ordinals"] == [2, 3]
+
+
+def test_neighbours_stay_in_the_hits_section(table):
+    [passage] = expand_neighbors(table, hits(table, 3), window=2, token_budget=100)
+
+    assert passage["_ordinals"] == [1, 2, 3]
+
+
+def test_adjacent_hits_become_one_passage_led_by_the_better_hit(table):
+    expanded = expand_neighbors(table, hits(table, 2, 1, _distance=0.1), window=1, token_budget=100)
+
+    assert len(expanded) == 1
+    assert expanded[0]["_ordinals"] == [0, 1, 2, 3]
+    assert expanded[0]["ordinal"] == 2
+
+
+def test_no_budget_or_window_returns_hits(table):
+    rows = hits(table, 2)
+
+    assert expand_neighbors(table, rows, window=0) is rows
+    assert expand_neighbors(table, rows, window=1, token_budget=0) is rows
+
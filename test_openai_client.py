@@ -0,0 +1,36 @@
+"""
+Tests for the pooled OpenAI clients (utils/openai_client.py)
+"""
+
+import httpx
+
+from utils.openai_client import PooledClient, client_limits, pool_connection_counts
+
+
+def test_new_client_reports_an_empty_pool(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    stats = PooledClient(asynchronous=False).pool_stats()
+
+    assert stats["connections"] == stats["idle_connections"] == stats["active_connections"] == 0
+    assert stats["requests"] == 0
+
+
+def test_pool_counts_need_the_default_transport():
+    with httpx.Client(limits=client_limits()) as client:
+        assert pool_connection_counts(client) == {"connections": 0, "idle_connections": 0}
+
+    with httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200))) as client:
+        assert pool_connection_counts(client) is None
+
+
+def test_unreadable_pool_leaves_the_request_counters(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    pooled = PooledClient(asynchronous=True)
+    pooled.http_client._transport = object()
+
+    stats = pooled.pool_stats()
+
+    assert "connections" not in stats
+    assert stats["requests"] == 0
+    assert stats["max_connections"] > 0
@@ -0,0 +1,30 @@
+"""
+Tests for the /search endpoint of python_backend.py while the database is down
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import python_backend
+    return python_backend
+
+
+def test_search_reconnects_before_detecting_mentions(backend, monkeypatch):
+    reconnects = []
+
+    def reconnect():
+        reconnects.append(True)
+        return False
+
+    monkeypatch.setattr(backend, "serving", None)
+    monkeypatch.setattr(backend, "init_database", reconnect)
+
+    response = TestClient(backend.app).post("/search", json={"query": "Barclays max LTV", "detect_mentions": True})
+
+    assert reconnects == [True]
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Search failed: Database not available and reconnection failed"
@@ -0,0 +1,102 @@
+"""
+Tests for cross-encoder reranking under a time budget (utils/reranker.py)
+"""
+
+import time
+
+from utils.reranker import CrossEncoderReranker
+
+
+class FakeModel:
+    """Scores a pair by the number in its chunk text, taking ``seconds`` per batch."""
+
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.batches = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.batches.append([text for _, text in pairs])
+        time.sleep(self.seconds)
+        return [float(text.split()[1]) for _, text in pairs]
+
+
+def rows(*numbers):
+    return [{"text": f"chunk {n}", "metadata": {"chunk_id": f"chunk_{n:06d}"}} for n in numbers]
+
+
+def reranker_with(model, **kwargs):
+    reranker = CrossEncoderReranker(model_name="fake", **kwargs)
+    reranker._model = model
+    return reranker
+
+
+def test_best_rows_come_first_with_their_scores():
+    reranker = reranker_with(FakeModel())
+
+    ranked = reranker.rerank("q", rows(3, 9, 1, 7), top_n=2)
+
+    assert [r["text"] for r in ranked] == ["chunk 9", "chunk 7"]
+    assert [r["_rerank_score"] for r in ranked] == [9.0, 7.0]
+    assert reranker.stats()["reranked"] == 1
+
+
+def test_cached_pairs_are_not_scored_again():
+    model = FakeModel()
+    reranker = reranker_with(model)
+    reranker.rerank("q", rows(1, 2, 3))
+
+    ranked = reranker.rerank("Q ", rows(1, 2, 3, 4))
+
+    assert model.batches == [["chunk 1", "chunk 2", "chunk 3"], ["chunk 4"]]
+    assert [r["text"] for r in ranked] == ["chunk 4", "chunk 3", "chunk 2", "chunk 1"]
+    assert reranker.stats()["cache_hits"] == 3
+    assert reranker.stats()["pairs_scored"] == 4
+
+
+def test_a_batch_past_the_deadline_is_discarded_but_cached():
+    model = FakeModel(seconds=0.05)
+    reranker = reranker_with(model, budget_ms=20)
+
+    assert reranker.rerank("q", rows(1, 2)) is None
+    assert reranker.stats()["timeouts"] == 1
+
+    # The retry only needs the cache
+    model.seconds = 0.0
+    assert [r["text"] for r in reranker.rerank("q", rows(1, 2))] == ["chunk 2", "chunk 1"]
+    assert len(model.batches) == 1
+
+
+def test_batches_are_sized_to_the_time_left():
+    model = FakeModel()
+    reranker = reranker_with(model, budget_ms=35)
+    reranker._seconds_per_pair = 0.01
+
+    assert reranker.rerank("q", rows(*range(10))) is not None
+    # 3 pairs fit the budget at the measured speed; faster batches then raise the estimate
+    sizes = [len(batch) for batch in model.batches]
+    assert sizes[0] == 3
+    assert sum(sizes) == 10
+
+
+def test_no_batch_is_started_that_cannot_fit():
+    model = FakeModel()
+    reranker = reranker_with(model, budget_ms=5)
+    reranker._seconds_per_pair = 0.01
+
+    assert reranker.rerank("q", rows(1, 2)) is None
+    assert model.batches == []
+    assert reranker.stats()["timeouts"] == 1
+
+
+def test_missing_or_failing_model_keeps_the_retrieval_order():
+    unavailable = CrossEncoderReranker(model_name="fake")
+    unavailable._load_error = "sentence-transformers is not installed"
+    assert unavailable.rerank("q", rows(1, 2)) is None
+
+    class Broken:
+        def predict(self, pairs, batch_size, show_progress_bar):
+            raise RuntimeError("out of memory")
+
+    broken = reranker_with(Broken())
+    assert broken.rerank("q", rows(1, 2)) is None
+    assert broken.stats()["errors"] == 1
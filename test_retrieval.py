@@ -0,0 +1,109 @@
+"""
+Tests for the retrieval pipeline shared by both backends (utils/retrieval.py)
+"""
+
+from dataclasses import replace
+from types import SimpleNamespace
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+import utils.retrieval
+from utils.filters import resolve_filter_columns
+from utils.hot_reload import ServingState
+from utils.reranker import RERANK_CANDIDATES
+from utils.retrieval import route_lenders, search_lender_criteria
+
+DIM = 8
+
+
+@pytest.fixture
+def state(tmp_path):
+    vectors = np.random.default_rng(9).normal(size=(40, DIM)).astype(np.float32)
+    lenders = [("barclays", "hsbc")[i % 2] for i in range(len(vectors))]
+    table = lancedb.connect(str(tmp_path / "db")).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(len(vectors))],
+        "metadata": [{"lender_name": lender} for lender in lenders],
+        "lender_id": lenders,
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), DIM),
+    }))
+    return ServingState(table=table, version=table.version, filter_columns=resolve_filter_columns(table.schema),
+                        result_columns=["text", "metadata"], catalog={})
+
+
+def embed(_):
+    return np.ones(DIM, dtype=np.float32)
+
+
+def test_filtered_rows_come_back_ranked_without_vectors(state):
+    rows = search_lender_criteria(state, "q", embed, num_results=5, lender_filter="hsbc", search_params={})
+
+    assert len(rows) == 5
+    assert {r["metadata"]["lender_name"] for r in rows} == {"hsbc"}
+    assert all("embedding" not in r for r in rows)
+
+
+def test_failed_search_returns_no_rows(state):
+    def broken(_):
+        raise RuntimeError("embeddings API down")
+
+    assert search_lender_criteria(state, "q", broken, search_params={}) == []
+
+
+def test_routing_needs_a_router_of_the_served_version(state):
+    router = SimpleNamespace(table_version=state.version, lender_column="lender_id", route=lambda _: ["hsbc"])
+
+    assert route_lenders(state, embed("q"), use_engine=False) is None
+    assert route_lenders(replace(state, lender_router=router), embed("q"), False) == ["hsbc"]
+
+    router.table_version = state.version + 1
+    assert route_lenders(replace(state, lender_router=router), embed("q"), False) is None
+
+
+def test_routed_lenders_narrow_an_unfiltered_search(state):
+    router = SimpleNamespace(table_version=state.version, lender_column="lender_id", route=lambda _: ["barclays"])
+    routed = replace(state, lender_router=router)
+
+    rows = search_lender_criteria(routed, "q", embed, num_results=5, search_params={})
+
+    assert {r["metadata"]["lender_name"] for r in rows} == {"barclays"}
+
+
+class TimedOutReranker:
+    """Gives up like CrossEncoderReranker does when its budget runs out."""
+
+    def __init__(self):
+        self.candidates = []
+
+    def rerank(self, query, rows, top_n):
+        self.candidates.append(len(rows))
+        return None
+
+
+def texts(rows):
+    return [r["text"] for r in rows]
+
+
+def test_timed_out_rerank_keeps_the_vector_order(state, monkeypatch):
+    monkeypatch.setattr(utils.retrieval, "DIVERSIFY_RESULTS", False)
+    reranker = TimedOutReranker()
+
+    reranked = search_lender_criteria(state, "q", embed, num_results=5, rerank=True, reranker=reranker,
+                                      search_params={})
+    plain = search_lender_criteria(state, "q", embed, num_results=5, search_params={})
+
+    # The wider rerank pool was retrieved, then cut back to num_results in vector order
+    assert reranker.candidates == [min(RERANK_CANDIDATES, len(state.table))]
+    assert texts(reranked) == texts(plain)
+    assert len(reranked) == 5
+
+
+def test_grouped_results_are_never_reranked(state):
+    reranker = TimedOutReranker()
+
+    search_lender_criteria(state, "q", embed, group_by_lender=True, rerank=True, reranker=reranker,
+                           search_params={})
+
+    assert reranker.candidates == []
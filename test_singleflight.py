@@ -0,0 +1,148 @@
+"""
+Tests for coalescing identical in-flight calls and streams (utils/singleflight.py)
+"""
+
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_run_once():
+    flight = SingleFlight()
+    runs = []
+
+    async def answer():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("q", answer) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(runs) == 1
+    assert flight.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0, "a")),
+                                    flight.do("b", lambda: asyncio.sleep(0, "b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert flight.stats()["executions"] == 2
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight()
+    runs = []
+
+    async def answer():
+        runs.append(1)
+        return len(runs)
+
+    async def main():
+        return [await flight.do("q", answer), await flight.do("q", answer)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("q", failing) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.stats()["executions"] == 1
+
+
+def test_a_waiter_leaving_does_not_cancel_the_call():
+    flight = SingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        leaving = asyncio.ensure_future(flight.do("q", answer))
+        staying = asyncio.ensure_future(flight.do("q", answer))
+        await asyncio.sleep(0.005)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(main()) == "answer"
+
+
+async def collect(stream):
+    return [event async for event in stream]
+
+
+def test_late_subscriber_is_replayed_the_stream():
+    flight = SingleFlight()
+    runs = []
+
+    async def events():
+        runs.append(1)
+        for token in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def main():
+        first = asyncio.ensure_future(collect(flight.stream("q", events)))
+        await asyncio.sleep(0.015)
+        second = asyncio.ensure_future(collect(flight.stream("q", events)))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(main()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert len(runs) == 1
+
+
+def test_stream_error_reaches_every_subscriber():
+    flight = SingleFlight()
+
+    async def events():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(collect(flight.stream("q", events)), collect(flight.stream("q", events)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_stream_is_cancelled_when_the_last_subscriber_leaves():
+    flight = SingleFlight()
+    cancelled = []
+
+    async def events():
+        try:
+            while True:
+                await asyncio.sleep(0.005)
+                yield "token"
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        stream = flight.stream("q", events)
+        assert await stream.__anext__() == "token"
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert cancelled == [1]
+    assert flight.stats()["in_flight"] == 0
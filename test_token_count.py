@@ -0,0 +1,38 @@
+"""
+Tests for token counting with an offline fallback (utils/token_count.py)
+"""
+
+import pytest
+
+import utils.token_count as token_count
+from utils.token_count import count_tokens
+
+
+@pytest.fixture(autouse=True)
+def fresh_encodings(monkeypatch):
+    monkeypatch.setattr(token_count, "_encodings", {})
+
+
+def test_unavailable_encoding_falls_back_to_a_character_estimate(monkeypatch):
+    calls = []
+
+    def offline(name):
+        calls.append(name)
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(token_count.tiktoken, "get_encoding", offline)
+
+    assert count_tokens("x" * 40) == 10
+    assert count_tokens("") == 0
+    # The failed download isn't retried per call
+    assert calls == ["cl100k_base"]
+
+
+def test_loaded_encoding_counts_exactly(monkeypatch):
+    class Encoding:
+        def encode(self, text, disallowed_special):
+            return text.split()
+
+    monkeypatch.setattr(token_count.tiktoken, "get_encoding", lambda name: Encoding())
+
+    assert count_tokens("three short words") == 3
@@ -0,0 +1,73 @@
+"""
+Tests for vector index parameters and tuning (utils/vector_index.py)
+"""
+
+import json
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+
+from utils.vector_index import (
+    apply_search_params,
+    build_vector_index,
+    default_search_params,
+    load_search_params,
+    tune_vector_index,
+)
+
+
+class RecordingQuery:
+    """Stands in for a LanceDB vector query and records the parameters set on it."""
+
+    def __init__(self):
+        self.calls = {}
+
+    def __getattr__(self, name):
+        def setter(value):
+            self.calls[name] = value
+            return self
+        return setter
+
+
+def test_ivf_pq_queries_get_no_hnsw_ef():
+    params = default_search_params({"index_type": "IVF_PQ", "num_partitions": 40})
+    query = apply_search_params(RecordingQuery(), params)
+
+    assert params["ef"] is None
+    assert set(query.calls) == {"nprobes", "refine_factor"}
+
+
+def test_hnsw_queries_get_ef():
+    params = default_search_params({"index_type": "IVF_HNSW_SQ", "num_partitions": 1})
+    query = apply_search_params(RecordingQuery(), params)
+
+    assert query.calls == {"nprobes": 1, "ef": 64}
+
+
+def test_saved_ef_ignored_without_hnsw_index(tmp_path):
+    path = tmp_path / "vector_index.json"
+    path.write_text(json.dumps({"index_params": {"index_type": "IVF_PQ", "num_partitions": 8},
+                                "search_params": {"nprobes": 8, "refine_factor": 10, "ef": 64}}))
+
+    params = load_search_params(str(path))
+    query = apply_search_params(RecordingQuery(), params)
+
+    assert params["index_type"] == "IVF_PQ"
+    assert "ef" not in query.calls
+
+
+def test_tuning_sweep_capped_at_num_partitions(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(600, 16)).astype(np.float32)
+    table = lancedb.connect(str(tmp_path)).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(len(vectors))],
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), 16),
+    }))
+    index_params = build_vector_index(table, "embedding", "IVF_PQ")
+
+    report = tune_vector_index(table, "embedding", k=5, num_queries=5, refine_values=(None,),
+                               num_partitions=index_params["num_partitions"])
+
+    probed = [row["nprobes"] for row in report if row["nprobes"] is not None]
+    assert probed == [index_params["num_partitions"]]
@@ -0,0 +1,114 @@
+"""
+Tests for the in-memory engine over an exported vector snapshot (utils/vector_snapshot.py)
+"""
+
+import os
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from utils.vector_snapshot import InMemoryVectorEngine, current_snapshot_path, export_snapshot
+
+DIM = 16
+LENDERS = ["barclays", "hsbc", "natwest", "santander"]
+SECTIONS = ["Income", "Age", "Property"]
+
+
+@pytest.fixture
+def table(tmp_path):
+    rng = np.random.default_rng(7)
+    count = 200
+    vectors = rng.normal(size=(count, DIM)).astype(np.float32)
+    return lancedb.connect(str(tmp_path / "db")).create_table("criteria", pa.table({
+        "text": [f"chunk {i}" for i in range(count)],
+        "metadata": [{"chunk_id": f"chunk_{i:06d}"} for i in range(count)],
+        # Interleaved, so export has to regroup rows by lender
+        "lender_id": [LENDERS[i % len(LENDERS)] for i in range(count)],
+        "product_type": ["btl" if i % 5 == 0 else "residential" for i in range(count)],
+        "criteria_section": [SECTIONS[i % len(SECTIONS)] for i in range(count)],
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), DIM),
+    }))
+
+
+@pytest.fixture
+def engine(table, tmp_path):
+    export_snapshot(table, str(tmp_path / "snapshot"))
+    return InMemoryVectorEngine.load(str(tmp_path / "snapshot"))
+
+
+@pytest.fixture
+def queries():
+    return np.random.default_rng(11).normal(size=(10, DIM)).astype(np.float32)
+
+
+def exact(table, query, k, where=None):
+    builder = table.search(query, vector_column_name="embedding").bypass_vector_index()
+    if where:
+        builder = builder.where(where, prefilter=True)
+    return builder.limit(k).to_list()
+
+
+def assert_same_results(actual, expected):
+    assert [row["text"] for row in actual] == [row["text"] for row in expected]
+    np.testing.assert_allclose([row["_distance"] for row in actual],
+                               [row["_distance"] for row in expected], rtol=1e-4, atol=1e-4)
+
+
+def test_unfiltered_search_matches_exact_search(table, engine, queries):
+    assert engine.table_version == table.version
+    for query in queries:
+        assert_same_results(engine.search(query, 10), exact(table, query, 10))
+
+
+@pytest.mark.parametrize("filters, where", [
+    ({"lender": "hsbc"}, "lender_id = 'hsbc'"),
+    ({"lender": ["barclays", "santander"]}, "lender_id IN ('barclays', 'santander')"),
+    ({"product": "btl"}, "product_type = 'btl'"),
+    ({"lender": "natwest", "section": ["Income", "Age"]},
+     "lender_id = 'natwest' AND criteria_section IN ('Income', 'Age')"),
+])
+def test_filtered_search_matches_exact_prefiltered_search(table, engine, queries, filters, where):
+    for query in queries:
+        assert_same_results(engine.search(query, 5, **filters), exact(table, query, 5, where))
+
+
+def test_unknown_lender_matches_nothing(engine, queries):
+    assert engine.search(queries[0], 5, lender="nobody") == []
+
+
+def test_batch_search_matches_single_searches(engine, queries):
+    filters = [{"lender": LENDERS[i % len(LENDERS)]} if i % 2 else {} for i in range(len(queries))]
+    limits = [3 + i % 4 for i in range(len(queries))]
+
+    batch = engine.search_many(queries, limits, filters)
+
+    for query, limit, query_filters, rows in zip(queries, limits, filters, batch):
+        assert_same_results(rows, engine.search(query, limit, **query_filters))
+
+
+def test_grouped_search_returns_each_lenders_nearest_rows(table, engine, queries):
+    rows = engine.search_grouped(queries[0], per_lender_k=2)
+
+    assert len(rows) == 2 * len(LENDERS)
+    texts = {row["text"] for row in rows}
+    for lender in LENDERS:
+        assert {row["text"] for row in exact(table, queries[0], 2, f"lender_id = '{lender}'")} <= texts
+    first_distances = [rows[i]["_distance"] for i in range(0, len(rows), 2)]
+    assert first_distances == sorted(first_distances)
+
+
+def test_new_export_moves_the_current_pointer(table, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshot")
+    first = export_snapshot(table, snapshot_dir)
+    table.add(table.search().limit(1).to_arrow())
+    second = export_snapshot(table, snapshot_dir)
+
+    assert second["table_version"] > first["table_version"]
+    assert os.path.basename(current_snapshot_path(snapshot_dir)).startswith(f"v{second['table_version']}-")
+    assert InMemoryVectorEngine.load(snapshot_dir).table_version == second["table_version"]
+
+
+def test_no_snapshot_exported(tmp_path):
+    assert InMemoryVectorEngine.load(str(tmp_path / "missing")) is None
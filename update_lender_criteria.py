@@ -11,6 +11,8 @@ import subprocess
 from datetime import datetime
 import streamlit as st
 
+from utils.lender_registry import get_registry
+
 def backup_current_database():
     """Create a backup of the current database."""
     backup_dir = f"data/lancedb_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -101,11 +103,7 @@ def verify_update():
         lenders = set()
         for row in table.search("").limit(1000):
             lender_name = row["metadata"]["lender_name"]
-            # Clean up lender name for display
-            clean_name = lender_name.replace('_residential.txt', '').replace('_residential.pdf', '')
-            clean_name = clean_name.replace('_res', '').replace('_bank', '').replace('_building_society', '')
-            clean_name = clean_name.replace('_mortgage', '').replace('_criteria', '')
-            clean_name = clean_name.replace('_', ' ').title()
+            clean_name = get_registry().display_name(lender_name)
             lenders.add(clean_name)
         
         print(f"🏦 Lenders in database: {len(lenders)}")
@@ -0,0 +1,96 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+from utils.hybrid_search import result_score
+from utils.token_count import count_tokens
+
+# Cut the ranked results at a natural boundary instead of always sending num_results
+ADAPTIVE_K = os.getenv("ADAPTIVE_K", "true").lower() == "true"
+
+# Never fewer chunks than this, however sharp the drop after the first ones
+ADAPTIVE_MIN_RESULTS = int(os.getenv("ADAPTIVE_MIN_RESULTS", "3"))
+
+# A drop between consecutive scores of at least this fraction of the whole
+# top-to-bottom score spread ends the results; relative, so it holds for
+# distances, fused RRF scores and reranker logits alike
+SCORE_GAP_RATIO = float(os.getenv("SCORE_GAP_RATIO", "0.3"))
+
+# Vector rows further than this (squared L2) are dropped; unset by default,
+# as useful distances depend on the embedding model
+MAX_DISTANCE = float(os.environ["MAX_DISTANCE"]) if os.getenv("MAX_DISTANCE") else None
+
+# Tokens of chunk text sent to the model, before neighbour expansion
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+
+def score_gap_cutoff(scores: List[float], min_k: int, gap_ratio: float) -> Optional[int]:
+    """Number of scores above the first large drop, or None if there is none.
+
+    Args:
+        scores: Higher-is-better scores, sorted best first
+        min_k: Smallest count returned
+        gap_ratio: Drop, as a fraction of ``scores[0] - scores[-1]``, that ends the list
+    """
+    spread = scores[0] - scores[-1] if scores else 0.0
+    if spread <= 0:
+        return None
+    for k in range(max(min_k, 1), len(scores)):
+        if scores[k - 1] - scores[k] >= gap_ratio * spread:
+            return k
+    return None
+
+
+def adaptive_k(rows: List[Dict], min_k: int = ADAPTIVE_MIN_RESULTS, gap_ratio: float = SCORE_GAP_RATIO,
+               max_distance: Optional[float] = MAX_DISTANCE,
+               token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET) -> Tuple[List[Dict], Dict]:
+    """Keeps the results worth sending to the model.
+
+    The best rows by score are kept up to the first large score drop and
+    up to the first one further than ``max_distance``; rows keep their given order (MMR or grouped),
+    and are then taken in that order until ``token_budget`` is spent.
+    ``min_k`` rows are always kept by the score and distance cutoffs, and
+    at least one by the token budget.
+
+    Args:
+        rows: Ranked results, at most ``num_results``
+        min_k: Minimum results kept by the score and distance cutoffs
+        gap_ratio: See ``SCORE_GAP_RATIO``
+        max_distance: See ``MAX_DISTANCE``; None disables the threshold
+        token_budget: See ``CONTEXT_TOKEN_BUDGET``; None disables the budget
+
+    Returns:
+        The kept rows and ``{"k", "candidates", "reason"}``, where reason is
+        ``score_gap``, ``max_distance``, ``token_budget`` or ``num_results``
+        (nothing was cut)
+    """
+    k, reason = len(rows), "num_results"
+    scores = [result_score(row) for row in rows]
+
+    if rows and all(score is not None for score in scores):
+        ranked = sorted(range(len(rows)), key=lambda i: -scores[i])
+        gap_k = score_gap_cutoff([scores[i] for i in ranked], min_k, gap_ratio)
+        if gap_k is not None:
+            k, reason = gap_k, "score_gap"
+
+        if max_distance is not None:
+            # Counted in score order, the order the rows are cut in; rows
+            # without a distance (lexical-only hits) don't end the run
+            within = next((position for position, i in enumerate(ranked)
+                           if rows[i].get("_distance") is not None and rows[i]["_distance"] > max_distance),
+                          len(ranked))
+            distance_k = max(within, min(min_k, len(rows)))
+            if distance_k < k:
+                k, reason = distance_k, "max_distance"
+
+        kept = set(ranked[:k])
+        rows = [row for i, row in enumerate(rows) if i in kept]
+
+    if token_budget is not None:
+        used = 0
+        for position, row in enumerate(rows):
+            used += count_tokens(row["text"])
+            if used > token_budget and position > 0:
+                rows, reason = rows[:position], "token_budget"
+                break
+
+    return rows, {"k": len(rows), "candidates": len(scores), "reason": reason}
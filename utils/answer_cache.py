@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "data/cache/answers.sqlite")
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+# Answers kept across all scopes; past it the least recently used ones are evicted
+DEFAULT_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+
+# Eviction trims to this fraction of the limit, so it runs once per batch of stores
+_EVICT_TO = 0.9
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def _numbers(text: str) -> List[str]:
+    """Numeric tokens of a query ("85% LTV on £75,000" -> ["75000", "85"])."""
+    return sorted(n.replace(",", "") for n in _NUMBER_PATTERN.findall(text))
+
+
+def _to_jsonable(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """Cache of chat answers looked up by query-embedding similarity.
+
+    Entries are scoped by the table version and the request filters, so an
+    answer is only reused for the same lender/product filters and retrieval
+    settings, and never after the criteria table has changed. Queries whose
+    numbers differ ("85% LTV" vs "90% LTV") never share an answer, however
+    similar their embeddings are.
+
+    Entries live in a SQLite file shared by all workers; each process keeps
+    an in-memory matrix per scope and only reads rows added since its last
+    lookup. Past ``max_entries`` the least recently used answers are
+    evicted; a worker whose matrices outgrow the limit because another
+    worker evicted rows rebuilds them from the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_ANSWER_CACHE_PATH,
+                 similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._version: Optional[int] = None
+        # scope key -> {"ids": [...], "numbers": [...], "matrix": ndarray, "max_id": int}
+        self._index: Dict[str, Dict] = {}
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "evictions": 0}
+
+    def reset_after_fork(self) -> None:
+        """Drops SQLite connections inherited from the parent process; each worker opens its own."""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, table_version INTEGER NOT NULL, scope TEXT NOT NULL, "
+                "query TEXT NOT NULL, numbers TEXT NOT NULL, vector BLOB NOT NULL, response TEXT NOT NULL, "
+                "search_results TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL DEFAULT 0)"
+            )
+            # Cache files written before eviction existed
+            if "last_used" not in {row[1] for row in conn.execute("PRAGMA table_info(answers)")}:
+                conn.execute("ALTER TABLE answers ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_scope ON answers(table_version, scope, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers(last_used)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def scope_key(filters: Dict) -> str:
+        return json.dumps(filters, sort_keys=True, default=str)
+
+    def _check_version(self, table_version: int) -> bool:
+        """Drops entries built against older table versions.
+
+        Newer versions are left alone so that a worker still serving an old
+        table can't wipe the entries of one that has already moved on.
+
+        Returns:
+            False for a version older than one already seen (a request that
+            started before a reload), which is neither looked up nor stored
+        """
+        with self._lock:
+            if self._version == table_version:
+                return True
+            if self._version is not None and table_version < self._version:
+                return False
+            self._version = table_version
+            self._index.clear()
+            self._counters["invalidations"] += 1
+        self._connection().execute("DELETE FROM answers WHERE table_version < ?", (table_version,))
+        return True
+
+    def _refresh_scope(self, table_version: int, scope: str) -> Dict:
+        with self._lock:
+            if sum(len(indexed["ids"]) for indexed in self._index.values()) > self.max_entries:
+                # Rows evicted by other workers; the file holds at most max_entries
+                self._index.clear()
+            entry = self._index.setdefault(scope, {"ids": [], "numbers": [], "matrix": None, "max_id": 0})
+            max_id = entry["max_id"]
+
+        rows = self._connection().execute(
+            "SELECT id, numbers, vector FROM answers WHERE table_version = ? AND scope = ? AND id > ? ORDER BY id",
+            (table_version, scope, max_id),
+        ).fetchall()
+        if not rows:
+            return entry
+
+        vectors = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        with self._lock:
+            if entry["max_id"] == max_id:
+                entry["ids"].extend(row[0] for row in rows)
+                entry["numbers"].extend(row[1] for row in rows)
+                entry["matrix"] = vectors if entry["matrix"] is None else np.vstack([entry["matrix"], vectors])
+                entry["max_id"] = rows[-1][0]
+        return entry
+
+    def lookup(self, query: str, query_vector: List[float], table_version: int, filters: Dict) -> Optional[Dict]:
+        """Finds a stored answer for a semantically equivalent query.
+
+        Args:
+            query: The user query
+            query_vector: Embedding of ``query``
+            table_version: Current version of the criteria table
+            filters: Lender/product filters and retrieval settings of the request
+
+        Returns:
+            Dict with ``response``, ``search_results``, ``query`` and
+            ``similarity``, or None on a miss
+        """
+        matrix = None
+        if self._check_version(table_version):
+            entry = self._refresh_scope(table_version, self.scope_key(filters))
+            with self._lock:
+                matrix, ids, numbers = entry["matrix"], list(entry["ids"]), list(entry["numbers"])
+
+        if matrix is not None:
+            similarities = matrix @ _normalize(query_vector)
+            query_numbers = json.dumps(_numbers(query))
+            for position in np.argsort(-similarities):
+                if similarities[position] < self.similarity_threshold:
+                    break
+                if numbers[position] != query_numbers:
+                    continue
+
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT query, response, search_results FROM answers WHERE id = ?", (ids[position],)
+                ).fetchone()
+                if row is None:
+                    # Evicted by another worker
+                    continue
+                conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), ids[position]))
+                with self._lock:
+                    self._counters["hits"] += 1
+                return {
+                    "query": row[0],
+                    "response": row[1],
+                    "search_results": json.loads(row[2]),
+                    "similarity": float(similarities[position]),
+                }
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def store(self, query: str, query_vector: List[float], table_version: int, filters: Dict,
+              response: str, search_results: List[Dict]) -> None:
+        """Stores an answer for later lookups under the same version and filters."""
+        if not self._check_version(table_version):
+            return
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO answers (table_version, scope, query, numbers, vector, response, search_results, "
+            "created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                table_version, self.scope_key(filters), query, json.dumps(_numbers(query)),
+                _normalize(query_vector).tobytes(), response,
+                json.dumps(search_results, default=_to_jsonable), now, now,
+            ),
+        )
+        with self._lock:
+            self._counters["stores"] += 1
+        self._evict()
+
+    def _evict(self) -> None:
+        """Trims the file to ``_EVICT_TO`` of ``max_entries``, least recently used first, once it is over the limit."""
+        conn = self._connection()
+        if conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] <= self.max_entries:
+            return
+        evicted = [row[0] for row in conn.execute(
+            "SELECT id FROM answers ORDER BY last_used DESC, id DESC LIMIT -1 OFFSET ?",
+            (int(self.max_entries * _EVICT_TO),),
+        )]
+        conn.executemany("DELETE FROM answers WHERE id = ?", [(answer_id,) for answer_id in evicted])
+
+        evicted = set(evicted)
+        with self._lock:
+            for entry in self._index.values():
+                keep = [position for position, answer_id in enumerate(entry["ids"]) if answer_id not in evicted]
+                if len(keep) == len(entry["ids"]):
+                    continue
+                entry["ids"] = [entry["ids"][position] for position in keep]
+                entry["numbers"] = [entry["numbers"][position] for position in keep]
+                entry["matrix"] = entry["matrix"][keep] if keep else None
+            self._counters["evictions"] += len(evicted)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["table_version"] = self._version
+            counters["cached_scopes"] = len(self._index)
+            counters["max_entries"] = self.max_entries
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        return counters
@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from utils.filters import build_filter, compile_filter
+from utils.grouped_search import DEFAULT_PER_LENDER_K, grouped_search
+from utils.hybrid_search import hybrid_search, is_exact_term_query, vector_search
+from utils.lender_registry import lender_filter_values
+
+# Upper bound on queries per batch request (the embeddings API accepts 2048 inputs)
+MAX_BATCH_QUERIES = 256
+
+# Separate from the hybrid-search pool so batch tasks can't starve its lexical lookups
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="batch-search")
+
+
+def _needs_embedding(item: Dict) -> bool:
+    mode = item.get("search_mode", "vector")
+    if mode == "lexical":
+        return False
+    return not (mode == "auto" and is_exact_term_query(item["query"]))
+
+
+def _filters(item: Dict, filter_columns: Dict[str, str]) -> Dict:
+    return {
+        "lender": lender_filter_values(item.get("lender_filter"), filter_columns),
+        "product": item.get("product_filter"),
+        "section": item.get("section_filter"),
+    }
+
+
+def batch_search(table, items: List[Dict], embed_many_fn: Callable[[List[str]], List[List[float]]],
+                 filter_columns: Dict[str, str], vector_engine=None, search_params: Optional[Dict] = None,
+                 vector_column: str = "embedding") -> List[List[Dict]]:
+    """Runs many searches with one embedding call and, where possible, one scoring pass.
+
+    Args:
+        table: LanceDB table
+        items: Queries with ``query``, ``num_results``, ``search_mode`` and
+            optional ``lender_filter``/``product_filter``/``section_filter``
+            and ``group_by_lender``/``per_lender_k``/``max_lenders``
+        embed_many_fn: Embeds a list of texts in a single provider call
+        filter_columns: Filter field -> column map of ``table``
+        vector_engine: In-memory engine; vector-mode queries are scored
+            together with one matrix-matrix product when it is current
+        search_params: ANN query-time parameters for the LanceDB path
+        vector_column: Name of the vector column
+
+    Returns:
+        One result list per item, in the order of ``items``
+    """
+    if len(items) > MAX_BATCH_QUERIES:
+        raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per batch, got {len(items)}")
+
+    embedded = [i for i, item in enumerate(items) if _needs_embedding(item)]
+    vectors = dict(zip(embedded, embed_many_fn([items[i]["query"] for i in embedded]))) if embedded else {}
+
+    results: List[Optional[List[Dict]]] = [None] * len(items)
+
+    use_engine = vector_engine is not None and vector_engine.table_version == table.version
+    engine_batch = [
+        i for i in embedded
+        if use_engine and items[i].get("search_mode", "vector") == "vector" and not items[i].get("group_by_lender")
+    ]
+    if engine_batch:
+        batch_results = vector_engine.search_many(
+            [vectors[i] for i in engine_batch],
+            [items[i]["num_results"] for i in engine_batch],
+            [_filters(items[i], filter_columns) for i in engine_batch],
+        )
+        for i, rows in zip(engine_batch, batch_results):
+            results[i] = rows
+
+    def run(i: int) -> List[Dict]:
+        item = items[i]
+        filters = _filters(item, filter_columns)
+        where = compile_filter(build_filter(filters["lender"], filters["product"], filters["section"]), filter_columns)
+        mode = item.get("search_mode", "vector")
+        # Exact-term queries skipped embedding; they only need one if lexical search finds nothing
+        embed_fn = (lambda _: vectors[i]) if i in vectors else (lambda text: embed_many_fn([text])[0])
+
+        if item.get("group_by_lender"):
+            return grouped_search(table, item["query"], embed_fn, item.get("per_lender_k") or DEFAULT_PER_LENDER_K,
+                                  item.get("max_lenders"), where=where, mode=mode, vector_engine=vector_engine,
+                                  filters=filters, vector_column=vector_column, search_params=search_params)
+        if mode == "vector":
+            return vector_search(table, vectors[i], item["num_results"], where, vector_column, search_params)
+        return hybrid_search(table, item["query"], embed_fn, item["num_results"], where=where,
+                             mode=mode, vector_column=vector_column, search_params=search_params)
+
+    pending = [i for i in range(len(items)) if results[i] is None]
+    for i, rows in zip(pending, _executor.map(run, pending)):
+        results[i] = rows
+    return results
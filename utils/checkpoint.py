@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_JOB_DIR = "data/embedding_jobs"
+CHECKPOINT_FILENAME = "checkpoint.json"
+# Vectors of the previous table that the job may reuse, saved before the table is overwritten
+REUSABLE_EMBEDDINGS_FILENAME = "reusable_embeddings.npz"
+
+
+def fingerprint_chunks(chunks: List[Dict]) -> str:
+    """Computes a stable fingerprint of the prepared chunks for an embedding run.
+
+    Args:
+        chunks: The chunk records that will be written to the table
+
+    Returns:
+        Hex SHA-256 digest identifying the exact input of the run
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(json.dumps(chunk, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _atomic_write_json(path: Path, payload: Dict) -> None:
+    """Writes JSON so that a crash leaves either the old or the new file, never half of one."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+    # Persist the rename itself (no-op on platforms without directory fds)
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+@dataclass
+class EmbeddingJobCheckpoint:
+    """Durable progress record of a batched embedding run.
+
+    A batch only counts as committed once it has been written to the table
+    *and* this checkpoint has been saved with the resulting table version.
+    """
+
+    job_id: str
+    input_fingerprint: str
+    total_chunks: int
+    batch_size: int
+    table_name: str
+    status: str = "running"
+    last_committed_batch: int = -1
+    table_version: Optional[int] = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    updated_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    @property
+    def total_batches(self) -> int:
+        return (self.total_chunks + self.batch_size - 1) // self.batch_size
+
+    @property
+    def next_batch(self) -> int:
+        return self.last_committed_batch + 1
+
+    @property
+    def is_complete(self) -> bool:
+        return self.status == "completed"
+
+    @classmethod
+    def start(
+        cls, chunks: List[Dict], batch_size: int, table_name: str
+    ) -> "EmbeddingJobCheckpoint":
+        """Creates a checkpoint for a brand new run over ``chunks``."""
+        return cls(
+            job_id=uuid.uuid4().hex[:12],
+            input_fingerprint=fingerprint_chunks(chunks),
+            total_chunks=len(chunks),
+            batch_size=batch_size,
+            table_name=table_name,
+        )
+
+    def commit_batch(self, batch_index: int, table_version: int, job_dir: str) -> None:
+        """Records ``batch_index`` as durably written at ``table_version``."""
+        self.last_committed_batch = batch_index
+        self.table_version = table_version
+        if self.next_batch >= self.total_batches:
+            self.status = "completed"
+        self.save(job_dir)
+
+    def mark(self, status: str, job_dir: str, error: Optional[str] = None) -> None:
+        """Updates the job status (e.g. ``interrupted`` or ``failed``) and saves it."""
+        self.status = status
+        self.error = error
+        self.save(job_dir)
+
+    def save(self, job_dir: str = DEFAULT_JOB_DIR) -> None:
+        self.updated_at = datetime.now().isoformat()
+        _atomic_write_json(Path(job_dir) / CHECKPOINT_FILENAME, asdict(self))
+
+    @classmethod
+    def load(cls, job_dir: str = DEFAULT_JOB_DIR) -> Optional["EmbeddingJobCheckpoint"]:
+        """Loads the last saved checkpoint, or None if no run has been recorded.
+
+        Raises:
+            ValueError: If the checkpoint file exists but cannot be parsed
+        """
+        path = Path(job_dir) / CHECKPOINT_FILENAME
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(**json.load(f))
+        except (json.JSONDecodeError, TypeError) as e:
+            raise ValueError(f"Corrupt embedding checkpoint {path}: {str(e)}")
+
+
+def save_reusable_embeddings(embeddings: Dict[str, List[float]], job_dir: str = DEFAULT_JOB_DIR) -> None:
+    """Keeps the text hash -> vector map of a job with its checkpoint.
+
+    A new run overwrites the table, so the vectors it reuses must be saved
+    first for a resumed run to reuse them as well.
+    """
+    path = Path(job_dir) / REUSABLE_EMBEDDINGS_FILENAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+
+    hashes = np.asarray(list(embeddings), dtype=str)
+    vectors = np.asarray(list(embeddings.values()), dtype=np.float32)
+    with open(tmp_path, "wb") as f:
+        np.savez(f, hashes=hashes, vectors=vectors)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_reusable_embeddings(job_dir: str = DEFAULT_JOB_DIR) -> Dict[str, List[float]]:
+    """The text hash -> vector map saved by ``save_reusable_embeddings``, empty if there is none."""
+    path = Path(job_dir) / REUSABLE_EMBEDDINGS_FILENAME
+    if not path.exists():
+        return {}
+    with np.load(path) as saved:
+        return {str(key): vector.tolist() for key, vector in zip(saved["hashes"], saved["vectors"])}
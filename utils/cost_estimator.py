@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from utils.token_count import count_tokens
+
+# USD per 1M input tokens (OpenAI list prices)
+EMBEDDING_PRICES_PER_MILLION_TOKENS = {
+    "text-embedding-3-large": 0.13,
+    "text-embedding-3-small": 0.02,
+    "text-embedding-ada-002": 0.10,
+}
+
+FILE_MANIFEST_PATH = "file_hashes.json"
+
+# Section boundaries the HybridChunker splits on: markdown headings and the
+# underlined "barclays"/"accord" style headers used in the lender files
+_HEADING_PATTERN = re.compile(r"^(#{1,6}\s+\S.*|[=\-]{20,})\s*$", re.MULTILINE)
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_file_manifest(manifest_path: str = FILE_MANIFEST_PATH) -> Dict[str, str]:
+    """Loads the path -> SHA-256 manifest of source files that have been embedded."""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_file_manifest(paths: Iterable[str], manifest_path: str = FILE_MANIFEST_PATH) -> None:
+    """Records the current content hash of every embedded source file."""
+    manifest = {path: file_sha256(path) for path in paths if os.path.exists(path)}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_cached_text_hashes(db_uri: str, table_name: str) -> Set[str]:
+    """Hashes of chunk texts that already have an embedding in the local table.
+
+    Reads only the ``text`` column and never calls the embedding API. Returns an
+    empty set if the database or table does not exist yet.
+    """
+    try:
+        import lancedb
+
+        table = lancedb.connect(db_uri).open_table(table_name)
+        texts = table.search().select(["text"]).limit(table.count_rows()).to_arrow()
+    except Exception:
+        return set()
+
+    return {text_sha256(text) for text in texts.column("text").to_pylist()}
+
+
+def estimate_chunks_from_text(text: str, max_tokens: int) -> List[str]:
+    """Approximates HybridChunker output for a raw document without running Docling.
+
+    The document is split on section headings, and any section longer than
+    ``max_tokens`` is split again on paragraph boundaries.
+    """
+    boundaries = [m.start() for m in _HEADING_PATTERN.finditer(text)]
+    starts = [0] + [b for b in boundaries if b > 0]
+    sections = [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+    chunks = []
+    for section in sections:
+        if not section.strip():
+            continue
+        if count_tokens(section) <= max_tokens:
+            chunks.append(section)
+            continue
+
+        current, current_tokens = [], 0
+        for paragraph in section.split("\n\n"):
+            paragraph_tokens = count_tokens(paragraph)
+            if current and current_tokens + paragraph_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(paragraph)
+            current_tokens += paragraph_tokens
+        if current:
+            chunks.append("\n\n".join(current))
+
+    return chunks
+
+
+@dataclass
+class LenderEstimate:
+    """Expected embedding work for one lender source file."""
+
+    lender: str
+    source_file: str
+    chunks: int = 0
+    tokens: int = 0
+    cached_chunks: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def new_chunks(self) -> int:
+        return self.chunks - self.cached_chunks
+
+    @property
+    def new_tokens(self) -> int:
+        return self.tokens - self.cached_tokens
+
+
+@dataclass
+class CostReport:
+    """Per-lender and total embedding estimate for an ingestion run."""
+
+    model: str
+    batch_size: int
+    lenders: List[LenderEstimate] = field(default_factory=list)
+    skipped_files: List[str] = field(default_factory=list)
+
+    def total(self, attr: str) -> int:
+        return sum(getattr(estimate, attr) for estimate in self.lenders)
+
+    @property
+    def embedding_calls(self) -> int:
+        return (self.total("new_chunks") + self.batch_size - 1) // self.batch_size
+
+    def cost(self, tokens: int) -> float:
+        return tokens / 1_000_000 * EMBEDDING_PRICES_PER_MILLION_TOKENS.get(self.model, 0.0)
+
+    def add_chunks(
+        self,
+        lender: str,
+        source_file: str,
+        chunk_texts: List[str],
+        cached_hashes: Optional[Set[str]] = None,
+        file_cached: bool = False,
+    ) -> LenderEstimate:
+        """Adds the chunks of one source file to the report.
+
+        Args:
+            lender: Display name of the lender
+            source_file: File the chunks came from
+            chunk_texts: Text of each chunk that would be embedded
+            cached_hashes: Hashes of chunk texts that already have embeddings
+            file_cached: Treat every chunk as cached (file unchanged since last ingest)
+        """
+        estimate = LenderEstimate(lender=lender, source_file=source_file)
+        for text in chunk_texts:
+            tokens = count_tokens(text)
+            estimate.chunks += 1
+            estimate.tokens += tokens
+            if file_cached or (cached_hashes and text_sha256(text) in cached_hashes):
+                estimate.cached_chunks += 1
+                estimate.cached_tokens += tokens
+        self.lenders.append(estimate)
+        return estimate
+
+
+def print_cost_report(report: CostReport, title: str = "DRY RUN: EMBEDDING ESTIMATE") -> None:
+    """Prints the per-lender breakdown and totals of a cost report."""
+    print(f"\n💰 {title}")
+    print("=" * 96)
+    print(f"{'Lender':<34} {'Chunks':>7} {'Tokens':>10} {'Cached':>7} {'New':>7} {'New tokens':>11} {'Cost $':>9}")
+    print("-" * 96)
+
+    for estimate in sorted(report.lenders, key=lambda e: e.lender):
+        print(f"{estimate.lender[:34]:<34} {estimate.chunks:>7} {estimate.tokens:>10,} "
+              f"{estimate.cached_chunks:>7} {estimate.new_chunks:>7} {estimate.new_tokens:>11,} "
+              f"{report.cost(estimate.new_tokens):>9.4f}")
+
+    print("-" * 96)
+    print(f"{'TOTAL':<34} {report.total('chunks'):>7} {report.total('tokens'):>10,} "
+          f"{report.total('cached_chunks'):>7} {report.total('new_chunks'):>7} "
+          f"{report.total('new_tokens'):>11,} {report.cost(report.total('new_tokens')):>9.4f}")
+
+    print(f"\n🧠 Model: {report.model} "
+          f"(${EMBEDDING_PRICES_PER_MILLION_TOKENS.get(report.model, 0.0)}/1M tokens)")
+    print(f"📡 Embedding API calls: {report.embedding_calls} (batches of {report.batch_size})")
+    print(f"♻️ Reused from cache: {report.total('cached_tokens'):,} tokens "
+          f"(${report.cost(report.total('cached_tokens')):.4f} saved)")
+    print(f"💷 Full rebuild without cache: ${report.cost(report.total('tokens')):.4f}")
+
+    if report.skipped_files:
+        print(f"\n⚠️ Could not read {len(report.skipped_files)} files offline:")
+        for name in report.skipped_files:
+            print(f"  • {name}")
@@ -0,0 +1,151 @@
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.hybrid_search import result_score
+
+# 1.0 = pure relevance, 0.0 = pure diversity
+DEFAULT_MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Candidates fetched per returned chunk before diversification
+MMR_CANDIDATE_FACTOR = int(os.getenv("MMR_CANDIDATE_FACTOR", "3"))
+
+# Two chunks are near-duplicates above either threshold
+DUPLICATE_JACCARD = float(os.getenv("DUPLICATE_JACCARD", "0.8"))
+DUPLICATE_COSINE = float(os.getenv("DUPLICATE_COSINE", "0.98"))
+
+_SHINGLE_SIZE = 3
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _shingles(text: str) -> frozenset:
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def candidate_vectors(rows: List[Dict], vector_column: str = "embedding", vector_engine=None) -> Optional[np.ndarray]:
+    """Unit-normalized vectors of result rows, or None if some row has no vector.
+
+    LanceDB rows carry their vector column; rows from the in-memory engine
+    are looked up in its matrix by ``_snapshot_row``.
+    """
+    vectors = []
+    for row in rows:
+        if row.get(vector_column) is not None:
+            vectors.append(row[vector_column])
+        elif vector_engine is not None and row.get("_snapshot_row") is not None:
+            vectors.append(vector_engine.vectors[row["_snapshot_row"]])
+        else:
+            return None
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def collapse_near_duplicates(rows: List[Dict], vectors: Optional[np.ndarray] = None,
+                             jaccard_threshold: float = DUPLICATE_JACCARD,
+                             cosine_threshold: float = DUPLICATE_COSINE) -> List[int]:
+    """Indices of the rows to keep after dropping near-duplicates of better-ranked rows.
+
+    A row is a near-duplicate when its word-shingle Jaccard similarity or
+    its embedding cosine similarity to a kept row is above the threshold.
+    Kept rows record the sources they absorbed in ``_duplicate_sources``.
+    """
+    shingles = [_shingles(row["text"]) for row in rows]
+    similarities = vectors @ vectors.T if vectors is not None else None
+
+    kept: List[int] = []
+    for i, row in enumerate(rows):
+        duplicate_of = next(
+            (j for j in kept
+             if (similarities is not None and similarities[i, j] >= cosine_threshold)
+             or _jaccard(shingles[i], shingles[j]) >= jaccard_threshold),
+            None,
+        )
+        if duplicate_of is None:
+            kept.append(i)
+        else:
+            source = (row.get("metadata") or {}).get("filename")
+            sources = rows[duplicate_of].setdefault("_duplicate_sources", [])
+            if source not in sources:
+                sources.append(source)
+    return kept
+
+
+def drop_near_duplicates(rows: List[Dict], vector_column: str = "embedding", vector_engine=None) -> List[Dict]:
+    """Near-duplicate collapsing alone, keeping the original order."""
+    if not rows:
+        return rows
+    kept = collapse_near_duplicates(rows, candidate_vectors(rows, vector_column, vector_engine))
+    return [rows[i] for i in kept]
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, limit: int,
+               mmr_lambda: float = DEFAULT_MMR_LAMBDA) -> List[int]:
+    """Maximal-marginal-relevance order of candidates.
+
+    Each step picks the candidate maximising
+    ``λ · relevance - (1 - λ) · max cosine to the already selected ones``.
+    """
+    similarities = vectors @ vectors.T
+    selected: List[int] = []
+    redundancy = np.full(len(relevance), -np.inf, dtype=np.float32)
+    remaining = np.ones(len(relevance), dtype=bool)
+
+    for _ in range(min(limit, len(relevance))):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = np.where(remaining, mmr_lambda * relevance - (1 - mmr_lambda) * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, similarities[best])
+    return selected
+
+
+def diversify(rows: List[Dict], limit: int, query_vector: Optional[Sequence[float]] = None,
+              mmr_lambda: float = DEFAULT_MMR_LAMBDA, vector_column: str = "embedding",
+              vector_engine=None) -> List[Dict]:
+    """Collapses near-duplicate chunks, then picks ``limit`` rows by MMR.
+
+    Args:
+        rows: Ranked candidate rows, best first (more than ``limit``)
+        limit: Number of rows to return
+        query_vector: Query embedding for relevance; without it relevance
+            comes from the retriever's own scores
+        mmr_lambda: Relevance/diversity trade-off; 1.0 ranks by relevance alone
+        vector_column: Vector column carried by LanceDB rows
+        vector_engine: In-memory engine the rows came from, if any
+
+    Returns:
+        Selected rows in MMR order
+    """
+    if not rows:
+        return rows
+
+    vectors = candidate_vectors(rows, vector_column, vector_engine)
+    kept = collapse_near_duplicates(rows, vectors)
+    rows = [rows[i] for i in kept]
+    if vectors is None:
+        return rows[:limit]
+    vectors = vectors[kept]
+
+    if query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = vectors @ (query / (np.linalg.norm(query) or 1.0))
+    else:
+        scores = np.asarray([result_score(row) or 0.0 for row in rows], dtype=np.float32)
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread else np.ones(len(rows), dtype=np.float32)
+
+    return [rows[i] for i in mmr_select(relevance, vectors, limit, mmr_lambda)]
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "data/cache/query_embeddings.sqlite")
+DEFAULT_TTL_SECONDS = int(os.getenv("QUERY_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+DEFAULT_MEMORY_ENTRIES = 2048
+DEFAULT_DISK_ENTRIES = 200_000
+
+# Expired/overflow rows are pruned once every this many disk writes
+_PRUNE_EVERY = 500
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query used as the cache key."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def cache_key(query: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+def as_float32(vector) -> np.ndarray:
+    """Read-only float32 copy of an embedding, the form both tiers store and return."""
+    vector = np.array(vector, dtype=np.float32)
+    vector.setflags(write=False)
+    return vector
+
+
+class QueryEmbeddingCache:
+    """Two-tier cache of query embeddings.
+
+    Tier 1 is an in-process LRU. Tier 2 is a SQLite file in WAL mode that
+    several backend workers (or CLI runs) can read and write concurrently.
+    Entries are keyed by model and normalized query text, expire after
+    ``ttl_seconds`` and are trimmed to ``max_disk_entries`` oldest-first.
+    Vectors are float32 in both tiers and returned as read-only float32
+    arrays, so a query gets the same vector whichever tier it hits, and
+    on the miss that created the entry.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 max_disk_entries: int = DEFAULT_DISK_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "disk_errors": 0}
+
+    def reset_after_fork(self) -> None:
+        """Drops SQLite connections inherited from the parent process; each worker opens its own."""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON query_embeddings(created_at)")
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        try:
+            conn = self._connection()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            self._count("disk_errors")
+            return None
+
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32), row[1]
+
+    def _disk_put(self, key: str, model: str, vector: np.ndarray, created_at: float) -> None:
+        try:
+            conn = self._connection()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, vector.tobytes(), created_at),
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self.prune()
+        except sqlite3.Error:
+            self._count("disk_errors")
+
+    def prune(self) -> None:
+        """Drops expired entries and trims the disk tier to its size limit."""
+        conn = self._connection()
+        if conn is None:
+            return
+        conn.execute("DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            "SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _remember(self, key: str, vector: np.ndarray, created_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (vector, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, query: str, model: str) -> Optional[np.ndarray]:
+        """Returns the cached embedding of ``query`` for ``model``, or None."""
+        key = cache_key(query, model)
+        expired_before = time.time() - self.ttl_seconds
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] >= expired_before:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return entry[0]
+
+        entry = self._disk_get(key)
+        if entry is not None and entry[1] >= expired_before:
+            self._remember(key, *entry)
+            self._count("disk_hits")
+            return entry[0]
+
+        self._count("misses")
+        return None
+
+    def put(self, query: str, model: str, vector: List[float]) -> np.ndarray:
+        """Stores an embedding and returns it in the float32 form lookups will return."""
+        key = cache_key(query, model)
+        created_at = time.time()
+        vector = as_float32(vector)
+        self._remember(key, vector, created_at)
+        self._disk_put(key, model, vector, created_at)
+        return vector
+
+    def get_or_create(self, query: str, model: str, embed_fn: Callable[[str], List[float]]) -> np.ndarray:
+        """Returns the cached embedding, calling ``embed_fn(query)`` only on a miss."""
+        vector = self.get(query, model)
+        if vector is None:
+            vector = self.put(query, model, embed_fn(query))
+        return vector
+
+    async def get_or_create_async(self, query: str, model: str,
+                                  embed_fn: Callable[[str], Awaitable[List[float]]]) -> np.ndarray:
+        """``get_or_create`` for async callers: ``embed_fn`` is awaited, SQLite reads and writes run in a thread."""
+        vector = await asyncio.to_thread(self.get, query, model)
+        if vector is None:
+            vector = await asyncio.to_thread(self.put, query, model, await embed_fn(query))
+        return vector
+
+    def get_or_create_many(self, queries: List[str], model: str,
+                           embed_many_fn: Callable[[List[str]], List[List[float]]]) -> List[np.ndarray]:
+        """Batched ``get_or_create``: all misses are embedded in one ``embed_many_fn`` call.
+
+        Returns:
+            One embedding per query, in the order of ``queries``
+        """
+        vectors = [self.get(query, model) for query in queries]
+        misses = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+        if misses:
+            created = {query: self.put(query, model, vector) for query, vector in zip(misses, embed_many_fn(misses))}
+            vectors = [created[query] if vector is None else vector for query, vector in zip(queries, vectors)]
+        return vectors
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus current tier sizes."""
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["lookups"] = lookups
+        counters["hit_rate"] = round((counters["memory_hits"] + counters["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return counters
@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Logical filter fields -> top-level table columns
+FILTER_COLUMNS = {
+    "lender": "lender_id",
+    "product": "product_type",
+    "section": "criteria_section",
+}
+
+# Where the same values live in older tables, in order of preference: raw
+# lender names before the registry backfill, ``metadata`` before promotion
+LEGACY_FILTER_COLUMNS = {
+    "lender": ("lender_name", "metadata.lender_name"),
+    "section": ("metadata.criteria_section",),
+}
+
+# Scalar index per promoted column: bitmaps for low-cardinality columns,
+# B-trees for the long tail of section headings and for the per-chunk
+# (source_file, ordinal) key of neighbour lookups
+SCALAR_INDEXES = {
+    "lender_id": "BITMAP",
+    "lender_name": "BITMAP",
+    "product_type": "BITMAP",
+    "criteria_section": "BTREE",
+    "chunk_key": "BTREE",
+}
+
+DEFAULT_PRODUCT_TYPE = "residential"
+
+FilterValue = Union[str, int, float, bool]
+
+
+def quote_literal(value: FilterValue) -> str:
+    """Renders a Python value as a SQL literal, escaping quotes in strings."""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    raise TypeError(f"Unsupported filter value type: {type(value).__name__}")
+
+
+def _column(field: str, columns: Dict[str, str]) -> str:
+    if field not in columns:
+        raise ValueError(f"Cannot filter on {field!r} in this table")
+    return columns[field]
+
+
+@dataclass(frozen=True)
+class Eq:
+    """``field = value``"""
+
+    field: str
+    value: FilterValue
+
+    def compile(self, columns: Dict[str, str]) -> str:
+        return f"{_column(self.field, columns)} = {quote_literal(self.value)}"
+
+
+@dataclass(frozen=True)
+class In:
+    """``field IN (values...)``"""
+
+    field: str
+    values: Tuple[FilterValue, ...]
+
+    def compile(self, columns: Dict[str, str]) -> str:
+        if not self.values:
+            return "FALSE"
+        return f"{_column(self.field, columns)} IN ({', '.join(quote_literal(v) for v in self.values)})"
+
+
+@dataclass(frozen=True)
+class And:
+    clauses: Tuple["Filter", ...]
+
+    def compile(self, columns: Dict[str, str]) -> str:
+        return " AND ".join(f"({clause.compile(columns)})" for clause in self.clauses)
+
+
+@dataclass(frozen=True)
+class Or:
+    clauses: Tuple["Filter", ...]
+
+    def compile(self, columns: Dict[str, str]) -> str:
+        return " OR ".join(f"({clause.compile(columns)})" for clause in self.clauses)
+
+
+Filter = Union[Eq, In, And, Or]
+
+
+def match(field: str, value: Union[FilterValue, Sequence[FilterValue], None]) -> Optional[Filter]:
+    """Equality for a single value, IN for a list, nothing for None/empty."""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        values = tuple(dict.fromkeys(value))
+        if not values:
+            return None
+        return Eq(field, values[0]) if len(values) == 1 else In(field, values)
+    return Eq(field, value)
+
+
+def all_of(*clauses: Optional[Filter]) -> Optional[Filter]:
+    """Combines the non-empty clauses with AND."""
+    present = tuple(clause for clause in clauses if clause is not None)
+    if not present:
+        return None
+    return present[0] if len(present) == 1 else And(present)
+
+
+def build_filter(lender=None, product=None, section=None) -> Optional[Filter]:
+    """Typed filter from request parameters; each may be a value or a list of values."""
+    return all_of(match("lender", lender), match("product", product), match("section", section))
+
+
+def resolve_filter_columns(schema) -> Dict[str, str]:
+    """Physical column for each filter field, preferring the promoted top-level columns."""
+    names = set(schema.names)
+    columns = {field: column for field, column in FILTER_COLUMNS.items() if column in names}
+    for field, fallbacks in LEGACY_FILTER_COLUMNS.items():
+        if field not in columns:
+            columns[field] = next((column for column in fallbacks if column in names or "." in column), fallbacks[-1])
+    return columns
+
+
+def compile_filter(filter: Optional[Filter], columns: Dict[str, str]) -> Optional[str]:
+    """Compiles a typed filter to a safe LanceDB ``where`` expression."""
+    return filter.compile(columns) if filter is not None else None
+
+
+def promote_filter_columns(table) -> List[str]:
+    """Adds top-level filter columns to a table that only has them in ``metadata``.
+
+    Returns:
+        Names of the columns that were added
+    """
+    names = set(table.schema.names)
+    expressions = {}
+    if "lender_name" not in names:
+        expressions["lender_name"] = "metadata.lender_name"
+    if "criteria_section" not in names:
+        expressions["criteria_section"] = "metadata.criteria_section"
+    if "product_type" not in names:
+        expressions["product_type"] = quote_literal(DEFAULT_PRODUCT_TYPE)
+
+    if expressions:
+        table.add_columns(expressions)
+    return list(expressions)
+
+
+def create_scalar_indexes(table, indexes: Optional[Dict[str, str]] = None) -> List[str]:
+    """Builds (or replaces) scalar indexes on the filter columns present in the table."""
+    names = set(table.schema.names)
+    created = []
+    for column, index_type in (indexes or SCALAR_INDEXES).items():
+        if column in names:
+            table.create_scalar_index(column, index_type=index_type, replace=True)
+            created.append(column)
+    return created
+
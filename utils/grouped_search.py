@@ -0,0 +1,74 @@
+import os
+from typing import Callable, Dict, List, Optional
+
+from utils.hybrid_search import hybrid_search
+from utils.lender_registry import get_registry
+
+# Best chunks returned per lender in grouped mode
+DEFAULT_PER_LENDER_K = int(os.getenv("GROUPED_PER_LENDER_K", "2"))
+
+# Rows ranked by LanceDB before grouping; enough to reach past the verbose lenders
+GROUPED_CANDIDATES = int(os.getenv("GROUPED_SEARCH_CANDIDATES", "400"))
+
+
+def row_lender(row: Dict) -> str:
+    """Canonical lender id of a result row, from the top-level columns or the metadata struct."""
+    if row.get("lender_id"):
+        return row["lender_id"]
+    return get_registry().lender_id(row.get("lender_name") or (row.get("metadata") or {}).get("lender_name"))
+
+
+def group_by_lender(rows: List[Dict], per_lender_k: int = DEFAULT_PER_LENDER_K,
+                    max_lenders: Optional[int] = None) -> List[Dict]:
+    """Keeps the best ``per_lender_k`` rows of each lender from one ranked list.
+
+    Lenders are ordered by their best row, and each lender's rows stay
+    together so answers can be built lender by lender.
+
+    Args:
+        rows: Ranked rows, best first
+        per_lender_k: Rows kept per lender
+        max_lenders: Keep only the best ``max_lenders`` lenders
+
+    Returns:
+        Grouped rows, each with a ``_lender_rank`` field
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for row in rows:
+        group = groups.setdefault(row_lender(row), [])
+        if len(group) < per_lender_k:
+            group.append(row)
+
+    grouped = []
+    for lender_rank, group in enumerate(list(groups.values())[:max_lenders]):
+        grouped.extend({**row, "_lender_rank": lender_rank} for row in group)
+    return grouped
+
+
+def grouped_search(table, query: str, embed_fn: Callable[[str], List[float]],
+                   per_lender_k: int = DEFAULT_PER_LENDER_K, max_lenders: Optional[int] = None,
+                   where: Optional[str] = None, mode: str = "vector", vector_engine=None,
+                   filters: Optional[Dict] = None, candidates: Optional[int] = None,
+                   vector_column: str = "embedding", search_params: Optional[Dict] = None,
+                   columns: Optional[List[str]] = None) -> List[Dict]:
+    """Best ``per_lender_k`` chunks for each lender from a single retrieval pass.
+
+    With a current in-memory engine and vector mode, every lender's top-k is
+    exact. Otherwise one ranked candidate list is fetched from LanceDB and
+    grouped, so lenders with no chunk among the candidates are left out as
+    the least relevant.
+
+    Args:
+        filters: ``{"lender", "product", "section"}`` for the in-memory engine
+        where: The same filters compiled for LanceDB
+        columns: Columns LanceDB returns (default ``RESULT_COLUMNS``)
+    """
+    if mode == "vector" and vector_engine is not None and vector_engine.table_version == table.version:
+        filters = filters or {}
+        return vector_engine.search_grouped(embed_fn(query), per_lender_k, max_lenders,
+                                            filters.get("lender"), filters.get("product"), filters.get("section"))
+
+    candidates = max(candidates or GROUPED_CANDIDATES, per_lender_k * (max_lenders or 0) * 4)
+    rows = hybrid_search(table, query, embed_fn, candidates, where=where, mode=mode,
+                         vector_column=vector_column, search_params=search_params, columns=columns)
+    return group_by_lender(rows, per_lender_k, max_lenders)
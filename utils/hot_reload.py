@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import lancedb
+import numpy as np
+
+from utils.vector_snapshot import DEFAULT_SNAPSHOT_DIR, current_snapshot_path
+
+# Seconds between checks for a new table version or snapshot; 0 turns reloading off
+RELOAD_INTERVAL_SECONDS = float(os.getenv("RELOAD_INTERVAL_SECONDS", "10"))
+
+
+@dataclass(frozen=True)
+class ServingState:
+    """Everything a request reads from one table version.
+
+    A request takes the current state once and uses it throughout, and the
+    reloader replaces the state as a whole, so a request never mixes two
+    versions and requests in flight during a reload finish on the state
+    they started with.
+    """
+    table: object
+    version: int
+    filter_columns: Dict
+    result_columns: List[str]
+    catalog: Dict
+    vector_engine: object = None
+    lender_router: object = None
+    # Snapshot considered when the state was loaded, used or not
+    snapshot_path: Optional[str] = None
+
+
+def warm_up(table, vector_column: str = "embedding") -> None:
+    """Runs one vector and one full-text query, so the indexes are open before the first request."""
+    dim = table.schema.field(vector_column).type.list_size
+    table.search(np.zeros(dim, dtype=np.float32), vector_column_name=vector_column).select(["text"]).limit(1).to_list()
+    try:
+        table.search("criteria", query_type="fts").select(["text"]).limit(1).to_list()
+    except Exception:
+        # No full-text index on this table
+        pass
+
+
+class TableWatcher:
+    """Polls for a new table version or vector snapshot and swaps in a freshly loaded state.
+
+    The new state is loaded and warmed up in a worker thread while requests
+    keep being served from the old one; the swap itself is one assignment.
+    If loading fails the old state stays in place and the next check tries
+    again.
+    """
+
+    def __init__(self, db_uri: str, table_name: str, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR,
+                 interval: float = RELOAD_INTERVAL_SECONDS, watch_snapshots: bool = True):
+        self.db_uri = db_uri
+        self.table_name = table_name
+        self.snapshot_dir = snapshot_dir
+        # Off when the served state doesn't use the snapshot, so a new export alone doesn't reload it
+        self.watch_snapshots = watch_snapshots
+        self.interval = interval
+        # A handle of its own: checking out the latest version must not move the serving table
+        self._table = None
+        self._counters = {"checks": 0, "reloads": 0, "errors": 0}
+        self._last_reload: Optional[Dict] = None
+
+    def latest_version(self) -> int:
+        if self._table is None:
+            self._table = lancedb.connect(self.db_uri).open_table(self.table_name)
+        self._table.checkout_latest()
+        return self._table.version
+
+    def is_stale(self, state: ServingState) -> bool:
+        """True when the table, or the current snapshot if watched, has moved on from ``state``."""
+        if self.latest_version() != state.version:
+            return True
+        return self.watch_snapshots and current_snapshot_path(self.snapshot_dir) != state.snapshot_path
+
+    async def run(self, current: Callable[[], Optional[ServingState]],
+                  load: Callable[[], ServingState], swap: Callable[[ServingState], None]) -> None:
+        """Checks every ``interval`` seconds until cancelled.
+
+        Args:
+            current: Returns the state being served
+            load: Loads (and warms up) the state of the latest version; runs in a thread
+            swap: Makes a loaded state the one served
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            state = current()
+            if state is None:
+                continue
+            try:
+                self._counters["checks"] += 1
+                if not await asyncio.to_thread(self.is_stale, state):
+                    continue
+                started = time.perf_counter()
+                new_state = await asyncio.to_thread(load)
+                swap(new_state)
+                self._counters["reloads"] += 1
+                self._last_reload = {
+                    "from_version": state.version,
+                    "to_version": new_state.version,
+                    "snapshot": os.path.basename(new_state.snapshot_path) if new_state.snapshot_path else None,
+                    "load_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "at": time.time(),
+                }
+                if new_state.version != state.version:
+                    change = f"table v{state.version} → v{new_state.version}"
+                else:
+                    change = f"search snapshot of table v{new_state.version}"
+                print(f"🔄 Reloaded {change} in {self._last_reload['load_ms']:.0f} ms")
+            except Exception as e:
+                self._counters["errors"] += 1
+                print(f"⚠️ Reload failed, still serving v{state.version}: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {**self._counters, "interval_seconds": self.interval, "last_reload": self._last_reload}
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from utils.vector_index import apply_search_params
+
+SEARCH_MODES = ("vector", "lexical", "hybrid", "auto")
+
+# Standard RRF damping constant (Cormack et al.); larger values flatten the
+# advantage of top-ranked hits
+RRF_K = 60
+
+# Relative weight of each retriever in the fused ranking
+VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+TEXT_WEIGHT = float(os.getenv("HYBRID_TEXT_WEIGHT", "1.0"))
+
+# Document codes (SA302, P60), amounts (£75,000), percentages (85%) and acronyms (HMO, LTV)
+_EXACT_TERM_PATTERN = re.compile(r"^(?:[A-Z]{1,4}\d{1,4}[A-Z]?|£[\d,.]+[km]?|[\d,.]+%|\d[\d,.]*|[A-Z]{2,6}s?)$")
+
+# Columns returned to callers; vectors are only fetched when a caller asks for them
+RESULT_COLUMNS = ["text", "metadata"]
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+
+
+def row_key(row: Dict) -> str:
+    """Stable identity of a result row across retrievers."""
+    metadata = row.get("metadata") or {}
+    if metadata.get("chunk_id"):
+        return metadata["chunk_id"]
+    return hashlib.sha1(row["text"].encode("utf-8")).hexdigest()
+
+
+def result_score(row: Dict) -> Optional[float]:
+    """Higher-is-better score of a result row from any retriever.
+
+    Reranked rows carry ``_rerank_score``, fused rows ``_relevance_score``,
+    BM25 rows ``_score`` and vector rows a ``_distance`` (mapped to
+    ``1 / (1 + distance)``).
+    """
+    for field in ("_rerank_score", "_relevance_score", "_score"):
+        if row.get(field) is not None:
+            return float(row[field])
+    if row.get("_distance") is not None:
+        return 1.0 / (1.0 + float(row["_distance"]))
+    return None
+
+
+def is_exact_term_query(query: str, max_terms: int = 4) -> bool:
+    """True for short queries made of jargon, codes and numbers only.
+
+    Such queries ("SA302", "HMO 85% LTV", "£75,000") are answered better by the
+    full-text index than by embeddings, and can skip the embedding call.
+    """
+    terms = query.strip().rstrip("?").split()
+    if not terms or len(terms) > max_terms:
+        return False
+    return all(_EXACT_TERM_PATTERN.match(term.strip(",;:()\"'")) for term in terms)
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Dict]], weights: Sequence[float],
+                           k: int = RRF_K, limit: Optional[int] = None) -> List[Dict]:
+    """Fuses ranked result lists with weighted reciprocal-rank fusion.
+
+    Each row scores ``sum(weight / (k + rank))`` over the lists it appears in,
+    so rows ranked well by several retrievers rise to the top regardless of
+    how each retriever scales its scores.
+
+    Args:
+        result_lists: Ranked rows from each retriever, best first
+        weights: Weight of each retriever, aligned with ``result_lists``
+        k: RRF damping constant
+        limit: Maximum number of fused rows to return
+
+    Returns:
+        Fused rows, best first, each with a ``_relevance_score`` field
+    """
+    scores: Dict[str, float] = {}
+    rows: Dict[str, Dict] = {}
+
+    for results, weight in zip(result_lists, weights):
+        for rank, row in enumerate(results, 1):
+            key = row_key(row)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            # Keep the first copy but merge in retriever-specific fields (_distance, _score)
+            rows[key] = {**row, **rows.get(key, {})}
+
+    fused = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [{**rows[key], "_relevance_score": scores[key]} for key in fused]
+
+
+def build_text_index(table, column: str = "text") -> None:
+    """Builds (or replaces) the BM25 full-text index on ``column``.
+
+    Stop words are kept so that short criteria phrases ("up to", "no more
+    than") still contribute to matching.
+    """
+    table.create_fts_index(column, replace=True, remove_stop_words=False)
+
+
+def lexical_search(table, query: str, limit: int, where: Optional[str] = None,
+                   columns: Optional[List[str]] = None) -> List[Dict]:
+    """BM25 search over the full-text index on ``text``."""
+    builder = table.search(query, query_type="fts").select(columns or RESULT_COLUMNS).limit(limit)
+    if where:
+        builder = builder.where(where, prefilter=True)
+    return builder.to_list()
+
+
+def vector_search(table, vector: List[float], limit: int, where: Optional[str] = None,
+                  vector_column: str = "embedding", search_params: Optional[Dict] = None,
+                  columns: Optional[List[str]] = None) -> List[Dict]:
+    """Nearest-neighbour search on ``vector_column``."""
+    builder = apply_search_params(table.search(vector, vector_column_name=vector_column), search_params)
+    builder = builder.select(columns or RESULT_COLUMNS)
+    if where:
+        builder = builder.where(where, prefilter=True)
+    return builder.limit(limit).to_list()
+
+
+def hybrid_search(table, query: str, embed_fn: Callable[[str], List[float]], limit: int,
+                  where: Optional[str] = None, mode: str = "hybrid",
+                  vector_weight: float = VECTOR_WEIGHT, text_weight: float = TEXT_WEIGHT,
+                  candidates: Optional[int] = None, vector_column: str = "embedding",
+                  search_params: Optional[Dict] = None, columns: Optional[List[str]] = None) -> List[Dict]:
+    """Runs vector, lexical or fused retrieval.
+
+    Args:
+        table: LanceDB table with a full-text index on ``text``
+        query: User query
+        embed_fn: Returns the query embedding; not called in lexical mode
+        limit: Number of rows to return
+        where: Optional prefilter expression
+        mode: ``vector``, ``lexical``, ``hybrid``, or ``auto`` (lexical for
+            exact-term queries, hybrid otherwise)
+        vector_weight: RRF weight of the vector ranking
+        text_weight: RRF weight of the BM25 ranking
+        candidates: Rows fetched from each retriever before fusion
+        vector_column: Name of the vector column
+        search_params: ANN query-time parameters
+        columns: Columns to return (default ``RESULT_COLUMNS``)
+
+    Returns:
+        Result rows, best first
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+
+    if mode == "auto":
+        if is_exact_term_query(query):
+            try:
+                results = lexical_search(table, query, limit, where, columns)
+                if results:
+                    return results
+            except Exception as e:
+                print(f"Lexical search unavailable, falling back to hybrid: {str(e)}")
+        mode = "hybrid"
+
+    if mode == "lexical":
+        return lexical_search(table, query, limit, where, columns)
+
+    if mode == "vector":
+        return vector_search(table, embed_fn(query), limit, where, vector_column, search_params, columns)
+
+    candidates = candidates or max(limit * 2, 20)
+
+    # BM25 runs while the embedding call is in flight
+    lexical_future = _executor.submit(lexical_search, table, query, candidates, where, columns)
+    vector_results = vector_search(table, embed_fn(query), candidates, where, vector_column, search_params, columns)
+
+    try:
+        lexical_results = lexical_future.result()
+    except Exception as e:
+        # A missing full-text index shouldn't take search down with it
+        print(f"Lexical search unavailable, using vector results only: {str(e)}")
+        return vector_results[:limit]
+
+    return reciprocal_rank_fusion([vector_results, lexical_results], [vector_weight, text_weight], limit=limit)
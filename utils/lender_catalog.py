@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from utils.lender_registry import get_registry
+
+CATALOG_SUFFIX = ".catalog.json"
+
+
+def catalog_path(table) -> str:
+    """Catalog file kept next to the table's ``.lance`` directory."""
+    return catalog_path_for_uri(table.uri)
+
+
+def catalog_path_for_uri(uri: str) -> str:
+    """Catalog file for a table's ``.lance`` directory, without opening the table."""
+    uri = uri.rstrip("/")
+    if uri.endswith(".lance"):
+        uri = uri[:-len(".lance")]
+    return uri + CATALOG_SUFFIX
+
+
+def _version_date(table) -> str:
+    """Commit date of the table's current version."""
+    for version in reversed(table.list_versions()):
+        if version["version"] == table.version:
+            return version["timestamp"].date().isoformat()
+    return table.list_versions()[-1]["timestamp"].date().isoformat()
+
+
+def build_catalog(table, previous: Optional[Dict] = None) -> Dict:
+    """Per-lender chunk counts, product types and source files of a table.
+
+    Only the lender, product and metadata columns are read, never the
+    vectors. A lender keeps its previous ``last_updated`` while its chunk
+    count and source files are unchanged; otherwise it gets the commit date
+    of the current table version.
+
+    Args:
+        table: LanceDB table
+        previous: Catalog of an earlier version, to carry dates forward
+
+    Returns:
+        The catalog, keyed by ``lender_id``
+    """
+    registry = get_registry()
+    names = set(table.schema.names)
+    columns = [column for column in ("lender_id", "lender_name", "product_type") if column in names] + ["metadata"]
+    scanned = table.search().select(columns).limit(max(table.count_rows(), 1)).to_arrow().to_pylist()
+
+    lenders: Dict[str, Dict] = {}
+    for row in scanned:
+        metadata = row.get("metadata") or {}
+        lender = registry.resolve(row.get("lender_id") or row.get("lender_name") or metadata.get("lender_name"))
+        entry = lenders.setdefault(lender.lender_id, {
+            "name": lender.display_name, "chunks": 0, "product_types": set(), "source_files": set(),
+        })
+        entry["chunks"] += 1
+        if row.get("product_type"):
+            entry["product_types"].add(row["product_type"])
+        if metadata.get("filename"):
+            entry["source_files"].add(metadata["filename"])
+
+    updated = _version_date(table)
+    previous_lenders = (previous or {}).get("lenders", {})
+    for lender_id, entry in lenders.items():
+        entry["product_types"] = sorted(entry["product_types"])
+        entry["source_files"] = sorted(entry["source_files"])
+        before = previous_lenders.get(lender_id) or {}
+        unchanged = before.get("chunks") == entry["chunks"] and before.get("source_files") == entry["source_files"]
+        entry["last_updated"] = before["last_updated"] if unchanged and before.get("last_updated") else updated
+
+    return {
+        "table_version": table.version,
+        "total_chunks": len(scanned),
+        "last_updated": max((entry["last_updated"] for entry in lenders.values()), default=updated),
+        "lenders": dict(sorted(lenders.items(), key=lambda item: item[1]["name"])),
+    }
+
+
+def load_catalog(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_catalog(catalog: Dict, path: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def refresh_catalog(table, path: Optional[str] = None) -> Dict:
+    """Rebuilds and saves the catalog after ingestion (called by the pipeline)."""
+    path = path or catalog_path(table)
+    catalog = build_catalog(table, previous=load_catalog(path))
+    save_catalog(catalog, path)
+    return catalog
+
+
+class LenderCatalog:
+    """In-memory lender catalog, cached per table version.
+
+    ``get`` returns the cached catalog while the table version is unchanged.
+    After a write it loads the catalog the pipeline saved for the new
+    version, or rebuilds it (and saves it) if the pipeline didn't.
+    """
+
+    def __init__(self):
+        self._catalog: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def get(self, table) -> Dict:
+        catalog = self._catalog
+        if catalog is not None and catalog["table_version"] == table.version:
+            return catalog
+
+        with self._lock:
+            if self._catalog is None or self._catalog["table_version"] != table.version:
+                path = catalog_path(table)
+                stored = load_catalog(path)
+                if stored is not None and stored.get("table_version") == table.version:
+                    self._catalog = stored
+                else:
+                    self._catalog = build_catalog(table, previous=stored or self._catalog)
+                    try:
+                        save_catalog(self._catalog, path)
+                    except OSError as e:
+                        print(f"⚠️ Could not save lender catalog: {e}")
+            return self._catalog
+
+    def preload(self, path: str) -> bool:
+        """Loads the stored catalog before the table is opened (e.g. ahead of forking workers).
+
+        ``get`` still checks its version against the table on first use.
+        """
+        stored = load_catalog(path)
+        if stored is not None and "table_version" in stored:
+            self._catalog = stored
+        return self._catalog is not None
+
+    def lender_names(self, table):
+        return [entry["name"] for entry in self.get(table)["lenders"].values()]
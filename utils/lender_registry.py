@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from utils.filters import quote_literal
+
+REGISTRY_PATH = os.getenv("LENDER_REGISTRY_PATH", "lender_registry.json")
+
+# Filename words that never belong to a lender's name
+_NOISE_TOKENS = {
+    "residential", "res", "btl", "buy", "to", "let", "criteria", "personal", "persoonal", "limited",
+    "company", "final", "clean", "policy", "direct", "txt", "pdf", "md",
+}
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Aliases shorter than this ("bm", "tmw") only match whole words of a file name
+_MIN_SUBSTRING_ALIAS = 4
+
+
+def _compact(text: str) -> str:
+    """Lower-case alphanumerics only ("Kent Reliance-buy-to-let.txt" -> "kentreliancebuytolettxt")."""
+    return "".join(_TOKEN_PATTERN.findall(text.lower().replace("&", "and")))
+
+
+@dataclass(frozen=True)
+class Lender:
+    lender_id: str
+    display_name: str
+    aliases: Tuple[str, ...] = ()
+    # Place names ("leeds") that identify a lender's files but not a query mention
+    file_aliases: Tuple[str, ...] = ()
+    # Ordinary words ("fleet", "virgin") that only mean the lender when capitalised
+    proper_noun_aliases: Tuple[str, ...] = ()
+
+    @property
+    def all_aliases(self) -> Tuple[str, ...]:
+        return self.aliases + self.file_aliases + self.proper_noun_aliases
+
+
+def derive_lender(source: str) -> Lender:
+    """Best-effort lender for a name or file the registry doesn't know."""
+    stem = os.path.splitext(os.path.basename(source))[0] if "." in source else source
+    tokens = [t for t in _TOKEN_PATTERN.findall(stem.lower()) if t not in _NOISE_TOKENS and not t.isdigit()]
+    tokens = tokens or _TOKEN_PATTERN.findall(stem.lower()) or ["unknown"]
+    return Lender("_".join(tokens), " ".join(t.capitalize() for t in tokens))
+
+
+class LenderRegistry:
+    """Maps source files and free-form lender names to canonical lenders.
+
+    Names resolve by exact id/display-name/alias match first, then by the
+    longest alias contained in the name ("santander_bank_residential_1.txt"
+    -> Santander). Anything else gets a derived lender so ingestion never
+    fails on a new file; add it to ``lender_registry.json`` to give it a
+    proper display name. Resolutions are memoized, so query-time lookups
+    are dictionary hits.
+    """
+
+    def __init__(self, lenders: List[Lender], products: Optional[Dict[str, Tuple[str, ...]]] = None):
+        self.lenders = sorted(lenders, key=lambda lender: lender.display_name)
+        # Product type -> the phrases brokers use for it
+        self.products = products or {}
+        self._by_id = {lender.lender_id: lender for lender in self.lenders}
+
+        self._exact: Dict[str, Lender] = {}
+        self._aliases: List[Tuple[str, Lender]] = []
+        for lender in self.lenders:
+            for name in (lender.lender_id, lender.display_name, *lender.all_aliases):
+                self._exact.setdefault(_compact(name), lender)
+            for alias in lender.all_aliases:
+                self._aliases.append((_compact(alias), lender))
+        # Longest aliases first, so "the mortgage works" wins over shorter overlaps
+        self._aliases.sort(key=lambda item: len(item[0]), reverse=True)
+
+        self._resolved: Dict[str, Lender] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = REGISTRY_PATH) -> "LenderRegistry":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        lenders = [
+            Lender(e["id"], e["name"], tuple(e.get("aliases", ())), tuple(e.get("file_aliases", ())),
+                   tuple(e.get("proper_noun_aliases", ())))
+            for e in data.get("lenders", [])
+        ]
+        products = {product: tuple(phrases) for product, phrases in data.get("products", {}).items()}
+        return cls(lenders, products)
+
+    def get(self, lender_id: str) -> Optional[Lender]:
+        return self._by_id.get(lender_id)
+
+    def _match(self, source: str) -> Lender:
+        stem = os.path.splitext(source)[0] if source.lower().endswith((".txt", ".pdf", ".md")) else source
+        compact = _compact(stem)
+        if compact in self._exact:
+            return self._exact[compact]
+        words = set(_TOKEN_PATTERN.findall(stem.lower()))
+        for alias, lender in self._aliases:
+            if alias in words if len(alias) < _MIN_SUBSTRING_ALIAS else alias in compact:
+                return lender
+        return derive_lender(source)
+
+    def resolve(self, source: Optional[str]) -> Lender:
+        """Canonical lender of a source filename, stored lender name, id or alias."""
+        source = source or "unknown"
+        lender = self._resolved.get(source)
+        if lender is None:
+            lender = self._match(source)
+            with self._lock:
+                self._resolved[source] = lender
+        return lender
+
+    def display_name(self, source: Optional[str]) -> str:
+        return self.resolve(source).display_name
+
+    def lender_id(self, source: Optional[str]) -> str:
+        return self.resolve(source).lender_id
+
+
+@lru_cache(maxsize=1)
+def get_registry() -> LenderRegistry:
+    """Process-wide registry loaded from ``lender_registry.json``."""
+    return LenderRegistry.load()
+
+
+def lender_filter_values(value, filter_columns: Dict[str, str]):
+    """Maps request lender filters (names, aliases or ids) to the values stored in the filter column.
+
+    Tables with a ``lender_id`` column are filtered by canonical id; older
+    tables keep the raw values they were built with.
+    """
+    if value is None or filter_columns.get("lender") != "lender_id":
+        return value
+    registry = get_registry()
+    if isinstance(value, (list, tuple, set)):
+        return [registry.lender_id(v) for v in value]
+    return registry.lender_id(value)
+
+
+def backfill_lender_columns(table, registry: Optional[LenderRegistry] = None) -> int:
+    """Adds ``lender_id`` and canonical ``lender_name`` columns to an existing table.
+
+    One update per distinct raw ``metadata.lender_name`` rewrites both
+    columns from the registry, so a table built before the registry existed
+    gets the same values as a fresh ingest.
+
+    Returns:
+        Number of distinct raw lender names resolved
+    """
+    registry = registry or get_registry()
+    names = set(table.schema.names)
+    additions = {}
+    if "lender_id" not in names:
+        additions["lender_id"] = "CAST(NULL AS STRING)"
+    if "lender_name" not in names:
+        additions["lender_name"] = "metadata.lender_name"
+    if additions:
+        table.add_columns(additions)
+
+    raw_names = table.search().select(["metadata"]).limit(table.count_rows()).to_arrow().column("metadata").to_pylist()
+    distinct = sorted({(metadata or {}).get("lender_name") or "" for metadata in raw_names})
+    for raw in distinct:
+        lender = registry.resolve(raw)
+        where = f"metadata.lender_name = {quote_literal(raw)}"
+        if not raw:
+            # Chunks stored without a lender name are NULL rather than ''
+            where = f"metadata.lender_name IS NULL OR {where}"
+        table.update(where=where, values={"lender_id": lender.lender_id, "lender_name": lender.display_name})
+    return len(distinct)
@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Off by default: a routed query only searches ROUTE_TOP_LENDERS lenders, so
+# measure recall against the full search on your own questions before enabling
+LENDER_ROUTING = os.getenv("LENDER_ROUTING", "false").lower() == "true"
+
+# Lenders searched for an unfiltered query once routing kicks in
+ROUTE_TOP_LENDERS = int(os.getenv("ROUTE_TOP_LENDERS", "8"))
+
+# Routing is skipped (full search) unless the best lender's centroid score is
+# this many standard deviations above the mean lender's - otherwise the scores
+# are flat and the question is about every lender rather than a few. With n
+# lenders the best z-score is at most sqrt(n - 1) (one lender up, the rest
+# level), so 4.0 needs at least 18 lenders and routing never triggers below that
+ROUTE_MIN_ZSCORE = float(os.getenv("ROUTE_MIN_ZSCORE", "4.0"))
+
+# Sections with fewer chunks than this only count through their lender's centroid
+MIN_SECTION_ROWS = 3
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def build_centroids(vectors: np.ndarray, lenders: Sequence[str],
+                    sections: Sequence[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    """Unit centroids of every lender and of every (lender, section) with enough chunks.
+
+    A lender whose documents cover many topics is represented by several
+    section centroids, so a question about one topic still finds it.
+
+    Returns:
+        The centroid matrix and the lender each centroid row belongs to
+    """
+    unit = _unit_rows(np.asarray(vectors, dtype=np.float32))
+    groups: Dict[Tuple[str, Optional[str]], List[int]] = {}
+    for position, (lender, section) in enumerate(zip(lenders, sections)):
+        groups.setdefault((lender or "", None), []).append(position)
+        if section:
+            groups.setdefault((lender or "", section), []).append(position)
+
+    centroids, owners = [], []
+    for (lender, section), positions in groups.items():
+        if section is not None and len(positions) < MIN_SECTION_ROWS:
+            continue
+        centroids.append(unit[positions].mean(axis=0))
+        owners.append(lender)
+
+    if not centroids:
+        return np.empty((0, unit.shape[1] if unit.ndim == 2 else 0), dtype=np.float32), []
+    return _unit_rows(np.asarray(centroids, dtype=np.float32)), owners
+
+
+class LenderRouter:
+    """Coarse stage of coarse-to-fine search: picks the lenders worth scoring.
+
+    Each lender scores the best cosine similarity between the query and its
+    centroids. ``route`` returns the top lenders, or None when the scores
+    are too flat to trust, in which case the caller searches everything.
+    """
+
+    def __init__(self, centroids: np.ndarray, owners: Sequence[str], table_version: Optional[int] = None,
+                 lender_column: str = "lender_id"):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.lenders = sorted(set(owners))
+        index = {lender: i for i, lender in enumerate(self.lenders)}
+        self.owner_index = np.asarray([index[owner] for owner in owners], dtype=np.int64)
+        self.table_version = table_version
+        self.lender_column = lender_column
+
+        self._lock = threading.Lock()
+        self._counters = {"routed": 0, "flat_fallbacks": 0}
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LenderRouter"]:
+        """Router of a snapshot directory, or None for snapshots exported without centroids."""
+        centroids_path = os.path.join(path, "centroids.npy")
+        if not os.path.exists(centroids_path):
+            return None
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return cls(np.load(centroids_path), manifest["centroid_lenders"], manifest["table_version"],
+                   manifest.get("lender_column", "lender_name"))
+
+    def lender_scores(self, query_vector: Sequence[float]) -> np.ndarray:
+        """Best centroid cosine per lender, aligned with ``self.lenders``."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        similarities = self.centroids @ (query / (np.linalg.norm(query) or 1.0))
+        scores = np.full(len(self.lenders), -np.inf, dtype=np.float32)
+        np.maximum.at(scores, self.owner_index, similarities)
+        return scores
+
+    def route(self, query_vector: Sequence[float], top_n: int = ROUTE_TOP_LENDERS,
+              min_zscore: float = ROUTE_MIN_ZSCORE) -> Optional[List[str]]:
+        """The ``top_n`` lenders closest to the query, best first, or None to search all lenders."""
+        if top_n <= 0 or len(self.lenders) <= top_n:
+            return None
+
+        scores = self.lender_scores(query_vector)
+        order = np.argsort(-scores, kind="stable")
+        # Relative, not absolute: cosine ranges differ a lot between embedding models
+        spread = float(scores.std())
+        # Equal scores still get a float32 rounding-noise spread, and any z-score from it
+        if spread < 1e-6 or (scores[order[0]] - float(scores.mean())) / spread < min_zscore:
+            self._count("flat_fallbacks")
+            return None
+
+        self._count("routed")
+        return [self.lenders[i] for i in order[:top_n]]
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters["lenders"] = len(self.lenders)
+        counters["centroids"] = len(self.centroids)
+        return counters
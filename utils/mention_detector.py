@@ -0,0 +1,177 @@
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from utils.lender_registry import LenderRegistry, get_registry
+
+# Apply detected lender/product mentions as filters when a request sets none
+AUTO_FILTER_MENTIONS = os.getenv("AUTO_FILTER_MENTIONS", "true").lower() == "true"
+
+
+def _normalize(text: str) -> str:
+    """Lower-case, every non-alphanumeric character a space; same length as ``text``."""
+    return "".join(ch.lower() if ch.isalnum() and len(ch.lower()) == 1 else " " for ch in text)
+
+
+def _alias_key(alias: str) -> str:
+    return " ".join(_normalize(alias).split())
+
+
+@dataclass(frozen=True)
+class AliasMatch:
+    start: int
+    end: int
+    kind: str
+    value: str
+
+
+class AliasAutomaton:
+    """Aho-Corasick automaton over whole-word aliases.
+
+    Patterns and text are normalized the same way and padded with spaces,
+    so "bm" matches "BM's criteria" but not "submit". All patterns are found
+    in one left-to-right pass, whatever their number.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, str, str, bool]]] = [[]]
+        self._built = False
+
+    def add(self, alias: str, kind: str, value: str, proper_noun: bool = False) -> None:
+        """Registers ``alias`` (a phrase) as a mention of ``value``; proper nouns must be capitalised."""
+        pattern = f" {_alias_key(alias)} "
+        if pattern.strip() == "":
+            return
+        state = 0
+        for ch in pattern:
+            if ch not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._goto[state][ch] = len(self._goto) - 1
+            state = self._goto[state][ch]
+        self._outputs[state].append((len(pattern), kind, value, proper_noun))
+        self._built = False
+
+    def build(self) -> "AliasAutomaton":
+        """Computes failure links breadth-first."""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+        self._built = True
+        return self
+
+    def find(self, text: str) -> List[AliasMatch]:
+        """Leftmost-longest, non-overlapping alias matches in ``text``."""
+        if not self._built:
+            self.build()
+        padded = f" {text} "
+
+        # Collapse runs of separators ("Hinckley & Rugby"), remembering where each character came from
+        chars, offsets = [], []
+        for position, ch in enumerate(_normalize(padded)):
+            if ch == " " and chars and chars[-1] == " ":
+                continue
+            chars.append(ch)
+            offsets.append(position)
+
+        candidates = []
+        state = 0
+        for position, ch in enumerate(chars):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, kind, value, proper_noun in self._outputs[state]:
+                # Padding spaces are part of the pattern; report the word span itself
+                start, end = offsets[position - length + 2], offsets[position]
+                if proper_noun and not padded[start].isupper():
+                    continue
+                candidates.append(AliasMatch(start - 1, end - 1, kind, value))
+
+        matches, covered_until = [], -1
+        for match in sorted(candidates, key=lambda m: (m.start, m.start - m.end)):
+            if match.start >= covered_until:
+                matches.append(match)
+                covered_until = match.end
+        return matches
+
+
+@dataclass
+class Mentions:
+    lenders: List[str] = field(default_factory=list)
+    products: List[str] = field(default_factory=list)
+
+
+class MentionDetector:
+    """Finds lender and product mentions in a query with one automaton pass."""
+
+    def __init__(self, registry: Optional[LenderRegistry] = None):
+        registry = registry or get_registry()
+        self.automaton = AliasAutomaton()
+        for lender in registry.lenders:
+            file_only = {_alias_key(alias) for alias in lender.file_aliases}
+            proper_nouns = {_alias_key(alias) for alias in lender.proper_noun_aliases}
+            for alias in (lender.display_name, *lender.aliases, *lender.proper_noun_aliases):
+                key = _alias_key(alias)
+                if key in file_only:
+                    continue
+                self.automaton.add(alias, "lender", lender.lender_id, proper_noun=key in proper_nouns)
+        for product, phrases in registry.products.items():
+            for phrase in phrases:
+                self.automaton.add(phrase, "product", product)
+        self.automaton.build()
+
+    def detect(self, query: str) -> Mentions:
+        """Lender ids and product types mentioned in ``query``, in order of appearance."""
+        mentions = Mentions()
+        for match in self.automaton.find(query):
+            values = mentions.lenders if match.kind == "lender" else mentions.products
+            if match.value not in values:
+                values.append(match.value)
+        return mentions
+
+
+@lru_cache(maxsize=1)
+def get_detector() -> MentionDetector:
+    return MentionDetector()
+
+
+def mention_filters(query: str, catalog: Dict) -> Dict:
+    """Lender and product filters implied by a query, limited to what the catalog holds.
+
+    A mention only becomes a filter if the table has data for it, so a
+    question about a lender or product that isn't ingested yet still gets
+    an unfiltered search instead of no results.
+
+    Returns:
+        ``lender_filter``/``product_filter`` entries for the mentions found
+    """
+    mentions = get_detector().detect(query)
+    lenders = [lender for lender in mentions.lenders if lender in catalog["lenders"]]
+
+    available = set()
+    for lender in lenders or catalog["lenders"]:
+        available.update(catalog["lenders"][lender]["product_types"])
+    products = [product for product in mentions.products if product in available]
+
+    filters = {}
+    if lenders:
+        filters["lender_filter"] = lenders[0] if len(lenders) == 1 else lenders
+    # A single product type in the table would make the filter a no-op
+    if products and len(available) > 1:
+        filters["product_filter"] = products[0] if len(products) == 1 else products
+    return filters
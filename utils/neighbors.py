@@ -0,0 +1,180 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import pyarrow as pa
+
+from utils.filters import quote_literal
+from utils.token_count import count_tokens
+
+# Chunks on each side of a hit stitched into its context passage (0 = hits only)
+NEIGHBOR_WINDOW = int(os.getenv("NEIGHBOR_WINDOW", "1"))
+
+# Tokens of neighbouring text added per request, on top of the hits themselves
+NEIGHBOR_TOKEN_BUDGET = int(os.getenv("NEIGHBOR_TOKEN_BUDGET", "2000"))
+
+# Where a chunk sits in its source document; ``chunk_key`` is the indexed
+# (source_file, ordinal) pair, as LanceDB scalar indexes cover one column
+POSITION_COLUMNS = ["source_file", "ordinal", "section_id", "chunk_key"]
+
+
+def chunk_key(source_file: str, ordinal: int) -> str:
+    """Composite ``(source_file, ordinal)`` key, zero-padded so keys sort in document order."""
+    return f"{source_file}#{ordinal:06d}"
+
+
+def chunk_positions(filenames: Sequence[str], sections: Sequence[Optional[str]]) -> List[Dict]:
+    """Position columns for chunks listed in document order.
+
+    Ordinals count the chunks of each file from 0; a file's section id
+    changes whenever the chunk heading does.
+
+    Returns:
+        ``source_file``, ``ordinal``, ``section_id`` and ``chunk_key`` per chunk
+    """
+    ordinals: Dict[str, int] = {}
+    section_numbers: Dict[str, int] = {}
+    previous_sections: Dict[str, Optional[str]] = {}
+
+    positions = []
+    for filename, section in zip(filenames, sections):
+        ordinal = ordinals.get(filename, 0)
+        ordinals[filename] = ordinal + 1
+        if ordinal == 0 or section != previous_sections[filename]:
+            section_numbers[filename] = section_numbers.get(filename, -1) + 1
+        previous_sections[filename] = section
+        positions.append({
+            "source_file": filename,
+            "ordinal": ordinal,
+            "section_id": f"{filename}#s{section_numbers[filename]}",
+            "chunk_key": chunk_key(filename, ordinal),
+        })
+    return positions
+
+
+def backfill_chunk_positions(table) -> int:
+    """Adds the position columns to a table ingested before they existed.
+
+    Rows are taken to be stored in document order within each file, as the
+    pipeline writes them. The new values are written with one merge keyed
+    on a temporary per-row id, which is dropped afterwards.
+
+    Returns:
+        Number of rows positioned
+    """
+    if "chunk_key" in table.schema.names:
+        return 0
+
+    table.add_columns({"row_uuid": "uuid()"})
+    table.add_columns([
+        pa.field(column, pa.int32() if column == "ordinal" else pa.string())
+        for column in POSITION_COLUMNS if column not in table.schema.names
+    ])
+
+    scanned = (table.search().select(["row_uuid", "metadata"]).with_row_id(True)
+               .limit(max(table.count_rows(), 1)).to_arrow().sort_by("_rowid"))
+    metadata = [m or {} for m in scanned.column("metadata").to_pylist()]
+    positions = chunk_positions([m.get("filename") or "" for m in metadata],
+                                [m.get("criteria_section") for m in metadata])
+
+    updates = pa.table({
+        "row_uuid": scanned.column("row_uuid"),
+        "source_file": pa.array([p["source_file"] for p in positions], pa.string()),
+        "ordinal": pa.array([p["ordinal"] for p in positions], pa.int32()),
+        "section_id": pa.array([p["section_id"] for p in positions], pa.string()),
+        "chunk_key": pa.array([p["chunk_key"] for p in positions], pa.string()),
+    })
+    if updates.num_rows:
+        table.merge_insert("row_uuid").when_matched_update_all().execute(updates)
+    table.drop_columns(["row_uuid"])
+    return updates.num_rows
+
+
+def fetch_chunks(table, keys: Sequence[str], columns: Sequence[str]) -> List[Dict]:
+    """Rows with the given chunk keys, in one lookup on the ``chunk_key`` index."""
+    if not keys:
+        return []
+    where = f"chunk_key IN ({', '.join(quote_literal(key) for key in keys)})"
+    return table.search().where(where, prefilter=True).select(list(columns)).limit(len(keys)).to_list()
+
+
+def expand_neighbors(table, rows: List[Dict], window: int = NEIGHBOR_WINDOW,
+                     token_budget: int = NEIGHBOR_TOKEN_BUDGET, same_section: bool = True) -> List[Dict]:
+    """Stitches each hit together with up to ``window`` chunks on either side.
+
+    A criterion cut off at a chunk boundary (a table or list that carries
+    on in the next chunk) reaches the prompt whole. The neighbours of every
+    hit are fetched in one batched lookup; chunks that are hits already are
+    not fetched again, and hits next to each other become one passage.
+    Neighbours are added best hit first, nearest first (the following chunk
+    before the preceding one), until ``token_budget`` tokens of extra text
+    are used. Neighbours from another section are skipped, and so is
+    anything beyond a skipped chunk, so passages stay contiguous.
+
+    Args:
+        table: LanceDB table with the position columns
+        rows: Ranked hits, carrying ``source_file``/``ordinal``/``chunk_key``
+        window: Chunks to add on each side of a hit
+        token_budget: Maximum tokens of neighbouring text in total
+        same_section: Only add neighbours from the hit's own section
+
+    Returns:
+        One row per passage, ranked by its best hit, with that hit's metadata
+        and score, the passage text in document order and its ``_ordinals``
+    """
+    positioned = [row for row in rows if row.get("chunk_key") is not None]
+    if window <= 0 or token_budget <= 0 or not positioned:
+        return rows
+
+    members = {row["chunk_key"]: row for row in positioned}
+    wanted: Dict[str, None] = {}
+    for row in positioned:
+        for distance in range(1, window + 1):
+            for ordinal in (row["ordinal"] + distance, row["ordinal"] - distance):
+                key = chunk_key(row["source_file"], ordinal)
+                if ordinal >= 0 and key not in members:
+                    wanted[key] = None
+
+    columns = ["text", "metadata"] + POSITION_COLUMNS
+    fetched = {chunk["chunk_key"]: chunk for chunk in fetch_chunks(table, list(wanted), columns)}
+
+    remaining = token_budget
+    for row in positioned:
+        for distance in range(1, window + 1):
+            for step in (1, -1):
+                ordinal = row["ordinal"] + step * distance
+                key = chunk_key(row["source_file"], ordinal)
+                neighbor = fetched.get(key)
+                if neighbor is None or key in members:
+                    continue
+                # Only extend a passage that already reaches the chunk next to this one
+                if chunk_key(row["source_file"], ordinal - step) not in members:
+                    continue
+                if same_section and neighbor.get("section_id") != row.get("section_id"):
+                    continue
+                tokens = count_tokens(neighbor["text"])
+                if tokens > remaining:
+                    continue
+                remaining -= tokens
+                members[key] = neighbor
+
+    # Runs of consecutive ordinals per file, each led by its best-ranked hit
+    rank = {id(row): position for position, row in enumerate(rows)}
+    ordered = sorted(members.values(), key=lambda chunk: (chunk["source_file"], chunk["ordinal"]))
+    passages = []
+    for chunk in ordered:
+        previous = passages[-1] if passages else None
+        if previous and previous[-1]["source_file"] == chunk["source_file"] and previous[-1]["ordinal"] + 1 == chunk["ordinal"]:
+            previous.append(chunk)
+        else:
+            passages.append([chunk])
+
+    expanded = []
+    for passage in passages:
+        hits = [chunk for chunk in passage if id(chunk) in rank]
+        best = min(hits, key=lambda chunk: rank[id(chunk)])
+        row = dict(best)
+        row["text"] = "\n\n".join(chunk["text"] for chunk in passage)
+        row["_ordinals"] = [chunk["ordinal"] for chunk in passage]
+        expanded.append((rank[id(best)], row))
+    expanded += [(rank[id(row)], row) for row in rows if row.get("chunk_key") is None]
+    return [row for _, row in sorted(expanded, key=lambda item: item[0])]
@@ -0,0 +1,191 @@
+import importlib.util
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+# HTTP/2 multiplexes concurrent calls over a few connections; needs the h2
+# package (pip install "httpx[http2]"), HTTP/1.1 keep-alive otherwise
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"
+
+# Connections per process and client; about the chats one worker serves at once
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "50"))
+# Idle connections are kept this long, so calls a minute apart skip the TCP/TLS handshake
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+# Between bytes of a response, so a long streamed answer isn't cut off
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+OPENAI_WRITE_TIMEOUT = float(os.getenv("OPENAI_WRITE_TIMEOUT", "10"))
+# Waiting for a free connection when all OPENAI_MAX_CONNECTIONS are busy
+OPENAI_POOL_TIMEOUT = float(os.getenv("OPENAI_POOL_TIMEOUT", "10"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_lock = threading.Lock()
+_clients: Dict[str, "PooledClient"] = {}
+
+
+def http2_enabled() -> bool:
+    """HTTP/2 when asked for and the h2 package is installed."""
+    return OPENAI_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def _warn_if_http2_unavailable() -> None:
+    if OPENAI_HTTP2 and not http2_enabled() and not _clients:
+        print("⚠️ h2 is not installed - OpenAI calls use HTTP/1.1 keep-alive (pip install 'httpx[http2]')")
+
+
+def client_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                         max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                         keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY)
+
+
+def client_timeout() -> httpx.Timeout:
+    return httpx.Timeout(connect=OPENAI_CONNECT_TIMEOUT, read=OPENAI_READ_TIMEOUT,
+                         write=OPENAI_WRITE_TIMEOUT, pool=OPENAI_POOL_TIMEOUT)
+
+
+def pool_connection_counts(http_client) -> Optional[Dict]:
+    """Connections held by the client's pool and how many are idle, or None if unreadable.
+
+    httpx has no public API for this; it reads the httpcore pool behind the
+    default transport, so a change there only costs these two numbers.
+    """
+    try:
+        connections = list(http_client._transport._pool.connections)
+        return {"connections": len(connections),
+                "idle_connections": sum(1 for connection in connections if connection.is_idle())}
+    except Exception:
+        return None
+
+
+class PoolMetrics:
+    """Request and connection counts of one client, from httpcore's trace events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "connect_errors": 0}
+        self._connect_seconds = 0.0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def event(self, name: str, state: Dict) -> None:
+        """Counts one trace event; ``state`` belongs to the request it is traced for."""
+        # e.g. "connection.connect_tcp.started", "http11.send_request_headers.started"
+        step = name.partition(".")[2]
+        with self._lock:
+            if step == "connect_tcp.started":
+                state["connecting"] = time.perf_counter()
+            elif step == "connect_tcp.complete":
+                self._counters["connections_opened"] += 1
+            elif step in ("connect_tcp.failed", "start_tls.failed"):
+                self._counters["connect_errors"] += 1
+                state.pop("connecting", None)
+            elif step == "start_tls.complete":
+                self._counters["tls_handshakes"] += 1
+            elif step == "send_request_headers.started":
+                # Connection setup (TCP, TLS) ends when the first request goes out on it
+                if "connecting" in state:
+                    self._connect_seconds += time.perf_counter() - state.pop("connecting")
+                self._counters["requests"] += 1
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            elif step in ("response_closed.complete", "response_closed.failed"):
+                self.in_flight = max(self.in_flight - 1, 0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["in_flight"] = self.in_flight
+            counters["peak_in_flight"] = self.peak_in_flight
+            counters["connect_ms_total"] = round(self._connect_seconds * 1000, 1)
+            opened = counters["connections_opened"]
+            counters["requests_per_connection"] = round(counters["requests"] / opened, 1) if opened else None
+            return counters
+
+
+class PooledClient:
+    """An OpenAI client with its own tuned HTTP connection pool and pool metrics."""
+
+    def __init__(self, asynchronous: bool):
+        self.metrics = PoolMetrics()
+        self.http2 = http2_enabled()
+
+        if asynchronous:
+            async def add_trace(request):
+                state = {}
+
+                async def trace(name, info):
+                    self.metrics.event(name, state)
+
+                request.extensions["trace"] = trace
+
+            self.http_client = DefaultAsyncHttpxClient(http2=self.http2, limits=client_limits(),
+                                                       timeout=client_timeout(),
+                                                       event_hooks={"request": [add_trace]})
+            self.client = AsyncOpenAI(http_client=self.http_client, timeout=client_timeout(),
+                                      max_retries=OPENAI_MAX_RETRIES)
+        else:
+            def add_trace(request):
+                state = {}
+                request.extensions["trace"] = lambda name, info: self.metrics.event(name, state)
+
+            self.http_client = DefaultHttpxClient(http2=self.http2, limits=client_limits(),
+                                                  timeout=client_timeout(),
+                                                  event_hooks={"request": [add_trace]})
+            self.client = OpenAI(http_client=self.http_client, timeout=client_timeout(),
+                                 max_retries=OPENAI_MAX_RETRIES)
+
+    def pool_stats(self) -> Dict:
+        """Request counters, plus the connections held by the pool and how many are busy when readable."""
+        stats = self.metrics.stats()
+        stats.update({"http2": self.http2, "max_connections": OPENAI_MAX_CONNECTIONS})
+
+        counts = pool_connection_counts(self.http_client)
+        if counts is not None:
+            active = counts["connections"] - counts["idle_connections"]
+            stats.update(counts)
+            stats["active_connections"] = active
+            stats["utilization"] = round(active / OPENAI_MAX_CONNECTIONS, 3) if OPENAI_MAX_CONNECTIONS else None
+        return stats
+
+
+def _pooled(kind: str) -> PooledClient:
+    pooled = _clients.get(kind)
+    if pooled is None:
+        with _lock:
+            pooled = _clients.get(kind)
+            if pooled is None:
+                _warn_if_http2_unavailable()
+                pooled = _clients[kind] = PooledClient(asynchronous=kind == "async")
+    return pooled
+
+
+def get_openai_client() -> OpenAI:
+    """The process-wide OpenAI client; reuses its connections across calls and threads."""
+    return _pooled("sync").client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """The process-wide AsyncOpenAI client; use it from one event loop (a server's)."""
+    return _pooled("async").client
+
+
+def openai_pool_stats() -> Dict:
+    """Pool metrics of the clients created so far, keyed ``sync``/``async``."""
+    return {kind: pooled.pool_stats() for kind, pooled in list(_clients.items())}
+
+
+def _reset_after_fork() -> None:
+    # Connections of the parent's pool must not be shared with a child; it opens its own
+    global _lock
+    _lock = threading.Lock()
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,113 @@
+import gc
+import os
+import signal
+import time
+from typing import Callable, Dict, Optional
+
+import uvicorn
+
+# Seconds a supervisor waits for workers to exit after forwarding SIGTERM
+SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "30"))
+
+# A worker dying sooner than this after it started isn't restarted again and again
+MIN_WORKER_LIFETIME = 5.0
+
+
+def _run_worker(config: uvicorn.Config, sock) -> None:
+    """Child process: serve on the inherited socket until told to stop."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    status = 0
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException as e:
+        print(f"❌ Worker {os.getpid()} stopped: {e}")
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def serve_prefork(app, host: str, port: int, workers: int, preload: Optional[Callable[[], None]] = None) -> None:
+    """Serves ``app`` from ``workers`` processes forked from one preloaded parent.
+
+    The parent binds the socket and runs ``preload`` (loading snapshots,
+    catalogs and other read-only state) once, then freezes the garbage
+    collector so those objects stay in pages the workers share copy-on-write
+    instead of each worker loading and holding its own copy. Workers accept
+    on the shared socket; one that dies is replaced with a fresh fork.
+
+    State that is not fork-safe (database handles, HTTP clients, SQLite
+    connections) must not be opened by ``preload``; workers create it on
+    startup.
+
+    Args:
+        app: ASGI application
+        host: Interface to bind
+        port: Port to bind
+        workers: Number of worker processes
+        preload: Called in the parent before forking
+    """
+    config = uvicorn.Config(app, host=host, port=port, reload=False)
+    sock = config.bind_socket()
+
+    if preload is not None:
+        preload()
+    # Objects created so far are never collected, so the GC won't write to their pages
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"👥 Serving on http://{host}:{port} with {workers} workers (supervisor pid {os.getpid()})")
+
+    deadline = None
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG if stopping else 0)
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        if pid == 0:
+            if deadline is None:
+                deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+            elif time.monotonic() > deadline:
+                print(f"⚠️ Killing {len(children)} workers that did not stop in {SHUTDOWN_TIMEOUT:.0f}s")
+                for child in list(children):
+                    os.kill(child, signal.SIGKILL)
+                deadline = float("inf")
+            time.sleep(0.1)
+            continue
+
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"⚠️ Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        spawn()
+
+    sock.close()
+    print("👋 All workers stopped")
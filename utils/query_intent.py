@@ -0,0 +1,38 @@
+import re
+
+# Questions about the catalogue itself ("how many lenders do you have?")
+_LENDER_LIST_PATTERNS = [
+    r"\bhow many lenders?\b",
+    r"\blist (?:all |the |of )*lenders\b",
+    r"\blender names\b",
+    r"\bavailable lenders\b",
+    r"\blenders (?:do|can) you (?:have|cover|know|support)\b",
+    r"\b(?:what|which) lenders (?:do you|are (?:available|covered|there|included|in))\b",
+    r"^\s*(?:what|which|all|show(?: me)?(?: all)?) (?:the )?lenders\s*\??\s*$",
+    r"\bhow many lender details\b",
+    r"\bdetails do you have\b",
+]
+
+# Questions whose answer spans several lenders ("which lenders accept 85% LTV on HMOs?")
+_COMPARISON_PATTERNS = [
+    r"\b(?:which|what) lenders?\b",
+    r"\bany lenders?\b",
+    r"\blenders? (?:that|who|which|will|would|can|accepting|allowing|offering)\b",
+    r"\bcompare\b",
+    r"\bcomparison\b",
+    r"\bacross (?:all |the )?lenders\b",
+    r"\b(?:best|most lenient|strictest) lenders?\b",
+]
+
+_LENDER_LIST_REGEX = re.compile("|".join(_LENDER_LIST_PATTERNS), re.IGNORECASE)
+_COMPARISON_REGEX = re.compile("|".join(_COMPARISON_PATTERNS), re.IGNORECASE)
+
+
+def is_lender_list_query(query: str) -> bool:
+    """True when the user asks which lenders are in the database, not about their criteria."""
+    return bool(_LENDER_LIST_REGEX.search(query))
+
+
+def is_comparison_query(query: str) -> bool:
+    """True when the answer should cover several lenders rather than the single best matches."""
+    return not is_lender_list_query(query) and bool(_COMPARISON_REGEX.search(query))
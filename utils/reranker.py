@@ -0,0 +1,160 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from utils.embedding_cache import normalize_query
+from utils.hybrid_search import row_key
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Candidates retrieved for reranking, and how many survive it
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+
+# Time budget for scoring one query; past it the retrieval order is used
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "200"))
+
+RERANK_BATCH_SIZE = 16
+RERANK_CACHE_ENTRIES = 20_000
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a small local cross-encoder on CPU.
+
+    Uncached pairs are scored in batches, each no larger than the measured
+    scoring speed fits in the time left. A running batch can't be
+    interrupted, so the deadline is checked again after it; if the budget
+    runs out, ``rerank`` returns None and the caller keeps the retrieval
+    order. A slower batch than measured can still overrun the budget by
+    its own duration. Scores are cached per (query, chunk), so a retried
+    or repeated question only scores the chunks it hasn't seen yet.
+
+    Requires ``sentence-transformers``; without it ``available`` is False.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, budget_ms: float = RERANK_BUDGET_MS,
+                 batch_size: int = RERANK_BATCH_SIZE, cache_entries: int = RERANK_CACHE_ENTRIES):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+
+        self._model = None
+        self._load_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        # Moving average of the scoring time per pair, None until measured
+        self._seconds_per_pair: Optional[float] = None
+        self._counters = {"reranked": 0, "timeouts": 0, "pairs_scored": 0, "cache_hits": 0, "errors": 0}
+
+    def _load(self):
+        with self._lock:
+            if self._model is None and self._load_error is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu", max_length=512)
+                except Exception as e:
+                    self._load_error = str(e)
+            return self._model
+
+    @property
+    def available(self) -> bool:
+        return self._load() is not None
+
+    def warm_up(self) -> bool:
+        """Loads the model and runs one pair, so the first request doesn't pay for it."""
+        model = self._load()
+        if model is None:
+            print(f"⚠️ Reranker unavailable ({self._load_error}) - using retrieval order")
+            return False
+        started = time.perf_counter()
+        model.predict([("warm up", "warm up")], batch_size=1, show_progress_bar=False)
+        self._measure(time.perf_counter() - started, 1)
+        return True
+
+    def _key(self, query: str, row: Dict) -> str:
+        return hashlib.sha1(f"{self.model_name}\x00{normalize_query(query)}\x00{row_key(row)}".encode("utf-8")).hexdigest()
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _measure(self, seconds: float, pairs: int) -> None:
+        per_pair = seconds / pairs
+        with self._lock:
+            previous = self._seconds_per_pair
+            self._seconds_per_pair = per_pair if previous is None else 0.7 * previous + 0.3 * per_pair
+
+    def rerank(self, query: str, rows: List[Dict], top_n: int = RERANK_TOP_N,
+               budget_ms: Optional[float] = None) -> Optional[List[Dict]]:
+        """Best ``top_n`` rows by cross-encoder score.
+
+        Returns:
+            Rows with a ``_rerank_score`` field, best first, or None when the
+            model is unavailable, fails, or the time budget runs out
+        """
+        if not rows:
+            return rows
+        model = self._load()
+        if model is None:
+            return None
+
+        deadline = time.perf_counter() + (self.budget_ms if budget_ms is None else budget_ms) / 1000
+        keys = [self._key(query, row) for row in rows]
+
+        with self._lock:
+            scores = {key: self._cache[key] for key in keys if key in self._cache}
+            for key in scores:
+                self._cache.move_to_end(key)
+        self._count("cache_hits", len(scores))
+
+        pending = [i for i, key in enumerate(keys) if key not in scores]
+        while pending:
+            remaining = deadline - time.perf_counter()
+            # Only start as many pairs as the measured speed can score in the time left
+            size = self.batch_size
+            if self._seconds_per_pair:
+                size = min(size, int(remaining / self._seconds_per_pair))
+            if remaining <= 0 or size < 1:
+                self._count("timeouts")
+                return None
+
+            batch, pending = pending[:size], pending[size:]
+            started = time.perf_counter()
+            try:
+                batch_scores = model.predict([(query, rows[i]["text"]) for i in batch],
+                                             batch_size=len(batch), show_progress_bar=False)
+            except Exception as e:
+                print(f"Rerank error: {str(e)}")
+                self._count("errors")
+                return None
+            self._measure(time.perf_counter() - started, len(batch))
+
+            with self._lock:
+                for i, score in zip(batch, batch_scores):
+                    scores[keys[i]] = float(score)
+                    self._cache[keys[i]] = float(score)
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+            self._count("pairs_scored", len(batch))
+
+            # A batch that ran past the deadline is too late to use, but its scores stay cached
+            if time.perf_counter() > deadline:
+                self._count("timeouts")
+                return None
+
+        self._count("reranked")
+        order = sorted(range(len(rows)), key=lambda i: scores[keys[i]], reverse=True)[:top_n]
+        return [{**rows[i], "_rerank_score": scores[keys[i]]} for i in order]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["cache_entries"] = len(self._cache)
+        counters["model"] = self.model_name
+        counters["loaded"] = self._model is not None
+        return counters
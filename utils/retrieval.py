@@ -0,0 +1,160 @@
+import os
+from typing import Callable, Dict, List, Optional
+
+from utils.diversify import MMR_CANDIDATE_FACTOR, diversify, drop_near_duplicates
+from utils.filters import build_filter, compile_filter
+from utils.grouped_search import DEFAULT_PER_LENDER_K, grouped_search
+from utils.hot_reload import ServingState
+from utils.hybrid_search import hybrid_search
+from utils.lender_registry import lender_filter_values
+from utils.lender_router import LENDER_ROUTING, LenderRouter
+from utils.reranker import RERANK_CANDIDATES, RERANK_TOP_N
+from utils.vector_index import load_search_params
+from utils.vector_snapshot import InMemoryVectorEngine
+
+# Query-time ANN parameters tuned by build_indexes.py
+SEARCH_PARAMS = load_search_params()
+
+# vector | lexical | hybrid | auto (see utils/hybrid_search.py)
+DEFAULT_SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+
+# Collapse near-duplicate chunks and pick the rest by MMR (see utils/diversify.py)
+DIVERSIFY_RESULTS = os.getenv("DIVERSIFY_RESULTS", "true").lower() == "true"
+
+# lancedb | numpy - numpy serves vector-mode queries from the memory-mapped
+# snapshot exported by build_indexes.py
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "lancedb")
+
+# The serving state only reads the snapshot for the numpy engine or lender routing
+USES_SNAPSHOT = SEARCH_ENGINE == "numpy" or LENDER_ROUTING
+
+
+def load_vector_engine(path: Optional[str]):
+    """The snapshot's in-memory engine when the numpy engine is enabled, else None."""
+    if SEARCH_ENGINE != "numpy":
+        return None
+    if path is None:
+        print("⚠️ No vector snapshot found - run build_indexes.py; using LanceDB")
+        return None
+    try:
+        vector_engine = InMemoryVectorEngine(path)
+        print(f"✅ In-memory engine loaded: {len(vector_engine.rows)} rows (table v{vector_engine.table_version})")
+        return vector_engine
+    except Exception as e:
+        print(f"⚠️ Could not load vector snapshot, using LanceDB: {str(e)}")
+        return None
+
+
+def load_lender_router(path: Optional[str], vector_engine):
+    """The snapshot's centroid router when lender routing is enabled, else None."""
+    if not LENDER_ROUTING:
+        return None
+    if vector_engine is not None:
+        return vector_engine.router
+    try:
+        return LenderRouter.load(path) if path else None
+    except Exception as e:
+        print(f"⚠️ Could not load lender centroids, searching all lenders: {str(e)}")
+        return None
+
+
+def route_lenders(state: ServingState, query_vector, use_engine: bool) -> Optional[List[str]]:
+    """Coarse stage: the lenders worth scoring for an unfiltered query, or None to score all of them."""
+    lender_router = state.lender_router
+    if lender_router is None or lender_router.table_version != state.version:
+        return None
+    # LanceDB can only be prefiltered on the column the centroids are keyed by
+    if not use_engine and state.filter_columns.get("lender") != lender_router.lender_column:
+        return None
+    return lender_router.route(query_vector)
+
+
+def search_lender_criteria(state: ServingState, query: str, embed_query: Callable[[str], List[float]],
+                           num_results: int = 15, lender_filter=None, search_mode: str = DEFAULT_SEARCH_MODE,
+                           product_filter=None, section_filter=None, group_by_lender: bool = False,
+                           per_lender_k: int = DEFAULT_PER_LENDER_K, max_lenders: Optional[int] = None,
+                           mmr_lambda: Optional[float] = None, rerank: bool = False, reranker=None,
+                           search_params: Optional[Dict] = None) -> List[Dict]:
+    """Retrieval shared by both backends: filter, route, search, then rerank or diversify.
+
+    Args:
+        state: Table version (and its snapshot) to search
+        query: User question
+        embed_query: Returns the query embedding, ideally from a cache
+        num_results: Rows returned, unless grouped by lender
+        lender_filter, product_filter, section_filter: Values to filter on, or None
+        search_mode: vector, lexical, hybrid or auto
+        group_by_lender: Best ``per_lender_k`` rows of up to ``max_lenders`` lenders
+        mmr_lambda: Relevance/diversity trade-off; None = MMR_LAMBDA
+        rerank: Narrow a wider pool with ``reranker``
+        reranker: CrossEncoderReranker, or None to never rerank
+        search_params: ANN parameters; None = SEARCH_PARAMS
+
+    Returns:
+        Ranked rows without their vectors, or [] if the search failed
+    """
+    table, filter_columns, vector_engine = state.table, state.filter_columns, state.vector_engine
+    search_params = SEARCH_PARAMS if search_params is None else search_params
+
+    try:
+        # Filter by lender(s), product and section, or search across everything;
+        # values are escaped by the compiler, never interpolated
+        lender_filter = lender_filter_values(lender_filter, filter_columns)
+        where = compile_filter(build_filter(lender_filter, product_filter, section_filter), filter_columns)
+
+        # Reranking mixes lenders, so grouped results keep their per-lender order
+        rerank = rerank and reranker is not None and not group_by_lender
+
+        if group_by_lender:
+            # Best chunks of every lender from one pass, so verbose lenders can't crowd out the rest
+            rows = grouped_search(table, query, embed_query, per_lender_k, max_lenders, where=where,
+                                  mode=search_mode, vector_engine=vector_engine,
+                                  filters={"lender": lender_filter, "product": product_filter, "section": section_filter},
+                                  search_params=search_params, columns=state.result_columns)
+        else:
+            # Over-fetch so that dropping duplicates (or reranking) still leaves enough distinct chunks
+            candidates = num_results * MMR_CANDIDATE_FACTOR if DIVERSIFY_RESULTS else num_results
+            if rerank:
+                candidates = max(candidates, RERANK_CANDIDATES)
+            # Vectors are only fetched when MMR needs them
+            columns = state.result_columns + ["embedding"] if DIVERSIFY_RESULTS and not rerank else state.result_columns
+            use_engine = search_mode == "vector" and vector_engine is not None and vector_engine.table_version == state.version
+            search_lenders, search_where = lender_filter, where
+            if search_mode == "vector" and lender_filter is None:
+                # Only score the lenders whose centroids are close to the query; flat scores search everything
+                routed = route_lenders(state, embed_query(query), use_engine)
+                if routed:
+                    search_lenders = routed
+                    search_where = compile_filter(build_filter(routed, product_filter, section_filter), filter_columns)
+            if use_engine:
+                # Exact search over the in-memory snapshot, same rows as LanceDB
+                rows = vector_engine.search(embed_query(query), candidates, search_lenders, product_filter, section_filter)
+            else:
+                # Vector, BM25 or fused retrieval; lexical mode skips the embedding call
+                rows = hybrid_search(table, query, embed_query, candidates, where=search_where,
+                                     mode=search_mode, search_params=search_params, columns=columns)
+
+        reranked = None
+        if rerank:
+            # Falls back to the retrieval order below if the time budget runs out
+            reranked = reranker.rerank(query, drop_near_duplicates(rows, vector_engine=vector_engine),
+                                       min(RERANK_TOP_N, num_results))
+
+        if reranked is not None:
+            rows = reranked
+        elif group_by_lender:
+            if DIVERSIFY_RESULTS:
+                rows = drop_near_duplicates(rows, vector_engine=vector_engine)
+        elif DIVERSIFY_RESULTS:
+            # Vector relevance comes from the query embedding (a cache hit); fused and BM25 rows keep their own scores
+            query_vector = embed_query(query) if search_mode == "vector" else None
+            kwargs = {"mmr_lambda": mmr_lambda} if mmr_lambda is not None else {}
+            rows = diversify(rows, num_results, query_vector, vector_engine=vector_engine, **kwargs)
+        else:
+            rows = rows[:num_results]
+
+        # Rows are already ranked; drop vectors so they aren't serialized into responses
+        return [{key: value for key, value in row.items() if key != "embedding"} for row in rows]
+    except Exception as e:
+        print(f"Search error: {str(e)}")
+        return []
@@ -0,0 +1,117 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class _Broadcast:
+    """Events of one in-flight stream, replayed to every subscriber from the start."""
+
+    def __init__(self):
+        self.events: List = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, event) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def finish(self) -> None:
+        self.finished = True
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls into one execution.
+
+    The first call for a key runs; calls with the same key arriving while it
+    is in flight wait for it and get the same result (or exception) instead
+    of running again. Streams are shared the same way: later subscribers are
+    replayed the events so far, then follow the live stream, and all of them
+    get the error if the stream fails. Keys are forgotten as soon as their
+    call finishes, so nothing is cached here.
+
+    The shared call runs as its own task: a caller that goes away doesn't
+    cancel it for the others. A shared stream is cancelled once its last
+    subscriber leaves, so an abandoned answer stops being generated.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._counters = {"executions": 0, "coalesced": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        """Result of ``fn()``, shared with concurrent calls for ``key``."""
+        task = self._calls.get(key)
+        if task is None:
+            self._counters["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget_call(key, done))
+        else:
+            self._counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _forget_call(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieved here, so an error nobody is waiting for anymore isn't logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: str, events: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Items of ``events()``, shared with concurrent subscribers for ``key``."""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self._counters["executions"] += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, events))
+        else:
+            self._counters["coalesced"] += 1
+
+        broadcast.subscribers += 1
+        try:
+            position = 0
+            while True:
+                if position < len(broadcast.events):
+                    position += 1
+                    yield broadcast.events[position - 1]
+                elif broadcast.finished:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    await broadcast.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.finished:
+                # A request arriving now starts afresh instead of joining a cancelled stream
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+                broadcast.task.cancel()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, events: Callable[[], AsyncIterator]) -> None:
+        try:
+            async for event in events():
+                broadcast.publish(event)
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            broadcast.finish()
+
+    def stats(self) -> Dict:
+        counters = dict(self._counters)
+        counters["in_flight"] = len(self._calls) + len(self._streams)
+        return counters
@@ -0,0 +1,49 @@
+import threading
+from typing import Dict, Optional
+
+import tiktoken
+
+# Encoding of the OpenAI embedding and chat models
+DEFAULT_ENCODING = "cl100k_base"
+
+# Characters per token assumed when the encoding can't be loaded
+FALLBACK_CHARS_PER_TOKEN = 4
+
+_encodings: Dict[str, Optional[tiktoken.Encoding]] = {}
+_encodings_lock = threading.Lock()
+
+
+def _get_encoding(name: str) -> Optional[tiktoken.Encoding]:
+    """The tiktoken encoding, or None if it can't be loaded.
+
+    tiktoken downloads the BPE file on first use, so this fails offline
+    unless it is cached (``TIKTOKEN_CACHE_DIR``). A failure is remembered,
+    so the download isn't retried on every call or by concurrent callers.
+    """
+    if name not in _encodings:
+        with _encodings_lock:
+            if name not in _encodings:
+                try:
+                    _encodings[name] = tiktoken.get_encoding(name)
+                except Exception as e:
+                    print(f"⚠️ Could not load the {name} tokenizer, estimating "
+                          f"{FALLBACK_CHARS_PER_TOKEN} characters per token: {str(e)}")
+                    _encodings[name] = None
+    return _encodings[name]
+
+
+def count_tokens(text: str, model_name: str = DEFAULT_ENCODING) -> int:
+    """Counts tokens exactly as the OpenAI endpoints will, or estimates them.
+
+    Args:
+        text: The text to tokenize
+        model_name: The name of the OpenAI encoding to use
+
+    Returns:
+        Number of tokens in ``text``; ``len(text) // 4`` when the encoding
+        is unavailable
+    """
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import random
+import time
+from typing import Dict, List, Optional, Sequence
+
+SEARCH_PARAMS_PATH = "data/vector_index.json"
+INDEX_TYPES = ("IVF_PQ", "IVF_HNSW_SQ", "IVF_HNSW_PQ")
+
+# PQ codebooks train 256 centroids per sub-vector, so smaller tables can't be
+# indexed; below this size brute force is also faster than an index anyway
+MIN_ROWS_FOR_INDEX = 512
+
+DEFAULT_SEARCH_PARAMS = {"nprobes": 20, "refine_factor": 10}
+
+# Candidate list size of the HNSW graph search; IVF_HNSW_* indexes only
+DEFAULT_HNSW_EF = 64
+
+
+def is_hnsw(index_type: Optional[str]) -> bool:
+    return bool(index_type) and index_type.startswith("IVF_HNSW")
+
+
+def choose_index_params(num_rows: int, dim: int, index_type: str = "IVF_PQ") -> Dict:
+    """Chooses partition and sub-vector counts from the corpus size.
+
+    Args:
+        num_rows: Number of vectors in the table
+        dim: Vector dimensionality
+        index_type: One of ``INDEX_TYPES``
+
+    Returns:
+        Keyword arguments for ``LanceTable.create_index``
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+    if is_hnsw(index_type):
+        # The HNSW graph does the fine search, so partitions only need to keep
+        # each graph to a manageable size
+        num_partitions = max(1, num_rows // 100_000)
+    else:
+        # ~sqrt(N) partitions keeps both centroid and partition scans small
+        num_partitions = max(1, min(int(round(math.sqrt(num_rows))), num_rows // 256 or 1))
+
+    params = {"index_type": index_type, "num_partitions": num_partitions}
+
+    if index_type.endswith("PQ"):
+        # 16 dimensions per sub-vector where possible (1536 -> 96, 3072 -> 192)
+        for width in (16, 8, 4, 2, 1):
+            if dim % width == 0:
+                params["num_sub_vectors"] = dim // width
+                break
+
+    return params
+
+
+def default_search_params(index_params: Dict) -> Dict:
+    """Starting nprobes/refine_factor (and ef for HNSW) for a freshly built index."""
+    num_partitions = index_params.get("num_partitions", 1)
+    index_type = index_params.get("index_type")
+    return {
+        "index_type": index_type,
+        "nprobes": max(1, min(num_partitions, int(math.ceil(num_partitions * 0.1)) + 10)),
+        "refine_factor": 10 if (index_type or "").endswith("PQ") else None,
+        "ef": DEFAULT_HNSW_EF if is_hnsw(index_type) else None,
+    }
+
+
+def load_index_config(path: str = SEARCH_PARAMS_PATH) -> Dict:
+    """Loads the index/search configuration written by ``build_indexes.py``."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_search_params(path: str = SEARCH_PARAMS_PATH) -> Dict:
+    """Loads the tuned query-time parameters, falling back to the defaults."""
+    config = load_index_config(path)
+    params = dict(DEFAULT_SEARCH_PARAMS)
+    params.update(config.get("search_params", {}))
+    # Configs saved before the index type was recorded with the search parameters
+    params.setdefault("index_type", (config.get("index_params") or {}).get("index_type"))
+    return params
+
+
+def save_index_config(index_params: Dict, search_params: Dict, num_rows: int,
+                      path: str = SEARCH_PARAMS_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"index_params": index_params, "search_params": search_params,
+                   "num_rows": num_rows}, f, indent=2)
+
+
+def apply_search_params(query, params: Optional[Dict] = None):
+    """Applies ANN query-time parameters to a LanceDB vector query.
+
+    Only the parameters of the index type in ``params["index_type"]`` are
+    set: ``ef`` belongs to IVF_HNSW_* indexes and is left out for IVF_PQ.
+    The parameters are ignored by LanceDB when the table has no vector
+    index, so this is safe to call on every search.
+    """
+    params = params or DEFAULT_SEARCH_PARAMS
+    if params.get("nprobes"):
+        query = query.nprobes(params["nprobes"])
+    if params.get("refine_factor"):
+        query = query.refine_factor(params["refine_factor"])
+    if params.get("ef") and is_hnsw(params.get("index_type")):
+        query = query.ef(params["ef"])
+    return query
+
+
+def build_vector_index(table, vector_column: str = "embedding", index_type: str = "IVF_PQ",
+                       metric: str = "l2") -> Optional[Dict]:
+    """Builds (or replaces) the ANN index on ``vector_column``.
+
+    Args:
+        table: LanceDB table
+        vector_column: Name of the vector column
+        index_type: One of ``INDEX_TYPES``
+        metric: Distance metric; must match the metric used at query time
+
+    Returns:
+        The index parameters used, or None if the table is too small to index
+    """
+    num_rows = table.count_rows()
+    if num_rows < MIN_ROWS_FOR_INDEX:
+        return None
+
+    dim = table.schema.field(vector_column).type.list_size
+    params = choose_index_params(num_rows, dim, index_type)
+    table.create_index(metric=metric, vector_column_name=vector_column, replace=True, **params)
+    return params
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(math.ceil(pct / 100 * len(ordered))) - 1)
+    return ordered[max(0, index)]
+
+
+def sample_query_vectors(table, vector_column: str, num_queries: int, seed: int = 0) -> List[List[float]]:
+    """Samples stored vectors to use as benchmark queries (no embedding calls)."""
+    vectors = (
+        table.search().select([vector_column]).limit(table.count_rows()).to_arrow()
+        .column(vector_column).to_pylist()
+    )
+    random.Random(seed).shuffle(vectors)
+    return vectors[:num_queries]
+
+
+def tune_vector_index(table, vector_column: str = "embedding", k: int = 10, num_queries: int = 100,
+                      nprobes_values: Sequence[int] = (5, 10, 20, 40, 80),
+                      refine_values: Sequence[Optional[int]] = (None, 5, 10, 25),
+                      num_partitions: Optional[int] = None) -> List[Dict]:
+    """Sweeps nprobes/refine_factor and reports recall@k against exact search.
+
+    Args:
+        table: Indexed LanceDB table
+        vector_column: Name of the vector column
+        k: Number of neighbours compared per query
+        num_queries: Number of sampled query vectors
+        nprobes_values: Partition probe counts to try
+        refine_values: Refine factors to try (None disables re-ranking)
+        num_partitions: Partitions of the index; larger probe counts are
+            capped to it, as probing more partitions than exist adds nothing
+
+    Returns:
+        One result dict per setting (plus the exact baseline) with recall@k and
+        p50/p99 latency in milliseconds
+    """
+    if num_partitions:
+        nprobes_values = sorted({min(nprobes, num_partitions) for nprobes in nprobes_values})
+    queries = sample_query_vectors(table, vector_column, num_queries)
+
+    def run(query_fn):
+        latencies, results = [], []
+        for vector in queries:
+            start = time.perf_counter()
+            rows = query_fn(table.search(vector, vector_column_name=vector_column).limit(k)
+                            .with_row_id(True).select([])).to_arrow()
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(set(rows.column("_rowid").to_pylist()))
+        return latencies, results
+
+    exact_latencies, exact_results = run(lambda q: q.bypass_vector_index())
+    report = [{
+        "nprobes": None, "refine_factor": None, "recall": 1.0,
+        "p50_ms": _percentile(exact_latencies, 50), "p99_ms": _percentile(exact_latencies, 99),
+    }]
+
+    for nprobes in nprobes_values:
+        for refine_factor in refine_values:
+            params = {"nprobes": nprobes, "refine_factor": refine_factor}
+            latencies, results = run(lambda q: apply_search_params(q, params))
+            recall = sum(len(a & e) / max(1, len(e)) for a, e in zip(results, exact_results)) / len(queries)
+            report.append({
+                **params, "recall": recall,
+                "p50_ms": _percentile(latencies, 50), "p99_ms": _percentile(latencies, 99),
+            })
+
+    return report
+
+
+def pick_search_params(report: List[Dict], target_recall: float = 0.95) -> Dict:
+    """Fastest (by p99) setting from a tuning report that meets ``target_recall``."""
+    candidates = [r for r in report if r["nprobes"] is not None and r["recall"] >= target_recall]
+    if not candidates:
+        candidates = [max((r for r in report if r["nprobes"] is not None), key=lambda r: r["recall"])]
+    best = min(candidates, key=lambda r: r["p99_ms"])
+    return {"nprobes": best["nprobes"], "refine_factor": best["refine_factor"]}
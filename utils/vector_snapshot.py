@@ -0,0 +1,348 @@
+import json
+import mmap
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.lender_router import LenderRouter, build_centroids
+from utils.neighbors import POSITION_COLUMNS
+
+DEFAULT_SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", "data/snapshot")
+CURRENT_POINTER = "CURRENT"
+
+# Older snapshots kept next to the current one, for workers still mapping them
+KEEP_SNAPSHOTS = 2
+
+FilterArg = Union[str, Sequence[str], None]
+
+
+def _write_json(path: str, data) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_rows(path: str, rows: List[Dict]) -> None:
+    """Rows as JSON lines plus their byte offsets, for ``SnapshotRows``."""
+    offsets = [0]
+    with open(os.path.join(path, "rows.jsonl"), "wb") as f:
+        for row in rows:
+            line = json.dumps(row).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(path, "row_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+
+class SnapshotRows:
+    """Snapshot rows, decoded from a memory-mapped file when accessed.
+
+    A process holds no Python objects for the rows, only the mapping, so
+    workers forked from one parent (or any processes serving the same
+    snapshot) share them through the page cache instead of each keeping
+    its own copy.
+    """
+
+    def __init__(self, path: str):
+        self.offsets = np.load(os.path.join(path, "row_offsets.npy"), mmap_mode="r")
+        self._data = b""
+        if len(self.offsets) > 1 and self.offsets[-1] > 0:
+            with open(os.path.join(path, "rows.jsonl"), "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> Dict:
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return json.loads(self._data[int(self.offsets[position]):int(self.offsets[position + 1])])
+
+
+def _column_values(arrow_table, column: str, fallback: Optional[str] = None) -> List:
+    """Values of a top-level column, or of the same field inside ``metadata``."""
+    if column in arrow_table.column_names:
+        return arrow_table.column(column).to_pylist()
+    if "metadata" in arrow_table.column_names:
+        return [(m or {}).get(fallback or column) for m in arrow_table.column("metadata").to_pylist()]
+    return [None] * arrow_table.num_rows
+
+
+def export_snapshot(table, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, vector_column: str = "embedding",
+                    dtype: str = "float32") -> Dict:
+    """Exports the table's vectors and rows as a memory-mappable snapshot.
+
+    Rows are ordered by lender so each lender occupies one contiguous row
+    range of the matrix, keyed by ``lender_id`` (or the stored lender name
+    for tables without one). The snapshot is written to its own versioned
+    directory and published by atomically replacing the ``CURRENT`` pointer,
+    so readers never see a half-written snapshot.
+
+    Args:
+        table: LanceDB table
+        snapshot_dir: Directory holding the snapshots
+        vector_column: Name of the vector column
+        dtype: ``float32`` or ``float16`` storage for the matrix
+
+    Returns:
+        The snapshot manifest
+    """
+    version = table.version
+    arrow_table = table.to_arrow()
+
+    lender_column = "lender_id" if "lender_id" in arrow_table.column_names else "lender_name"
+    lenders = _column_values(arrow_table, lender_column)
+    order = sorted(range(arrow_table.num_rows), key=lambda i: (lenders[i] or "", i))
+    arrow_table = arrow_table.take(order)
+
+    vectors = np.asarray(arrow_table.column(vector_column).to_pylist(), dtype=np.float32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(len(order), -1)
+
+    lenders = _column_values(arrow_table, lender_column)
+    lender_ranges: Dict[str, List[int]] = {}
+    for position, lender in enumerate(lenders):
+        lender_ranges.setdefault(lender or "", [position, position])[1] = position + 1
+
+    rows = [
+        {"text": text, "metadata": metadata}
+        for text, metadata in zip(arrow_table.column("text").to_pylist(), _column_values(arrow_table, "metadata"))
+    ]
+    # Document positions, so engine hits can be expanded to their neighbours
+    for column in POSITION_COLUMNS:
+        if column in arrow_table.column_names:
+            for row, value in zip(rows, arrow_table.column(column).to_pylist()):
+                row[column] = value
+
+    name = f"v{version}-{int(time.time())}"
+    path = os.path.join(snapshot_dir, name)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "vectors.npy"), vectors.astype(dtype))
+    # Squared norms in float32 for the ||x||² - 2x·q + ||q||² expansion
+    np.save(os.path.join(path, "norms.npy"), np.einsum("ij,ij->i", vectors, vectors))
+    _write_rows(path, rows)
+    sections = _column_values(arrow_table, "criteria_section")
+    _write_json(os.path.join(path, "attributes.json"), {
+        "product_type": _column_values(arrow_table, "product_type"),
+        "criteria_section": sections,
+    })
+    # Lender and section centroids for coarse-to-fine routing
+    centroids, centroid_lenders = build_centroids(vectors, lenders, sections)
+    np.save(os.path.join(path, "centroids.npy"), centroids)
+
+    manifest = {
+        "table_version": version,
+        "vector_column": vector_column,
+        "dtype": dtype,
+        "num_rows": len(rows),
+        "dim": int(vectors.shape[1]) if len(rows) else 0,
+        "metric": "l2",
+        "lender_ranges": lender_ranges,
+        "lender_column": lender_column,
+        "centroid_lenders": centroid_lenders,
+        "created_at": time.time(),
+    }
+    _write_json(os.path.join(path, "manifest.json"), manifest)
+    _write_json(os.path.join(snapshot_dir, CURRENT_POINTER), {"name": name})
+
+    prune_snapshots(snapshot_dir, keep=KEEP_SNAPSHOTS)
+    return manifest
+
+
+def current_snapshot_path(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_POINTER), "r", encoding="utf-8") as f:
+            return os.path.join(snapshot_dir, json.load(f)["name"])
+    except (FileNotFoundError, KeyError, json.JSONDecodeError):
+        return None
+
+
+def prune_snapshots(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, keep: int = KEEP_SNAPSHOTS) -> None:
+    """Deletes all but the newest ``keep`` snapshots (never the current one)."""
+    current = current_snapshot_path(snapshot_dir)
+    snapshots = sorted(
+        (os.path.join(snapshot_dir, name) for name in os.listdir(snapshot_dir) if name.startswith("v")),
+        key=os.path.getmtime, reverse=True,
+    )
+    for path in snapshots[keep:]:
+        if path != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class InMemoryVectorEngine:
+    """Exact nearest-neighbour search over a memory-mapped vector snapshot.
+
+    A query is one matrix-vector product over the relevant rows followed by
+    an ``argpartition`` top-k, with no LanceDB or pandas in the path. Lender
+    filters restrict scoring to that lender's contiguous row range; product
+    and section filters mask the remaining rows. Distances are squared L2,
+    matching LanceDB's ``_distance``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if os.path.exists(os.path.join(path, "rows.jsonl")):
+            self.rows = SnapshotRows(path)
+        else:
+            # Snapshots exported before rows were memory-mapped
+            with open(os.path.join(path, "rows.json"), "r", encoding="utf-8") as f:
+                self.rows = json.load(f)
+        with open(os.path.join(path, "attributes.json"), "r", encoding="utf-8") as f:
+            attributes = json.load(f)
+
+        # The OS page cache backs the matrix, so processes mapping the same file share it
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        # Fixed-width string arrays rather than object arrays: one buffer, no
+        # per-item refcounts for forked workers to copy pages on
+        self.product_types = np.asarray([value or "" for value in attributes["product_type"]], dtype=str)
+        self.sections = np.asarray([value or "" for value in attributes["criteria_section"]], dtype=str)
+        self.lender_ranges: Dict[str, Tuple[int, int]] = {
+            lender: tuple(bounds) for lender, bounds in self.manifest["lender_ranges"].items()
+        }
+        self.router = LenderRouter.load(path)
+
+    @classmethod
+    def load(cls, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> Optional["InMemoryVectorEngine"]:
+        """Loads the current snapshot, or returns None if none was exported."""
+        path = current_snapshot_path(snapshot_dir)
+        return cls(path) if path else None
+
+    @property
+    def table_version(self) -> int:
+        return self.manifest["table_version"]
+
+    def _candidate_rows(self, lender: FilterArg, product: FilterArg, section: FilterArg) -> Optional[np.ndarray]:
+        """Row positions passing the filters, or None for all rows."""
+        if lender is None and product is None and section is None:
+            return None
+
+        if lender is not None:
+            lenders = [lender] if isinstance(lender, str) else list(lender)
+            ranges = [self.lender_ranges[name] for name in lenders if name in self.lender_ranges]
+            positions = np.concatenate([np.arange(start, stop) for start, stop in ranges]) if ranges else np.empty(0, dtype=np.int64)
+        else:
+            positions = np.arange(len(self.rows))
+
+        for values, wanted in ((self.product_types, product), (self.sections, section)):
+            if wanted is not None and len(positions):
+                wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+                positions = positions[np.isin(values[positions], wanted)]
+        return positions
+
+    def _top_k(self, distances: np.ndarray, limit: int, positions: Optional[np.ndarray] = None,
+               offset: int = 0) -> List[Dict]:
+        """Rows of the ``limit`` smallest distances; ``positions`` (or ``offset``) map back to snapshot rows."""
+        if not len(distances):
+            return []
+        k = min(limit, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        # Rows tied with the k-th distance all compete, so ties go to the earliest row
+        top = np.union1d(top, np.flatnonzero(distances == distances[top].max()))
+        top = top[np.lexsort((top, distances[top]))][:k]
+        results = []
+        for index in top:
+            position = offset + int(index) if positions is None else int(positions[index])
+            results.append({**self.rows[position], "_distance": float(max(distances[index], 0.0)),
+                            "_snapshot_row": position})
+        return results
+
+    def search_many(self, vectors: Sequence[Sequence[float]], limits: Sequence[int],
+                    filters: Optional[Sequence[Dict]] = None) -> List[List[Dict]]:
+        """Scores a batch of queries with one matrix-matrix product.
+
+        Args:
+            vectors: Query embeddings
+            limits: Number of rows to return per query
+            filters: Per-query ``{"lender", "product", "section"}`` filters
+
+        Returns:
+            One result list per query, nearest first
+        """
+        queries = np.asarray(vectors, dtype=np.float32)
+        if not len(queries) or not len(self.rows):
+            return [[] for _ in range(len(queries))]
+
+        # (queries × rows) squared distances in a single GEMM
+        products = (queries.astype(self.vectors.dtype) @ np.asarray(self.vectors).T).astype(np.float32)
+        distances = self.norms[None, :] - 2.0 * products + np.einsum("ij,ij->i", queries, queries)[:, None]
+
+        results = []
+        for i, limit in enumerate(limits):
+            query_filters = (filters[i] if filters else None) or {}
+            positions = self._candidate_rows(query_filters.get("lender"), query_filters.get("product"),
+                                             query_filters.get("section"))
+            if positions is None:
+                results.append(self._top_k(distances[i], limit))
+            else:
+                results.append(self._top_k(distances[i, positions], limit, positions))
+        return results
+
+    def search_grouped(self, vector: Sequence[float], per_lender_k: int = 2, max_lenders: Optional[int] = None,
+                       lender: FilterArg = None, product: FilterArg = None,
+                       section: FilterArg = None) -> List[Dict]:
+        """Exact top-``per_lender_k`` rows of every lender from one scoring pass.
+
+        Returns:
+            Rows grouped by lender, lenders ordered by their nearest row, each
+            with a ``_lender_rank`` field
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        distances = self.norms - 2.0 * (self.vectors @ query.astype(self.vectors.dtype)).astype(np.float32) + float(query @ query)
+
+        allowed = self._candidate_rows(lender, product, section)
+        if allowed is not None:
+            mask = np.full(len(distances), np.inf, dtype=np.float32)
+            mask[allowed] = 0.0
+            distances = distances + mask
+
+        groups = []
+        for start, stop in self.lender_ranges.values():
+            group = self._top_k(distances[start:stop], per_lender_k, offset=start)
+            group = [row for row in group if np.isfinite(row["_distance"])]
+            if group:
+                groups.append(group)
+        groups.sort(key=lambda group: group[0]["_distance"])
+
+        return [
+            {**row, "_lender_rank": lender_rank}
+            for lender_rank, group in enumerate(groups[:max_lenders])
+            for row in group
+        ]
+
+    def search(self, vector: Sequence[float], limit: int = 15, lender: FilterArg = None,
+               product: FilterArg = None, section: FilterArg = None) -> List[Dict]:
+        """Exact top-``limit`` rows by squared L2 distance.
+
+        Returns:
+            Rows shaped like LanceDB results (``text``, ``metadata``, ``_distance``)
+            plus their ``_snapshot_row``, nearest first
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        positions = self._candidate_rows(lender, product, section)
+
+        if positions is None:
+            single_range = (0, len(self.rows))
+        elif len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            # A single lender: score its contiguous slice without a gather
+            single_range = (int(positions[0]), int(positions[-1]) + 1)
+        else:
+            single_range = None
+
+        if single_range is not None:
+            start, stop = single_range
+            vectors, norms = self.vectors[start:stop], self.norms[start:stop]
+        else:
+            vectors, norms = self.vectors[positions], self.norms[positions]
+
+        distances = norms - 2.0 * (vectors @ query.astype(vectors.dtype)).astype(np.float32) + float(query @ query)
+        if single_range is not None:
+            return self._top_k(distances, limit, offset=start)
+        return self._top_k(distances, limit, positions)